@@ -0,0 +1,110 @@
+# answer_cache.py
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from intents import normalize_question
+
+load_dotenv()
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "300"))
+
+# Words that don't change what is being asked ("Can you show me the ...")
+FILLER_WORDS = {"please", "kindly", "the", "a", "an", "me", "us", "can", "could", "would", "you", "tell"}
+
+
+def cache_key(question):
+    words = [w for w in normalize_question(question).split() if w not in FILLER_WORDS]
+    return re.sub(r"\s+", " ", " ".join(words)).strip()
+
+
+class AnswerCache:
+    """Bounded LRU + TTL cache of /query answers.
+
+    Entries are keyed on (normalized question, snapshot version); as soon as a
+    newer version is seen, everything cached for older data is dropped.
+    """
+
+    def __init__(self, maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def _sync_version(self, version):
+        if self._version != version:
+            if self._version is not None and version < self._version:
+                return False
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._version = version
+        return True
+
+    def get(self, question, version):
+        key = cache_key(question)
+        with self._lock:
+            if not self._sync_version(version):
+                self._misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            stored_at, answer = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return answer
+
+    def put(self, question, version, answer):
+        if not self.maxsize:
+            return
+        key = cache_key(question)
+        with self._lock:
+            if not self._sync_version(version):
+                return
+            self._entries[key] = (time.monotonic(), answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "version": self._version,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
+
+
+answer_cache = AnswerCache()
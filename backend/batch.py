@@ -0,0 +1,137 @@
+# batch.py
+#
+# Many questions answered against one pinned snapshot: cached answers are
+# returned first, duplicates are answered once, every fast-path question is
+# parsed and executed in shared vectorized passes (intents.execute_plans),
+# questions with a cached agent plan re-run it, and the rest are fanned out
+# to the LLM agent with bounded parallelism. A question that fails gets an
+# error result of its own; the rest of the batch is still answered.
+
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from answer_cache import answer_cache, cache_key
+from instrumentation import query_routes, span
+from intents import execute_plans, format_result, parse_question, prepare, record_match
+from langchain_agent import answer_from_plan, error_result, run_agent
+from planner import answer_version
+from query_executor import MAX_INFLIGHT_LLM
+from snapshot import get_snapshot
+
+load_dotenv()
+
+# Most questions accepted by one /query/batch request
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "100"))
+# Agent questions of one batch run at the same time (llm_slots still caps
+# the process-wide total)
+BATCH_LLM_PARALLELISM = int(os.getenv("BATCH_LLM_PARALLELISM", str(MAX_INFLIGHT_LLM)))
+
+
+def _cacheable(result):
+    return not result.get("text", "").strip().startswith("Error:")
+
+
+def batch_key(questions):
+    """Work key for a whole batch: the same questions in the same order."""
+    return ("batch",) + tuple(cache_key(q) for q in questions)
+
+
+def _execute_plans(plans, prepared):
+    """execute_plans, retried one plan at a time if the shared pass fails so
+    that only the failing plans come back as their exception."""
+    try:
+        return execute_plans(plans, prepared)
+    except Exception:
+        answers = []
+        for plan in plans:
+            try:
+                answers.append(execute_plans([plan], prepared)[0])
+            except Exception as e:
+                answers.append(e)
+        return answers
+
+
+def run_batch(questions, on_result=None):
+    """Answer `questions`; returns [(result, route)] in question order.
+
+    `on_result(index, result, route)` is called as each answer completes
+    (from worker threads for agent questions).
+    """
+    results = [None] * len(questions)
+
+    def done(indexes, result, route):
+        query_routes.inc(len(indexes), path=route)
+        for i in indexes:
+            results[i] = (result, route)
+            if on_result:
+                on_result(i, result, route)
+
+    with span("data.load"):
+        snapshot = get_snapshot()
+    # Same versioning as /query, so the two share cached answers
+    version = answer_version(snapshot)
+
+    # ➔ Cached answers; identical questions are answered once
+    pending = {}
+    for i, question in enumerate(questions):
+        cached = answer_cache.get(question, version)
+        if cached is not None:
+            done([i], cached, "cache")
+        else:
+            pending.setdefault(cache_key(question), []).append(i)
+
+    # ➔ Fast path: parse everything, then execute the plans in shared passes
+    agent_work = []
+    with span("batch.fast_path"):
+        prepared = prepare(snapshot)
+        planned = []
+        for indexes in pending.values():
+            question = questions[indexes[0]]
+            try:
+                plan = parse_question(question, prepared)
+                record_match(plan)
+                plan_answer = answer_from_plan(question, snapshot) if plan is None else None
+            except Exception as e:
+                done(indexes, error_result(e), "fast_path")
+                continue
+            if plan is not None:
+                planned.append((indexes, plan))
+            elif plan_answer is None:
+                agent_work.append(indexes)
+            else:
+                answer_cache.put(question, version, plan_answer)
+                done(indexes, plan_answer, "plan_cache")
+        answers = _execute_plans([plan for _, plan in planned], prepared)
+        for (indexes, plan), answer in zip(planned, answers):
+            try:
+                result = error_result(answer) if isinstance(answer, Exception) else format_result(plan, answer)
+            except Exception as e:
+                result = error_result(e)
+            if not _cacheable(result):
+                done(indexes, result, "fast_path")
+                continue
+            answer_cache.put(questions[indexes[0]], version, result)
+            done(indexes, result, "fast_path")
+
+    # ➔ LLM agent for the rest, a few at a time
+    if agent_work:
+        workers = max(1, min(BATCH_LLM_PARALLELISM, len(agent_work)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-llm") as pool:
+            futures = {
+                pool.submit(contextvars.copy_context().run, run_agent, questions[indexes[0]], snapshot): indexes
+                for indexes in agent_work
+            }
+            for future in as_completed(futures):
+                indexes = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = error_result(e)
+                if _cacheable(result):
+                    answer_cache.put(questions[indexes[0]], version, result)
+                done(indexes, result, "agent")
+
+    return results
@@ -0,0 +1,3 @@
+# Offline benchmark suite: synthetic data in local stand-ins for MongoDB
+# (mongomock), MySQL (sqlite3) and the LLM (a deterministic fake chat
+# model). Run from backend/:  python -m benchmarks.run --help
@@ -0,0 +1,108 @@
+# datagen.py
+#
+# Deterministic synthetic data: client profiles shaped like
+# insert_clients.py and transactions shaped like the MySQL `transactions`
+# table. The same seed always yields the same rows. Client and stock
+# popularity is skewed (a few large portfolios, a long tail) and dates span
+# several years so date filters and monthly groupings have real work to do.
+
+from datetime import date
+
+import numpy as np
+
+FIRST_NAMES = [
+    "Aarav", "Vivaan", "Aditya", "Vihaan", "Arjun", "Sai", "Reyansh", "Krishna", "Ishaan", "Rohan",
+    "Ananya", "Diya", "Saanvi", "Aadhya", "Kavya", "Isha", "Meera", "Riya", "Priya", "Neha",
+    "Rahul", "Vikram", "Karan", "Nikhil", "Siddharth", "Pooja", "Sneha", "Divya", "Lakshmi", "Tara",
+]
+LAST_NAMES = [
+    "Sharma", "Verma", "Iyer", "Reddy", "Nair", "Patel", "Shah", "Mehta", "Kapoor", "Khan",
+    "Gupta", "Joshi", "Rao", "Das", "Bose", "Menon", "Pillai", "Chopra", "Malhotra", "Banerjee",
+]
+RELATIONSHIP_MANAGERS = [
+    "Neha Shah", "Rajesh Mehta", "Ravi Mehra", "Sneha Kapoor", "Ankit Verma", "Pooja Nair",
+    "Arvind Rao", "Kiran Joshi", "Manish Gupta", "Swati Iyer", "Deepak Menon", "Farah Khan",
+]
+RISK_LEVELS = ["High", "Medium", "Low"]
+CITIES = [
+    "Mumbai", "Delhi", "Bangalore", "Hyderabad", "Chennai", "Kolkata", "Pune", "Ahmedabad",
+    "Jaipur", "Lucknow", "Kochi", "Chandigarh", "Indore", "Ranchi", "Nagpur",
+]
+PREFERENCES = [
+    "Equity", "Mutual Funds", "Bonds", "Real Estate", "Gold", "Startups", "ESG Funds",
+    "Private Equity", "Fixed Deposits", "Crypto", "AgriTech", "REITs",
+]
+STOCKS = [
+    "Reliance", "TCS", "HDFC Bank", "Infosys", "ICICI Bank", "Hindustan Unilever", "ITC", "SBI",
+    "Bharti Airtel", "Kotak Bank", "Larsen & Toubro", "Axis Bank", "Asian Paints", "Maruti Suzuki",
+    "Bajaj Finance", "Wipro", "HCL Tech", "Sun Pharma", "Titan", "UltraTech Cement",
+    "Nestle India", "Tata Motors", "Adani Ports", "Power Grid", "NTPC",
+]
+
+DATE_END = date(2024, 12, 31)
+
+
+def client_count(transactions):
+    # Roughly 100 transactions per client, within sensible bounds
+    return int(min(max(transactions // 100, 20), 100_000))
+
+
+def client_names(n):
+    names = [f"{first} {last}" for last in LAST_NAMES for first in FIRST_NAMES]
+    if n <= len(names):
+        return names[:n]
+    return names + [f"{names[i % len(names)]} {i // len(names)}" for i in range(len(names), n)]
+
+
+def _zipf_weights(n, skew):
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate_profiles(n_clients, seed=42):
+    """Client profile documents (lists for investment_preferences)."""
+    rng = np.random.default_rng(seed)
+    names = client_names(n_clients)
+    risk = rng.choice(len(RISK_LEVELS), size=n_clients, p=[0.3, 0.45, 0.25])
+    rms = rng.integers(0, len(RELATIONSHIP_MANAGERS), size=n_clients)
+    cities = rng.choice(len(CITIES), size=n_clients, p=_zipf_weights(len(CITIES), 0.7))
+    n_prefs = rng.integers(1, 4, size=n_clients)
+    profiles = []
+    for i, name in enumerate(names):
+        prefs = rng.choice(len(PREFERENCES), size=n_prefs[i], replace=False)
+        profiles.append({
+            "client_name": name,
+            "risk_appetite": RISK_LEVELS[risk[i]],
+            "investment_preferences": [PREFERENCES[p] for p in prefs],
+            "relationship_manager": RELATIONSHIP_MANAGERS[rms[i]],
+            "address": CITIES[cities[i]],
+        })
+    return profiles
+
+
+def iter_transactions(n, profiles, seed=42, chunk_size=100_000, years=3, start_id=1):
+    """Yield transactions as lists of tuples
+    (id, client_name, stock_name, value, transaction_date, relationship_manager),
+    `chunk_size` rows at a time so large scales never sit in memory at once."""
+    rng = np.random.default_rng(seed + 1)
+    names = np.array([p["client_name"] for p in profiles], dtype=object)
+    rms = np.array([p["relationship_manager"] for p in profiles], dtype=object)
+    stocks = np.array(STOCKS, dtype=object)
+    client_p = _zipf_weights(len(names), 0.8)
+    rng.shuffle(client_p)  # skew shouldn't follow alphabetical order
+    stock_p = _zipf_weights(len(stocks), 1.0)
+    end = np.datetime64(DATE_END, "D")
+    days = 365 * years
+
+    for offset in range(0, n, chunk_size):
+        size = min(chunk_size, n - offset)
+        client_idx = rng.choice(len(names), size=size, p=client_p)
+        stock_idx = rng.choice(len(stocks), size=size, p=stock_p)
+        # Log-normal amounts rounded to the nearest 100 (median ~5 lakh)
+        values = np.round(rng.lognormal(mean=13.1, sigma=1.0, size=size), -2)
+        dates = (end - rng.integers(0, days, size=size).astype("timedelta64[D]")).astype(str)
+        ids = np.arange(start_id + offset, start_id + offset + size)
+        yield list(zip(
+            ids.tolist(), names[client_idx].tolist(), stocks[stock_idx].tolist(),
+            values.tolist(), dates.tolist(), rms[client_idx].tolist(),
+        ))
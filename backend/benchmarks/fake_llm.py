@@ -0,0 +1,66 @@
+# fake_llm.py
+#
+# Deterministic stand-in for ChatGroq that drives the pandas agent through
+# one real ReAct round trip: the first call emits a python_repl_ast action
+# (a groupby picked from keywords in the question), the second turns the
+# tool's observation into a JSON "Final Answer". An optional fixed latency
+# approximates the network/model time of the hosted LLM.
+
+import ast
+import json
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+GROUP_COLUMNS = [
+    (("stock", "share", "scrip"), "'stock_name'"),
+    (("relationship", "manager", "rm"), "[c for c in df.columns if c.startswith('relationship_manager')][-1]"),
+    (("city", "cities", "location"), "'address'"),
+    (("risk",), "'risk_appetite'"),
+]
+
+
+def _action_code(question):
+    words = question.lower()
+    column = next((col for keys, col in GROUP_COLUMNS if any(k in words for k in keys)), "'client_name'")
+    return f"df.groupby({column}, observed=True)['value'].sum().nlargest(5).to_dict()"
+
+
+def _final_answer(observation):
+    try:
+        return json.dumps({str(k): float(v) for k, v in ast.literal_eval(observation).items()})
+    except (ValueError, SyntaxError, AttributeError, TypeError):
+        return json.dumps({"result": observation})
+
+
+class FakeAnalystModel(BaseChatModel):
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-analyst"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = str(messages[-1].content) if messages else ""
+        # Only the part after the agent's "Begin!" marker is the live scratchpad
+        scratchpad = prompt.rsplit("Begin!", 1)[-1]
+        if "Observation:" in scratchpad:
+            observation = scratchpad.rsplit("Observation:", 1)[1].split("\nThought:")[0].strip()
+            text = f"Thought: I now know the final answer\nFinal Answer: {_final_answer(observation)}"
+        else:
+            question = scratchpad.rsplit("Question:", 1)[-1]
+            text = (
+                "Thought: I should aggregate the dataframe\n"
+                f"Action: python_repl_ast\nAction Input: {_action_code(question)}"
+            )
+        # Rough 4-characters-per-token usage so token accounting is exercised too
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        message = AIMessage(content=text, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,357 @@
+# run.py
+#
+# Offline benchmark harness. For every requested scale a child process
+# generates a dataset, points db.py at the local stand-ins, swaps the LLM
+# for FakeAnalystModel and times each pipeline stage and endpoint. Results
+# (latency percentiles + throughput) are written as JSON; --compare diffs
+# two result files and exits non-zero on a regression.
+#
+#   cd backend
+#   python -m benchmarks.run --scales 1k,100k --output bench.json
+#   python -m benchmarks.run --compare baseline.json bench.json
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.scales import parse_scale
+
+FAST_PATH_QUESTIONS = [
+    "top 5 clients",
+    "breakup per relationship manager",
+    "highest holders of Infosys",
+    "stock wise portfolio value",
+    "monthly portfolio value in 2024",
+    "how many clients hold TCS",
+    "average transaction value per city",
+    "top 3 clients with high risk",
+]
+AGENT_QUESTIONS = [
+    "why are some relationship managers ahead",
+    "explain how stock exposure compares across holdings",
+    "which clients should we recommend for review",
+]
+EXPORT_QUESTION = "top 5 clients"
+
+
+# ➔ Timing helpers
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * q
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples, wall=None, errors=0):
+    ordered = sorted(samples)
+    total = sum(ordered)
+    wall = wall if wall is not None else total
+    ms = lambda s: round(s * 1000, 3)
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "mean_ms": ms(total / len(ordered)) if ordered else 0.0,
+        "p50_ms": ms(_percentile(ordered, 0.50)),
+        "p95_ms": ms(_percentile(ordered, 0.95)),
+        "p99_ms": ms(_percentile(ordered, 0.99)),
+        "max_ms": ms(ordered[-1]) if ordered else 0.0,
+        "throughput_per_s": round(len(ordered) / wall, 2) if wall else 0.0,
+    }
+
+
+def measure(fn, iterations, setup=None):
+    samples = []
+    for i in range(iterations):
+        if setup:
+            setup(i)
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def measure_concurrent(fn, requests, concurrency):
+    def timed(i):
+        started = time.perf_counter()
+        ok = fn(i)
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(requests)))
+    wall = time.perf_counter() - started
+    return summarize([s for s, _ in results], wall=wall, errors=sum(1 for _, ok in results if not ok))
+
+
+# ➔ One scale (runs in a child process so every scale starts cold)
+
+def _configure_environment():
+    # Must happen before any backend module is imported
+    os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+    os.environ["SNAPSHOT_REFRESH_SECONDS"] = "0"
+    os.environ["WARMUP"] = "false"  # stages load what they measure themselves
+    os.environ["SNAPSHOT_FULL_REFRESH_SECONDS"] = "0"
+    os.environ.setdefault("QUERY_PUSHDOWN", "off")
+    os.environ.setdefault("DASHBOARD_SOURCE", "snapshot")
+
+
+def run_scale(scale, args):
+    _configure_environment()
+    from benchmarks.datagen import client_count, generate_profiles, iter_transactions
+    from benchmarks.fake_llm import FakeAnalystModel
+    from benchmarks import stores
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench-")
+    sqlite_path = os.path.join(workdir, f"transactions_{scale}.sqlite3")
+
+    started = time.perf_counter()
+    profiles = generate_profiles(client_count(scale), seed=args.seed)
+    stores.load_transactions(sqlite_path, scale, profiles, seed=args.seed)
+    stores.install(sqlite_path, profiles)
+    setup_seconds = time.perf_counter() - started
+
+    import langchain_agent
+    import main
+    import planner
+    from answer_cache import answer_cache
+    from cube import AggregateCube
+    from plan_cache import plan_cache
+    from prompt_context import prompt_context
+    from sandbox import sandbox_pool
+    from instrumentation import llm_tokens
+    from dashboard_metrics import dashboard_metrics
+    from intents import answer_question
+    from snapshot import snapshot_manager
+    from fastapi.testclient import TestClient
+
+    langchain_agent.llm = FakeAnalystModel(latency=args.llm_latency)
+    langchain_agent._agent_cache.clear()
+
+    stages = {}
+    n_questions = len(FAST_PATH_QUESTIONS)
+
+    # ➔ Pipeline stages
+    stages["load_data.full"] = measure(lambda i: snapshot_manager.refresh(force=True), args.load_iterations)
+
+    next_id = [scale + 1]
+
+    def append_rows(i):
+        rows = next(iter_transactions(args.append_rows, profiles, seed=args.seed + i + 1,
+                                      chunk_size=args.append_rows, start_id=next_id[0]))
+        stores.append_transactions(sqlite_path, rows)
+        next_id[0] += len(rows)
+
+    stages["load_data.incremental"] = measure(
+        lambda i: snapshot_manager.refresh(), args.load_iterations, setup=append_rows
+    )
+
+    snapshot = snapshot_manager.get()
+    answer_question(FAST_PATH_QUESTIONS[0], snapshot)  # per-version vocabulary is built once
+    stages["run_query.fast_path"] = measure(
+        lambda i: answer_question(FAST_PATH_QUESTIONS[i % n_questions], snapshot),
+        args.iterations * n_questions,
+    )
+    stages["run_query.pushdown"] = measure(
+        lambda i: planner.answer_pushdown(FAST_PATH_QUESTIONS[i % n_questions]),
+        args.iterations * n_questions,
+    )
+    langchain_agent.get_agent(snapshot)  # the langchain stack is imported lazily
+    prompt_context.sections(snapshot)  # built once per version, like the startup warmup does
+    sandbox_pool.prestart(snapshot)  # likewise the sandbox workers
+    stages["run_query.agent"] = measure(
+        lambda i: langchain_agent.run_query(AGENT_QUESTIONS[i % len(AGENT_QUESTIONS)]),
+        args.agent_iterations, setup=lambda i: plan_cache.clear(),
+    )
+    for question in AGENT_QUESTIONS:
+        langchain_agent.run_query(question)  # agent code is captured once per template
+    stages["run_query.plan_cache"] = measure(
+        lambda i: langchain_agent.run_query(AGENT_QUESTIONS[i % len(AGENT_QUESTIONS)]),
+        args.iterations * len(AGENT_QUESTIONS),
+    )
+
+    def dashboard_cold(i):
+        dashboard_metrics._result = None
+
+    stages["dashboard.rollup"] = measure(lambda i: dashboard_metrics.get(), args.iterations, setup=dashboard_cold)
+    stages["cube.build"] = measure(
+        lambda i: AggregateCube.build(snapshot_manager.get()), args.load_iterations
+    )
+
+    # ➔ Endpoints (in-process ASGI client, no network). One client context
+    #    keeps every request on the same event loop, as under uvicorn
+    with TestClient(main.app) as client:
+        requests = args.requests
+        concurrency = args.concurrency
+
+        def post_query(i):
+            question = FAST_PATH_QUESTIONS[i % n_questions]
+            return client.post("/query", json={"question": question}).status_code == 200
+
+        stages["POST /query (uncached)"] = measure(
+            post_query, args.iterations, setup=lambda i: answer_cache.clear()
+        )
+        stages["POST /query (cached)"] = measure_concurrent(post_query, requests, concurrency)
+
+        batch = FAST_PATH_QUESTIONS + AGENT_QUESTIONS
+        stages["POST /query/batch (uncached)"] = measure(
+            lambda i: client.post("/query/batch", json={"questions": batch}),
+            args.agent_iterations, setup=lambda i: (answer_cache.clear(), plan_cache.clear()),
+        )
+
+        for path in ("/dashboard-metrics", "/recent-queries", "/clients", "/stats"):
+            stages[f"GET {path}"] = measure_concurrent(
+                lambda i, path=path: client.get(path).status_code == 200, requests, concurrency
+            )
+        stages["GET /query/export"] = measure_concurrent(
+            lambda i: client.get("/query/export", params={"question": EXPORT_QUESTION}).status_code == 200,
+            requests, concurrency,
+        )
+
+    return {
+        "setup": {
+            "transactions": scale,
+            "clients": len(profiles),
+            "generate_and_load_seconds": round(setup_seconds, 3),
+            "snapshot_rows": len(snapshot_manager.get().frame),
+            "snapshot_bytes": snapshot_manager.stats()["memory_bytes"],
+            "llm_calls": langchain_agent.llm.calls,
+            "llm_prompt_tokens_per_call": round(
+                llm_tokens.value(kind="prompt") / max(langchain_agent.llm.calls, 1), 1),
+        },
+        "stages": stages,
+    }
+
+
+# ➔ Orchestration, reporting and comparison
+
+def _run_child(scale, args):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as out:
+        output = out.name
+    cmd = [
+        sys.executable, "-m", "benchmarks.run", "--child", str(scale), "--child-output", output,
+        "--seed", str(args.seed), "--iterations", str(args.iterations),
+        "--load-iterations", str(args.load_iterations), "--agent-iterations", str(args.agent_iterations),
+        "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+        "--append-rows", str(args.append_rows), "--llm-latency", str(args.llm_latency),
+    ]
+    if args.workdir:
+        cmd += ["--workdir", args.workdir]
+    stdout = None if args.verbose else subprocess.DEVNULL
+    subprocess.run(cmd, check=True, stdout=stdout)
+    try:
+        with open(output) as f:
+            return json.load(f)
+    finally:
+        os.remove(output)
+
+
+def print_results(results):
+    for scale, result in results["scales"].items():
+        setup = result["setup"]
+        print(f"\n== {int(scale):,} transactions / {setup['clients']:,} clients "
+              f"(setup {setup['generate_and_load_seconds']}s) ==")
+        print(f"{'stage':<30}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}{'errors':>8}")
+        for stage, s in result["stages"].items():
+            print(f"{stage:<30}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}"
+                  f"{s['throughput_per_s']:>10}{s['errors']:>8}")
+
+
+def compare(baseline_path, current_path, threshold, min_delta_ms):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    regressions = 0
+    for scale, result in current["scales"].items():
+        before = baseline["scales"].get(scale)
+        if before is None:
+            print(f"\n== {int(scale):,}: not in baseline ==")
+            continue
+        print(f"\n== {int(scale):,} transactions ==")
+        print(f"{'stage':<30}{'p50 before':>12}{'p50 after':>12}{'p95 before':>12}{'p95 after':>12}{'change':>9}")
+        for stage, s in result["stages"].items():
+            old = before["stages"].get(stage)
+            if old is None:
+                print(f"{stage:<30}{'-':>12}{s['p50_ms']:>12}{'-':>12}{s['p95_ms']:>12}{'new':>9}")
+                continue
+            change = (s["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+            flag = ""
+            if change > threshold and s["p95_ms"] - old["p95_ms"] > min_delta_ms:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{stage:<30}{old['p50_ms']:>12}{s['p50_ms']:>12}{old['p95_ms']:>12}{s['p95_ms']:>12}"
+                  f"{change:>+9.1%}{flag}")
+    print(f"\n{regressions} regression(s) above {threshold:.0%} (p95)")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the query backend")
+    parser.add_argument("--scales", default="1k,10k", help="transaction counts, e.g. 1k,100k,1M,10M")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=20, help="samples per fast stage")
+    parser.add_argument("--load-iterations", type=int, default=3, help="samples for full loads/rebuilds")
+    parser.add_argument("--agent-iterations", type=int, default=6)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--append-rows", type=int, default=100, help="rows added per incremental refresh")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated seconds per LLM call")
+    parser.add_argument("--workdir", help="where the sqlite files are written (default: a temp dir)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--verbose", action="store_true", help="show backend/agent output")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"))
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 growth flagged by --compare")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore smaller p95 changes")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare, args.threshold, args.min_delta_ms)
+
+    if args.child is not None:
+        result = run_scale(args.child, args)
+        with open(args.child_output, "w") as f:
+            json.dump(result, f)
+        return 0
+
+    import pandas as pd
+
+    results = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "llm_latency": args.llm_latency,
+        },
+        "scales": {},
+    }
+    for scale in [parse_scale(s) for s in args.scales.split(",") if s.strip()]:
+        print(f"Running {scale:,} transactions ...", flush=True)
+        results["scales"][str(scale)] = _run_child(scale, args)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print_results(results)
+    print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
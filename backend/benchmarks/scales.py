@@ -0,0 +1,10 @@
+# scales.py
+#
+# Row counts written the way the benchmark and seeding CLIs take them:
+# "10k", "1M", "2.5m" or a plain number.
+
+
+def parse_scale(text):
+    text = text.strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * factor)
@@ -0,0 +1,144 @@
+# stores.py
+#
+# Local stand-ins wired in through db.py's module-level clients: mongomock
+# replaces the MongoClient and a sqlite3 file replaces the MySQL pool. The
+# sqlite connections speak just enough of mysql-connector's interface
+# (cursor(dictionary=...), %s placeholders, DATE_FORMAT) for the backend's
+# queries to run unchanged.
+
+import sqlite3
+from datetime import date, datetime
+
+import db
+from benchmarks.datagen import iter_transactions
+
+TRANSACTIONS_DDL = """
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY,
+        client_name TEXT,
+        stock_name TEXT,
+        value REAL,
+        transaction_date TEXT,
+        relationship_manager TEXT
+    )
+"""
+TRANSACTIONS_INDEXES = [
+    "CREATE INDEX idx_txn_client ON transactions (client_name)",
+    "CREATE INDEX idx_txn_stock ON transactions (stock_name)",
+    "CREATE INDEX idx_txn_date ON transactions (transaction_date)",
+]
+INSERT_SQL = "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)"
+
+
+def _date_format(value, fmt):
+    if value is None:
+        return None
+    value = str(value)
+    if fmt == "%Y-%m":
+        return value[:7]
+    return datetime.fromisoformat(value[:10]).strftime(fmt)
+
+
+def _translate(sql):
+    # mysql-connector style to sqlite's qmark style: like the real driver,
+    # only %s is substituted (there is no %% escape)
+    return sql.replace("%s", "?")
+
+
+def _param(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+class SQLiteCursor:
+    def __init__(self, conn, dictionary):
+        self._conn = conn
+        self._dictionary = dictionary
+        self._cursor = None
+
+    def execute(self, sql, params=()):
+        if params:
+            self._cursor = self._conn.execute(_translate(sql), [_param(p) for p in params])
+        else:
+            self._cursor = self._conn.execute(sql)
+
+    def executemany(self, sql, rows):
+        self._cursor = self._conn.executemany(_translate(sql), [[_param(p) for p in row] for row in rows])
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        if not self._dictionary:
+            return rows
+        names = [col[0] for col in self._cursor.description]
+        return [dict(zip(names, row)) for row in rows]
+
+    def close(self):
+        if self._cursor is not None:
+            self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.create_function("DATE_FORMAT", 2, _date_format, deterministic=True)
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self._conn, dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def is_connected(self):
+        return True
+
+    def reconnect(self, attempts=1, delay=0):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLitePool:
+    """Stand-in for mysql.connector.pooling.MySQLConnectionPool."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def get_connection(self):
+        return SQLiteConnection(self.path)
+
+
+def load_transactions(path, n, profiles, seed=42):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("DROP TABLE IF EXISTS transactions")
+        conn.execute(TRANSACTIONS_DDL)
+        for rows in iter_transactions(n, profiles, seed=seed):
+            conn.executemany(INSERT_SQL, rows)
+        for ddl in TRANSACTIONS_INDEXES:
+            conn.execute(ddl)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def append_transactions(path, rows):
+    conn = sqlite3.connect(path)
+    try:
+        conn.executemany(INSERT_SQL, rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def install(sqlite_path, profiles):
+    """Point db.py at the stand-ins and load the profiles into mongomock."""
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("The benchmark needs mongomock: pip install mongomock")
+
+    client = mongomock.MongoClient()
+    client[db.DB_NAME].client_profiles.insert_many([dict(p) for p in profiles])
+    db._mongo_client = client
+    db._mysql_pool = SQLitePool(sqlite_path)
+    return client
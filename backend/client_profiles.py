@@ -0,0 +1,98 @@
+# client_profiles.py
+#
+# client_profiles reads for the /clients endpoints: indexed filters, _id
+# cursor pagination with an optional field projection, and a collection
+# version for ETags: the profile content hash the snapshot manager computes
+# whenever its refresh reads client_profiles, so ETags cost no round-trip
+# of their own and change when the snapshot sees the edit.
+
+import hashlib
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING
+
+from db import get_mongo_db
+from instrumentation import span
+from snapshot import PROFILE_UPDATED_FIELD, snapshot_manager
+
+CLIENTS_PAGE_SIZE = 100
+CLIENTS_MAX_PAGE_SIZE = 500
+
+PROFILE_FIELDS = ["client_name", "risk_appetite", "investment_preferences", "relationship_manager", "address"]
+
+# Filter fields, each paired with _id so filtered pages are read in index order
+INDEXES = [
+    ([("client_name", ASCENDING)], "client_name"),
+    ([("risk_appetite", ASCENDING), ("_id", ASCENDING)], "risk_appetite_id"),
+    ([("investment_preferences", ASCENDING), ("_id", ASCENDING)], "investment_preferences_id"),
+    ([("relationship_manager", ASCENDING), ("_id", ASCENDING)], "relationship_manager_id"),
+]
+if PROFILE_UPDATED_FIELD:
+    # Lets snapshot refreshes fetch only the profiles edited since their watermark
+    INDEXES.append(([(PROFILE_UPDATED_FIELD, ASCENDING)], PROFILE_UPDATED_FIELD))
+
+
+def _collection():
+    return get_mongo_db()["client_profiles"]
+
+
+def ensure_indexes():
+    collection = _collection()
+    for keys, name in INDEXES:
+        collection.create_index(keys, name=name)
+
+
+def parse_fields(fields):
+    """Projection for a comma-separated `fields` parameter (None = all)."""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in PROFILE_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown field(s) {', '.join(unknown)}; choose from {', '.join(PROFILE_FIELDS)}")
+    return names
+
+
+def list_clients(query, limit=CLIENTS_PAGE_SIZE, cursor=None, fields=None):
+    """One page of profiles in _id order; returns (items, next_cursor)."""
+    limit = max(1, min(limit, CLIENTS_MAX_PAGE_SIZE))
+    if cursor:
+        try:
+            after = ObjectId(cursor)
+        except (InvalidId, TypeError) as e:
+            raise ValueError(str(e))
+        query = {"$and": [query, {"_id": {"$gt": after}}]} if query else {"_id": {"$gt": after}}
+
+    projection = {name: 1 for name in fields} if fields else None
+    with span("clients.mongo"):
+        docs = list(_collection().find(query, projection).sort("_id", ASCENDING).limit(limit + 1))
+    next_cursor = str(docs[limit - 1]["_id"]) if len(docs) > limit else None
+    items = []
+    for doc in docs[:limit]:
+        doc.pop("_id", None)
+        items.append(doc)
+    return items, next_cursor
+
+
+def profiles_version():
+    """Version of client_profiles as of the snapshot's last profile refresh."""
+    if snapshot_manager.profiles_hash is None:
+        snapshot_manager.get()
+    return f"h{snapshot_manager.profiles_hash & 0xFFFFFFFFFFFFFFFF:x}"
+
+
+def etag(*request_key):
+    """Weak ETag for one /clients representation at the current version."""
+    digest = hashlib.sha1(repr(request_key).encode()).hexdigest()[:12]
+    return f'W/"{profiles_version()}-{digest}"'
+
+
+def etag_matches(if_none_match, tag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/ prefixes are ignored
+    candidates = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return tag.removeprefix("W/") in candidates
@@ -0,0 +1,178 @@
+# dashboard_metrics.py
+#
+# /dashboard-metrics figures are rollups of one (month, stock, RM, client)
+# grouping of the raw transactions (so rows without a client profile still
+# count, unlike the profile-joined snapshot). By default the grouping is
+# kept in step with the snapshot's transaction rows through its reset/apply
+# listener events; DASHBOARD_SOURCE=mysql instead runs one combined GROUP BY
+# query and caches it for DASHBOARD_TTL seconds.
+
+import os
+import threading
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from db import mysql_query
+from instrumentation import span
+from snapshot import snapshot_manager
+
+load_dotenv()
+
+DASHBOARD_SOURCE = os.getenv("DASHBOARD_SOURCE", "snapshot")
+DASHBOARD_TTL = float(os.getenv("DASHBOARD_TTL", "30"))
+HIGH_VALUE_THRESHOLD = 100000
+
+KEYS = ["month", "stock_name", "relationship_manager", "client_name"]
+
+# One scan: every dashboard figure is a rollup of this grouping
+COMBINED_QUERY = f"""
+    SELECT DATE_FORMAT(transaction_date, '%Y-%m') AS month,
+           stock_name, relationship_manager, client_name,
+           SUM(value) AS total,
+           COUNT(*) AS n,
+           SUM(value > {HIGH_VALUE_THRESHOLD}) AS high
+    FROM transactions
+    GROUP BY month, stock_name, relationship_manager, client_name
+"""
+
+
+def group_transactions(transactions):
+    """Collapse raw transaction rows to (month, stock, RM, client) totals."""
+    if transactions is None or transactions.empty:
+        return _empty()
+    value = pd.to_numeric(transactions["value"], errors="coerce")
+    dates = pd.to_datetime(transactions.get("transaction_date"), errors="coerce")
+    frame = pd.DataFrame({
+        "month": dates.dt.strftime("%Y-%m"),
+        "stock_name": transactions.get("stock_name"),
+        "relationship_manager": transactions.get("relationship_manager"),
+        "client_name": transactions.get("client_name"),
+        "total": value,
+        "n": 1,
+        "high": (value > HIGH_VALUE_THRESHOLD).astype(int),
+    })
+    return frame.groupby(KEYS, dropna=False, sort=False, observed=True).agg(
+        total=("total", "sum"), n=("n", "sum"), high=("high", "sum")
+    ).reset_index()
+
+
+class DashboardMetrics:
+    """Additive dashboard aggregates: full reset or signed deltas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._grouped = None
+        self._result = None
+        self._computed_at = 0.0
+        self.resets = 0
+        self.deltas = 0
+        self.rollups = 0
+
+    # ➔ Snapshot listener interface (raw transaction rows)
+    def reset(self, transactions):
+        grouped = group_transactions(transactions)
+        with self._lock:
+            self._grouped = grouped
+            self._result = None
+            self.resets += 1
+
+    def apply(self, added, removed):
+        parts = [group_transactions(added)]
+        if removed is not None and not removed.empty:
+            negative = group_transactions(removed)
+            negative[["total", "n", "high"]] *= -1
+            parts.append(negative)
+        with self._lock:
+            combined = pd.concat([self._grouped] + parts, ignore_index=True)
+            grouped = combined.groupby(KEYS, dropna=False, sort=False).sum(min_count=1).reset_index()
+            self._grouped = grouped[grouped["n"] > 0]
+            self._result = None
+            self.deltas += 1
+
+    def _load_from_mysql(self):
+        with span("dashboard.mysql_query"):
+            rows = mysql_query(COMBINED_QUERY)
+        grouped = pd.DataFrame(rows, columns=KEYS + ["total", "n", "high"])
+        with self._lock:
+            self._grouped = grouped
+            self._result = None
+            self._computed_at = time.monotonic()
+
+    def get(self):
+        with span("dashboard.get"):
+            return self._get()
+
+    def _get(self):
+        if DASHBOARD_SOURCE == "mysql":
+            if self._grouped is None or time.monotonic() - self._computed_at > DASHBOARD_TTL:
+                self._load_from_mysql()
+        elif self._grouped is None:
+            # First request: loading the snapshot replays its transactions here
+            snapshot_manager.get()
+
+        with self._lock:
+            if self._result is None:
+                self._result = self._compute(self._grouped if self._grouped is not None else _empty())
+            return self._result
+
+    def _compute(self, grouped):
+        with span("dashboard.rollup"):
+            result = _rollup(grouped)
+        self.rollups += 1
+        return result
+
+    def stats(self):
+        return {
+            "source": DASHBOARD_SOURCE,
+            "groups": 0 if self._grouped is None else len(self._grouped),
+            "resets": self.resets,
+            "deltas": self.deltas,
+            "rollups": self.rollups,
+        }
+
+
+def _empty():
+    return pd.DataFrame(columns=KEYS + ["total", "n", "high"])
+
+
+def _rollup(grouped):
+    total = pd.to_numeric(grouped["total"], errors="coerce")
+    grouped = grouped.assign(total=total.fillna(0))
+
+    total_aum = float(total.sum())
+    active_rms = grouped["relationship_manager"].dropna().nunique()
+    top_portfolios = grouped["client_name"].dropna().nunique()
+    high_risk = int(grouped["high"].sum())
+
+    # ➔ Portfolio growth (month-wise aggregation)
+    growth = grouped.dropna(subset=["month"]).groupby("month")["total"].sum().sort_index()
+    portfolio_growth = [{"month": month, "value": float(v)} for month, v in growth.items()]
+
+    # ➔ Asset allocation (percent per stock)
+    assets = grouped.dropna(subset=["stock_name"]).groupby("stock_name", sort=False)["total"].sum()
+    grand_total = float(assets.sum()) or 1  # avoid division by zero
+    asset_allocation = [
+        {"asset": stock, "percent": round(float(v) * 100 / grand_total, 2)}
+        for stock, v in assets.items()
+    ]
+
+    # ➔ Top RMs with clients managed
+    rms = grouped.dropna(subset=["relationship_manager"]).groupby("relationship_manager", sort=False)["n"].sum()
+    rm_clients = [{"rm": rm, "clients": int(n)} for rm, n in rms.items()]
+
+    return {
+        "top_portfolios": int(top_portfolios),
+        "total_aum": f"₹{total_aum:,.0f}",
+        "active_rms": int(active_rms),
+        "high_risk": high_risk,
+        "portfolio_growth": portfolio_growth,
+        "asset_allocation": asset_allocation,
+        "rm_clients": rm_clients,
+    }
+
+
+dashboard_metrics = DashboardMetrics()
+if DASHBOARD_SOURCE != "mysql":
+    snapshot_manager.add_listener(dashboard_metrics)
@@ -0,0 +1,212 @@
+# db.py
+#
+# Shared data-access layer: one pooled MongoClient and one MySQL connection
+# pool per process. Every backend module gets its connections from here.
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, monitoring
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+DB_NAME = "wealth_portfolio"
+MONGO_POOL_SIZE = int(os.getenv("MONGO_POOL_SIZE", "50"))
+
+MYSQL_CONFIG = {
+    "host": os.getenv("MYSQL_HOST", "localhost"),
+    "user": os.getenv("MYSQL_USER", "root"),
+    "password": os.getenv("MYSQL_PASSWORD", "Login@630"),
+    "database": os.getenv("MYSQL_DB", DB_NAME),
+}
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "10"))
+# How long a caller waits for a free MySQL connection (seconds)
+MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "10"))
+# Connections idle for longer than this are pinged before being handed out
+MYSQL_HEALTHCHECK_IDLE = float(os.getenv("MYSQL_HEALTHCHECK_IDLE", "30"))
+
+
+class _MongoPoolListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    # Unused pool events
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+_lock = threading.Lock()
+_mongo_client = None
+_mongo_listener = _MongoPoolListener()
+_mysql_pool = None
+_mysql_slots = threading.BoundedSemaphore(MYSQL_POOL_SIZE)
+_mysql_last_used = {}
+_mysql_stats = {"checkouts": 0, "in_use": 0, "wait_seconds": 0.0, "timeouts": 0, "reconnects": 0}
+
+
+# ➔ MongoDB
+
+def get_mongo_client():
+    global _mongo_client
+    if _mongo_client is None:
+        with _lock:
+            if _mongo_client is None:
+                _mongo_client = MongoClient(
+                    MONGO_URI,
+                    maxPoolSize=MONGO_POOL_SIZE,
+                    event_listeners=[_mongo_listener],
+                )
+    return _mongo_client
+
+
+def get_mongo_db():
+    return get_mongo_client()[DB_NAME]
+
+
+# ➔ MySQL
+
+def _get_mysql_pool():
+    global _mysql_pool
+    if _mysql_pool is None:
+        with _lock:
+            if _mysql_pool is None:
+                # mysql.connector is imported on first use to keep startup fast
+                from mysql.connector import pooling
+
+                _mysql_pool = pooling.MySQLConnectionPool(
+                    pool_name="wealth_portfolio",
+                    pool_size=MYSQL_POOL_SIZE,
+                    **MYSQL_CONFIG,
+                )
+    return _mysql_pool
+
+
+@contextmanager
+def mysql_connection():
+    """Borrow a pooled MySQL connection; it is returned to the pool on exit."""
+    started = time.perf_counter()
+    if not _mysql_slots.acquire(timeout=MYSQL_POOL_TIMEOUT):
+        with _lock:
+            _mysql_stats["timeouts"] += 1
+        raise TimeoutError("Timed out waiting for a MySQL connection")
+    try:
+        conn = _get_mysql_pool().get_connection()
+    except Exception:
+        _mysql_slots.release()
+        raise
+
+    # ➔ Health check connections that have been sitting idle
+    key = id(getattr(conn, "_cnx", conn))
+    if time.monotonic() - _mysql_last_used.get(key, time.monotonic()) > MYSQL_HEALTHCHECK_IDLE:
+        if not conn.is_connected():
+            conn.reconnect(attempts=2, delay=0)
+            with _lock:
+                _mysql_stats["reconnects"] += 1
+
+    with _lock:
+        _mysql_stats["checkouts"] += 1
+        _mysql_stats["in_use"] += 1
+        _mysql_stats["wait_seconds"] += time.perf_counter() - started
+    try:
+        yield conn
+    finally:
+        _mysql_last_used[key] = time.monotonic()
+        with _lock:
+            _mysql_stats["in_use"] -= 1
+        try:
+            conn.close()
+        finally:
+            _mysql_slots.release()
+
+
+def mysql_query(sql, params=(), dictionary=True):
+    with mysql_connection() as conn:
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+# ➔ Health and utilization
+
+def health_check():
+    status = {}
+    try:
+        get_mongo_client().admin.command("ping")
+        status["mongo"] = "ok"
+    except Exception as e:
+        status["mongo"] = f"error: {e}"
+    try:
+        mysql_query("SELECT 1", dictionary=False)
+        status["mysql"] = "ok"
+    except Exception as e:
+        status["mysql"] = f"error: {e}"
+    return status
+
+
+def pool_stats():
+    with _lock:
+        mysql_stats = dict(_mysql_stats)
+    checkouts = mysql_stats["checkouts"]
+    wait_seconds = mysql_stats.pop("wait_seconds")
+    mysql_stats["avg_wait_ms"] = round(wait_seconds * 1000 / checkouts, 3) if checkouts else 0.0
+    mysql_stats["size"] = MYSQL_POOL_SIZE
+    mysql_stats["utilization"] = round(mysql_stats["in_use"] / MYSQL_POOL_SIZE, 3)
+
+    listener = _mongo_listener
+    mongo_stats = {
+        "max_size": MONGO_POOL_SIZE,
+        "open": listener.created - listener.closed,
+        "in_use": listener.checked_out,
+        "checkouts": listener.checkouts,
+        "checkout_failures": listener.checkout_failures,
+        "utilization": round(listener.checked_out / MONGO_POOL_SIZE, 3),
+    }
+    return {"mongo": mongo_stats, "mysql": mysql_stats}
@@ -0,0 +1,63 @@
+# exports.py
+#
+# Generator-based CSV / NDJSON exports. Rows are pulled lazily (e.g. from a
+# MongoDB cursor) and written out in batches, so nothing is buffered beyond
+# one batch and the first bytes go out immediately.
+
+import csv
+import json
+import os
+from io import StringIO
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+load_dotenv()
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _cell(value):
+    if isinstance(value, list):
+        return ", ".join(str(v) for v in value)
+    return value
+
+
+def iter_csv(rows, columns, batch_size=EXPORT_BATCH_SIZE):
+    """`columns` is a list of (header, key) pairs."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in columns])
+    count = 0
+    for row in rows:
+        writer.writerow([_cell(row.get(key, "")) for _, key in columns])
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows, columns=None, batch_size=EXPORT_BATCH_SIZE):
+    lines = []
+    for row in rows:
+        if columns:
+            row = {key: row.get(key) for _, key in columns}
+        lines.append(json.dumps(row, default=str))
+        if len(lines) >= batch_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def export_response(rows, columns, fmt, filename):
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format '{fmt}'")
+    body = iter_csv(rows, columns) if fmt == "csv" else iter_ndjson(rows, columns)
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[fmt], headers={
+        "Content-Disposition": f"attachment; filename={filename}.{fmt}"
+    })
@@ -1,8 +1,7 @@
-from pymongo import MongoClient
+from db import get_mongo_db
 
 # Connect to MongoDB
-client = MongoClient("mongodb://localhost:27017/")
-db = client["wealth_portfolio"]
+db = get_mongo_db()
 collection = db["client_profiles"]
 
 # Clear previous data for a fresh insert (optional)
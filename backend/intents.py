@@ -0,0 +1,679 @@
+# intents.py
+#
+# Deterministic intent/slot parser for the common analytics questions.
+# A question is normalized, matched against the entity values present in the
+# current snapshot (clients, RMs, stocks, cities, risk levels, preferences),
+# and compiled into an IntentPlan that is executed as one vectorized pandas
+# groupby. Questions that can't be parsed with confidence return None and
+# go to the LLM agent.
+
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from cube import get_cube
+from schema import resolve_columns
+
+# ➔ Question normalization
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13,
+    "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18,
+    "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90, "hundred": 100,
+}
+TENS = {"twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"}
+
+
+def _number_words_to_digits(text):
+    tokens = text.split()
+    out = []
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        if tok in NUMBER_WORDS:
+            value = NUMBER_WORDS[tok]
+            nxt = tokens[i + 1] if i + 1 < len(tokens) else ""
+            if tok in TENS and nxt in NUMBER_WORDS and NUMBER_WORDS[nxt] < 10:
+                value += NUMBER_WORDS[nxt]
+                i += 1
+            out.append(str(value))
+        else:
+            out.append(tok)
+        i += 1
+    return " ".join(out)
+
+
+def normalize_question(question):
+    q = question.lower().replace("’", "'").replace("&", " and ")
+    q = re.sub(r"'s\b", "", q)
+    # Keep '.', '-' and '/' only inside numbers/dates (1.5 crore, 2024-01-31)
+    q = re.sub(r"(?<!\d)[.\-/]|[.\-/](?!\d)", " ", q)
+    q = re.sub(r"[^a-z0-9.\-/ ]+", " ", q)
+    q = re.sub(r"\s+", " ", q).strip()
+    return _number_words_to_digits(q)
+
+
+# ➔ Plans
+
+@dataclass
+class IntentPlan:
+    intent: str
+    group_by: str = None           # dimension key, None for a scalar answer
+    agg: str = "sum"               # sum | mean | count | nunique
+    n: int = None
+    ascending: bool = False
+    filters: dict = field(default_factory=dict)   # dimension -> [values]
+    preferences: list = field(default_factory=list)
+    date_from: date = None         # inclusive
+    date_to: date = None           # exclusive
+    min_value: float = None        # per-transaction bounds
+    max_value: float = None
+    having_min: float = None       # bounds on the aggregated value
+    having_max: float = None
+    unit: str = None
+    divisor: float = 1.0
+
+    def key(self):
+        return (
+            self.group_by, self.agg, self.n, self.ascending,
+            tuple(sorted((k, tuple(v)) for k, v in self.filters.items())),
+            tuple(self.preferences), self.date_from, self.date_to,
+            self.min_value, self.max_value, self.having_min, self.having_max,
+            self.unit,
+        )
+
+
+DIMENSION_LABELS = {
+    "client": "clients",
+    "rm": "relationship managers",
+    "stock": "stocks",
+    "month": "months",
+    "risk": "risk appetites",
+    "address": "cities",
+}
+
+DIMENSION_PATTERNS = [
+    ("rm", r"relationship managers?|rms?|advisors?|managers?"),
+    ("stock", r"stocks?|shares?|scrips?|securities|security|compan(?:y|ies)|equities"),
+    ("month", r"months?|monthly"),
+    ("risk", r"risk appetites?|risk levels?|risk profiles?|risk categor(?:y|ies)"),
+    ("address", r"cit(?:y|ies)|locations?|address(?:es)?|regions?"),
+    ("client", r"clients?|portfolios?|investors?|members?|customers?|holders?|people"),
+]
+_DIM_ALT = "|".join(f"(?P<{key}>{pat})" for key, pat in DIMENSION_PATTERNS)
+
+GROUP_CUE = re.compile(rf"\b(?:per|by|for each|each|for every|every|across|grouped by|split by)\s+(?:the\s+)?(?:{_DIM_ALT})\b")
+WISE_CUE = re.compile(rf"\b(?:{_DIM_ALT})\s+wise\b")
+TOP_CUE = re.compile(
+    rf"\b(?P<dir>top|bottom|highest|largest|biggest|lowest|smallest|leading|best|worst|least)"
+    rf"(?:\s+(?P<n>\d+))?\s+(?:(?:value|valued|performing|invested|paying)\s+)?(?:{_DIM_ALT})\b"
+)
+N_BEFORE_TOP = re.compile(r"\b(?P<n>\d+)\s+(?P<dir>top|bottom|highest|largest|biggest|lowest|smallest)\b")
+ANY_DIM = re.compile(rf"\b(?:{_DIM_ALT})\b")
+HOLDERS_CUE = re.compile(r"\b(?:holders? of|who (?:holds?|owns?|invested in)|holding|hold|own|owns)\b")
+
+MEASURE_CUE = re.compile(
+    r"\b(?:value|values|valued|portfolios?|invest\w*|holdings?|holders?|aum|worth|total|sum|"
+    r"top|bottom|highest|lowest|largest|biggest|breakup|break up|breakdown|amount|exposure|"
+    r"allocation|transactions?|list|show|which|who|give|average|avg|mean|how many|number of|count)\b"
+)
+# Wording the plan compiler can't express faithfully: leave to the agent
+UNSUPPORTED_CUE = re.compile(
+    r"\b(?:why|trend|compare|comparison|versus|vs|correlat\w*|predict\w*|forecast\w*|recommend\w*|"
+    r"suggest\w*|percent\w*|ratio|share of|proportion|median|std|deviation|variance|growth|grow|"
+    r"change|difference|explain|increase|decrease|not|never|neither|nor|or|"
+    # Negations ("don't" normalizes to "don t"): the plan would silently drop them
+    r"\w+n t|dont|doesnt|didnt|isnt|arent|cannot|except|excluding|without|other than)\b"
+)
+
+UNITS = {
+    "crore": 1e7, "crores": 1e7, "cr": 1e7,
+    "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5,
+    "million": 1e6, "millions": 1e6, "mn": 1e6,
+    "thousand": 1e3, "k": 1e3,
+}
+_UNIT_ALT = "|".join(sorted(UNITS, key=len, reverse=True))
+AMOUNT = rf"(?:rs\s*|inr\s*)?(\d+(?:\.\d+)?)\s*({_UNIT_ALT})?\b"
+LOWER_BOUND = re.compile(rf"\b(?:above|over|more than|greater than|exceeding|at least|minimum of|min)\s+{AMOUNT}")
+UPPER_BOUND = re.compile(rf"\b(?:below|under|less than|lower than|at most|maximum of|max|upto|up to)\s+{AMOUNT}")
+DISPLAY_UNIT = re.compile(r"\bin\s+(crores?|lakhs?|lacs?|millions?)\b")
+
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9, "oct": 10,
+    "october": 10, "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+_MONTH_ALT = "|".join(sorted(MONTHS, key=len, reverse=True))
+_YEAR = r"(?:19|20)\d{2}"
+_DATE = rf"(\d{{4}}-\d{{1,2}}-\d{{1,2}}|\d{{1,2}}/\d{{1,2}}/\d{{4}}|(?:{_MONTH_ALT})\s+{_YEAR}|{_YEAR})\b"
+
+
+def _parse_date_token(tok):
+    # Returns [start, end) covering the token's granularity
+    tok = tok.strip()
+    if re.fullmatch(r"\d{4}-\d{1,2}-\d{1,2}", tok):
+        d = datetime.strptime(tok, "%Y-%m-%d").date()
+        return d, d + timedelta(days=1)
+    if re.fullmatch(r"\d{1,2}/\d{1,2}/\d{4}", tok):
+        d = datetime.strptime(tok, "%d/%m/%Y").date()
+        return d, d + timedelta(days=1)
+    m = re.fullmatch(rf"({_MONTH_ALT})\s+(\d{{4}})", tok)
+    if m:
+        month, year = MONTHS[m.group(1)], int(m.group(2))
+        start = date(year, month, 1)
+        return start, _add_months(start, 1)
+    year = int(tok)
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def _add_months(d, months):
+    month = d.month - 1 + months
+    return date(d.year + month // 12, month % 12 + 1, 1)
+
+
+def _parse_dates(q, today):
+    m = re.search(rf"\b(?:between|from)\s+{_DATE}\s+(?:and|to|till|until)\s+{_DATE}", q)
+    if m:
+        return _parse_date_token(m.group(1))[0], _parse_date_token(m.group(2))[1], m.span()
+    m = re.search(rf"\b(?:since|after|from)\s+{_DATE}", q)
+    if m:
+        start, stop = _parse_date_token(m.group(1))
+        return (stop if q[m.start():].startswith("after") else start), None, m.span()
+    m = re.search(rf"\b(?:before|until|till)\s+{_DATE}", q)
+    if m:
+        return None, _parse_date_token(m.group(1))[0], m.span()
+    m = re.search(r"\b(?:last|past|previous)\s+(\d+)\s+(days?|weeks?|months?|years?)\b", q)
+    if m:
+        count, unit = int(m.group(1)), m.group(2).rstrip("s")
+        if unit == "day":
+            start = today - timedelta(days=count)
+        elif unit == "week":
+            start = today - timedelta(weeks=count)
+        elif unit == "month":
+            start = _add_months(today.replace(day=1), -count)
+        else:
+            start = date(today.year - count, today.month, 1)
+        return start, None, m.span()
+    m = re.search(r"\b(this|last|previous)\s+(year|month)\b", q)
+    if m:
+        this = m.group(1) == "this"
+        if m.group(2) == "year":
+            year = today.year if this else today.year - 1
+            return date(year, 1, 1), date(year + 1, 1, 1), m.span()
+        start = today.replace(day=1) if this else _add_months(today.replace(day=1), -1)
+        return start, _add_months(start, 1), m.span()
+    m = re.search(rf"\b(?:in|during|for|of)\s+{_DATE}", q)
+    if m:
+        start, stop = _parse_date_token(m.group(1))
+        return start, stop, m.span()
+    return None, None, None
+
+
+def _amount(value, unit):
+    return float(value) * UNITS.get(unit or "", 1.0)
+
+
+# ➔ Per-snapshot vocabulary and derived columns
+
+def _distinct(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return [str(v) for v in series.cat.categories]
+    return [str(v) for v in series.dropna().unique()]
+
+
+def _str_contains(series, pattern):
+    # Categoricals: test each category once, then broadcast through the codes
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        hits = np.asarray(series.cat.categories.astype(str).str.contains(pattern, regex=True), dtype=bool)
+        codes = series.cat.codes.to_numpy()
+        return np.where(codes >= 0, hits[codes], False)
+    return series.astype(str).str.contains(pattern, regex=True).to_numpy()
+
+
+RISK_VALUES_PATTERN = r"\b{v}\s+risk\b|\brisk(?:\s+(?:appetite|level|profile))?\s+(?:is\s+|of\s+|=\s*)?{v}\b"
+
+
+def build_vocab(values_by_dim):
+    """(dim, normalized, value) triples for the entity matcher."""
+    vocab = []
+    for dim, values in values_by_dim.items():
+        for value in values:
+            norm = normalize_question(str(value))
+            if norm:
+                vocab.append((dim, norm, str(value)))
+    return vocab
+
+
+def build_preferences(values):
+    preferences = []
+    for value in pd.unique(pd.Series(list(values), dtype=object)):
+        norm = normalize_question(str(value))
+        if norm:
+            preferences.append((norm, str(value)))
+    return preferences
+
+
+class EntityMatcher:
+    """Finds vocabulary values in a normalized question.
+
+    Values are looked up by word n-gram in one dict, so matching costs the
+    same whatever the number of clients; risk phrases are one regex.
+    """
+
+    def __init__(self, vocab, risk_values, preferences):
+        self.ngrams = {}
+        for dim, norm, value in vocab:
+            self.ngrams.setdefault(norm, []).append((dim, value))
+        for norm, value in preferences:
+            self.ngrams.setdefault(norm, []).append(("preference", value))
+        self.max_words = max((norm.count(" ") + 1 for norm in self.ngrams), default=0)
+        self.risk = [
+            (re.compile(RISK_VALUES_PATTERN.format(v=re.escape(normalize_question(value)))), value)
+            for value in risk_values
+        ]
+
+    def candidates(self, q):
+        """(start, end, dim, value) for every match, overlapping ones included."""
+        words = [(m.start(), m.end()) for m in re.finditer(r"\S+", q)]
+        found = []
+        for i, (start, _) in enumerate(words):
+            for j in range(i, min(i + self.max_words, len(words))):
+                end = words[j][1]
+                for dim, value in self.ngrams.get(q[start:end], ()):
+                    found.append((start, end, dim, value))
+        for pattern, value in self.risk:
+            for m in pattern.finditer(q):
+                found.append((m.start(), m.end(), "risk", value))
+        return found
+
+
+class PreparedFrame:
+    """Snapshot-derived lookups that are computed once per data version."""
+
+    def __init__(self, snapshot):
+        df = snapshot.frame
+        self.version = snapshot.version
+        self.frame = df
+        self.columns = resolve_columns(df)
+
+        dates = pd.to_datetime(df["transaction_date"], errors="coerce") if "transaction_date" in df.columns \
+            else pd.Series(pd.NaT, index=df.index)
+        self.dates = dates
+        self._month = None  # formatted on first use; the cube answers most month questions
+        self.has_txn = dates.notna() | (df["value"] != 0)
+
+        # Entity values as they appear in normalized questions
+        self.vocab = build_vocab({
+            dim: _distinct(df[self.columns[dim]])
+            for dim in ("client", "rm", "stock", "address")
+            if self.columns[dim] and self.columns[dim] in df.columns
+        })
+        self.risk_values = []
+        if "risk_appetite" in df.columns:
+            self.risk_values = [v for v in _distinct(df["risk_appetite"]) if v]
+        self.preferences = []
+        if "investment_preferences" in df.columns:
+            tokens = pd.Series(_distinct(df["investment_preferences"])).str.split(r",\s*").explode()
+            self.preferences = build_preferences(tokens.dropna())
+        self.matcher = EntityMatcher(self.vocab, self.risk_values, self.preferences)
+
+    @property
+    def month(self):
+        if self._month is None:
+            self._month = self.dates.dt.strftime("%Y-%m")
+        return self._month
+
+    def column(self, dim):
+        if dim == "month":
+            return self.month
+        return self.frame[self.columns[dim]]
+
+
+_prepared_lock = threading.Lock()
+_prepared = None
+
+
+def prepare(snapshot):
+    global _prepared
+    prepared = _prepared
+    if prepared is None or prepared.version != snapshot.version:
+        with _prepared_lock:
+            if _prepared is None or _prepared.version != snapshot.version:
+                _prepared = PreparedFrame(snapshot)
+            prepared = _prepared
+    return prepared
+
+
+# ➔ Parser
+
+def _find_entities(q, prepared):
+    candidates = prepared.matcher.candidates(q)
+
+    # Longest non-overlapping matches win ("private equity" over "equity")
+    candidates.sort(key=lambda c: (c[0] - c[1], c[0]))
+    taken = []
+    found = {}
+    for start, end, dim, value in candidates:
+        if any(start < e and s < end for s, e in taken):
+            continue
+        taken.append((start, end))
+        found.setdefault(dim, [])
+        if value not in found[dim]:
+            found[dim].append(value)
+    return found, taken
+
+
+def _strip_spans(q, spans):
+    for start, end in sorted(spans, reverse=True):
+        q = q[:start] + " " + q[end:]
+    return re.sub(r"\s+", " ", q).strip()
+
+
+def _dim_from_match(m):
+    return next(key for key, _ in DIMENSION_PATTERNS if m.group(key))
+
+
+def parse_question(question, prepared, today=None):
+    q = normalize_question(question)
+    if not q:
+        return None
+    today = today or date.today()
+
+    found, spans = _find_entities(q, prepared)
+    # Entity values are matched; the remaining words carry the intent
+    rest = _strip_spans(q, spans)
+
+    if UNSUPPORTED_CUE.search(rest) or not MEASURE_CUE.search(rest):
+        return None
+
+    plan = IntentPlan(intent="")
+    plan.filters = {dim: vals for dim, vals in found.items() if dim != "preference"}
+    plan.preferences = found.get("preference", [])
+
+    # ➔ Dates, amounts and display units
+    date_from, date_to, span = _parse_dates(rest, today)
+    if span:
+        plan.date_from, plan.date_to = date_from, date_to
+        rest = _strip_spans(rest, [span])
+
+    m = DISPLAY_UNIT.search(rest)
+    if m:
+        unit = m.group(1).rstrip("s")
+        plan.unit, plan.divisor = unit, UNITS[unit]
+        rest = _strip_spans(rest, [m.span()])
+
+    row_level = bool(re.search(r"\b(?:transactions?|trades?|purchases?|deals?)\b", rest))
+    m = LOWER_BOUND.search(rest)
+    if m:
+        if row_level:
+            plan.min_value = _amount(m.group(1), m.group(2))
+        else:
+            plan.having_min = _amount(m.group(1), m.group(2))
+        rest = _strip_spans(rest, [m.span()])
+    m = UPPER_BOUND.search(rest)
+    if m:
+        if row_level:
+            plan.max_value = _amount(m.group(1), m.group(2))
+        else:
+            plan.having_max = _amount(m.group(1), m.group(2))
+        rest = _strip_spans(rest, [m.span()])
+
+    # ➔ Aggregation
+    if re.search(r"\b(?:average|avg|mean)\b", rest):
+        plan.agg = "mean"
+    elif re.search(r"\b(?:how many|number of|count)\b", rest):
+        plan.agg = "count"
+
+    # ➔ Grouping dimension and ranking
+    # A ranked dimension ("top relationship managers by portfolio") is what
+    # gets grouped; "by"/"per" cues only decide it when nothing is ranked
+    m = GROUP_CUE.search(rest) or WISE_CUE.search(rest)
+    top = TOP_CUE.search(rest)
+    if top:
+        plan.group_by = _dim_from_match(top)
+    elif m:
+        plan.group_by = _dim_from_match(m)
+    elif HOLDERS_CUE.search(rest) and "stock" in found:
+        plan.group_by = "client"
+    else:
+        m = ANY_DIM.search(rest)
+        if m:
+            plan.group_by = _dim_from_match(m)
+
+    if plan.group_by is None:
+        return None
+    if plan.group_by == "rm" and prepared.columns["rm"] is None:
+        return None
+
+    if top:
+        plan.ascending = top.group("dir") in ("bottom", "lowest", "smallest", "worst", "least")
+        n = top.group("n")
+        if n is None:
+            n_match = N_BEFORE_TOP.search(rest)
+            n = n_match.group("n") if n_match else None
+        plan.n = int(n) if n else (5 if top.group("dir") in ("top", "bottom") else None)
+    else:
+        m = N_BEFORE_TOP.search(rest)
+        if m:
+            plan.n = int(m.group("n"))
+            plan.ascending = m.group("dir") in ("bottom", "lowest", "smallest")
+
+    # "How many clients ..." without a per-X breakdown is a distinct count
+    if plan.agg == "count" and not GROUP_CUE.search(rest) and not WISE_CUE.search(rest) \
+            and re.search(r"\b(?:how many|number of|count)\s+(?:of\s+)?(?:\w+\s+)?(?:" + _DIM_ALT + r")\b", rest):
+        plan.agg = "nunique"
+
+    plan.intent = _intent_name(plan, found)
+    return plan
+
+
+def _intent_name(plan, found):
+    if plan.agg == "nunique":
+        return f"count_{plan.group_by}"
+    if plan.group_by == "client" and "stock" in found:
+        return "stock_holders"
+    if plan.n:
+        return f"top_{plan.group_by}"
+    return f"{plan.group_by}_breakdown"
+
+
+# ➔ Execution
+
+def _mask(plan, prepared):
+    df = prepared.frame
+    mask = np.ones(len(df), dtype=bool)
+    for dim, values in plan.filters.items():
+        mask &= prepared.column(dim).isin(values).to_numpy()
+    for pref in plan.preferences:
+        pattern = rf"(?:^|,\s*){re.escape(pref)}(?:\s*,|$)"
+        mask &= _str_contains(df["investment_preferences"], pattern)
+    if plan.date_from is not None:
+        mask &= (prepared.dates >= pd.Timestamp(plan.date_from)).to_numpy()
+    if plan.date_to is not None:
+        mask &= (prepared.dates < pd.Timestamp(plan.date_to)).to_numpy()
+    if plan.min_value is not None:
+        mask &= (df["value"] > plan.min_value).to_numpy()
+    if plan.max_value is not None:
+        mask &= (df["value"] < plan.max_value).to_numpy()
+    return mask
+
+
+def _scope_key(plan):
+    # Plans selecting the same rows with the same grouping share one groupby
+    return (
+        plan.group_by,
+        tuple(sorted((k, tuple(v)) for k, v in plan.filters.items())),
+        tuple(plan.preferences), plan.date_from, plan.date_to, plan.min_value, plan.max_value,
+    )
+
+
+def execute_plans(plans, prepared):
+    """Run several plans against the snapshot; returns their label -> value
+    Series in order. Each distinct row scope is masked and grouped once and
+    every aggregation requested for it is computed from that grouping."""
+    scopes = {}
+    for i, plan in enumerate(plans):
+        scopes.setdefault(_scope_key(plan), []).append(i)
+
+    results = [None] * len(plans)
+    cube = get_cube(prepared)
+    for indexes in scopes.values():
+        first = plans[indexes[0]]
+        # ➔ Cube lookup when the scope lines up with its cells, else a frame scan
+        scope = cube.scope(first) if cube is not None else None
+        if scope is None:
+            mask = _mask(first, prepared)
+            keys = prepared.column(first.group_by)[mask]
+        by_agg = {}
+        for i in indexes:
+            plan = plans[i]
+            if plan.agg not in by_agg:
+                if scope is not None:
+                    by_agg[plan.agg] = _aggregate_cells(plan, cube, *scope)
+                else:
+                    by_agg[plan.agg] = _aggregate(plan, prepared, mask, keys)
+            result = by_agg[plan.agg]
+            results[i] = result if plan.agg == "nunique" else finalize(plan, result)
+    return results
+
+
+def _aggregate(plan, prepared, mask, keys):
+    if plan.agg == "nunique":
+        return pd.Series({DIMENSION_LABELS[plan.group_by]: keys[keys.astype(str) != ""].nunique()})
+    if plan.agg == "count":
+        values = prepared.has_txn[mask].astype(int)
+        return values.groupby(keys, observed=True, sort=False).sum()
+    values = prepared.frame["value"][mask]
+    return values.groupby(keys, observed=True, sort=False).agg(plan.agg)
+
+
+def _aggregate_cells(plan, cube, cells, keys):
+    result = cube.measure(plan.agg, cells, keys)
+    if plan.agg == "nunique":
+        return pd.Series({DIMENSION_LABELS[plan.group_by]: result})
+    return result
+
+
+def execute_plan(plan, prepared):
+    """Run a plan against the in-memory snapshot; returns a label -> value Series."""
+    return execute_plans([plan], prepared)[0]
+
+
+def finalize(plan, result):
+    # Shared by every executor: drop blank keys, apply HAVING, sort and limit
+    result = result[result.index.astype(str) != ""]
+    if plan.having_min is not None:
+        result = result[result > plan.having_min]
+    if plan.having_max is not None:
+        result = result[result < plan.having_max]
+    if plan.group_by == "month" and not plan.n:
+        result = result.sort_index()
+    else:
+        # Ties are broken by label, the same as the pushdown's ORDER BY
+        result = result.sort_index(kind="stable").sort_values(ascending=plan.ascending, kind="stable")
+    if plan.n:
+        result = result.head(plan.n)
+    return result
+
+
+def _describe(plan):
+    measure = {
+        "sum": "total portfolio value",
+        "mean": "average transaction value",
+        "count": "number of transactions",
+        "nunique": "count",
+    }[plan.agg]
+    label = DIMENSION_LABELS[plan.group_by]
+    if plan.agg == "nunique":
+        text = f"Number of {label}"
+    elif plan.n:
+        text = f"{'Bottom' if plan.ascending else 'Top'} {plan.n} {label} by {measure}"
+    else:
+        text = f"{measure[0].upper()}{measure[1:]} per {label[:-1] if label.endswith('s') else label}"
+
+    qualifiers = []
+    for dim, values in plan.filters.items():
+        qualifiers.append(f"{dim if dim != 'rm' else 'RM'}: {', '.join(values)}")
+    if plan.preferences:
+        qualifiers.append(f"preference: {', '.join(plan.preferences)}")
+    if plan.date_from or plan.date_to:
+        start = plan.date_from.isoformat() if plan.date_from else "start"
+        end = (plan.date_to - timedelta(days=1)).isoformat() if plan.date_to else "today"
+        qualifiers.append(f"{start} to {end}")
+    if plan.min_value is not None:
+        qualifiers.append(f"transactions above {plan.min_value:,.0f}")
+    if plan.max_value is not None:
+        qualifiers.append(f"transactions below {plan.max_value:,.0f}")
+    if plan.having_min is not None:
+        qualifiers.append(f"total above {plan.having_min:,.0f}")
+    if plan.having_max is not None:
+        qualifiers.append(f"total below {plan.having_max:,.0f}")
+    if plan.unit:
+        qualifiers.append(f"values in {plan.unit}s")
+    if qualifiers:
+        text += f" ({'; '.join(qualifiers)})"
+    return text
+
+
+def format_result(plan, result):
+    if plan.divisor != 1.0 and plan.agg in ("sum", "mean"):
+        result = result / plan.divisor
+    result_dict = {str(k): round(float(v), 2) for k, v in result.items()}
+    if plan.agg in ("count", "nunique"):
+        result_dict = {k: int(v) for k, v in result_dict.items()}
+
+    description = _describe(plan)
+    if not result_dict:
+        return {"text": f"No matching data found for: {description}.", "graph": [], "table": []}
+
+    graph_data = [{"label": k, "value": v} for k, v in result_dict.items()]
+    table_data = [{"client": k, "portfolio_value": v} for k, v in result_dict.items()]
+    summary_text = "\n".join([f"{k}: {v}" for k, v in result_dict.items()])
+    return {
+        "text": f"{description}:\n{summary_text}",
+        "graph": graph_data,
+        "table": table_data,
+    }
+
+
+# ➔ Hit-rate accounting
+
+_stats_lock = threading.Lock()
+_stats = {"matched": 0, "unmatched": 0, "by_intent": {}}
+
+
+def record_match(plan):
+    with _stats_lock:
+        if plan is None:
+            _stats["unmatched"] += 1
+        else:
+            _stats["matched"] += 1
+            _stats["by_intent"][plan.intent] = _stats["by_intent"].get(plan.intent, 0) + 1
+
+
+def intent_stats():
+    with _stats_lock:
+        total = _stats["matched"] + _stats["unmatched"]
+        return {
+            "matched": _stats["matched"],
+            "unmatched": _stats["unmatched"],
+            "hit_rate": round(_stats["matched"] / total, 4) if total else 0.0,
+            "by_intent": dict(_stats["by_intent"]),
+        }
+
+
+def answer_question(question, snapshot):
+    """Answer `question` from the snapshot without the LLM, or return None."""
+    prepared = prepare(snapshot)
+    plan = parse_question(question, prepared)
+    record_match(plan)
+    if plan is None:
+        return None
+    return format_result(plan, execute_plan(plan, prepared))
@@ -1,11 +1,17 @@
 import os
 import pandas as pd
 import re
-from pymongo import MongoClient
-import mysql.connector
-from langchain_groq import ChatGroq
-from langchain_experimental.agents.agent_toolkits.pandas.base import create_pandas_dataframe_agent
+import threading
+from langchain_core.callbacks.base import BaseCallbackHandler
 from dotenv import load_dotenv
+from snapshot import get_snapshot
+from intents import answer_question
+from planner import answer_pushdown, use_pushdown
+from plan_cache import CodeCaptureHandler, plan_cache
+from prompt_context import prompt_context
+from sandbox import sandbox_pool, session
+from query_executor import llm_slots, Overloaded
+from instrumentation import query_routes, record_llm_usage, span
 import json
 
 import ast
@@ -18,6 +24,8 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 OPENAI_API_KEY = os.getenv("GROQ_API_KEY")
 DB_NAME = "wealth_portfolio"
+# Echo every agent step to stdout (debugging only: it includes prompts and data)
+AGENT_VERBOSE = os.getenv("AGENT_VERBOSE", "").lower() in ("1", "true", "yes")
 
 # Aggregate helper (if required in future)
 def aggregate_portfolio_values(data):
@@ -37,187 +45,249 @@ def safe_eval(expr):
     except:
         return expr
 
-# Load data from MongoDB and MySQL, merge for single dataframe
+# Load merged dataframe (MongoDB profiles LEFT JOIN MySQL transactions).
+# The frame is cached process-wide by the snapshot manager, so only the first
+# call hits the databases; later refreshes are incremental.
 def load_data():
-    # ➔ MongoDB
-    client = MongoClient(MONGO_URI)
-    mongo_db = client[DB_NAME]
-    client_profiles = list(mongo_db.client_profiles.find())
-    clients_df = pd.DataFrame(client_profiles)
-    if "_id" in clients_df.columns:
-        clients_df.drop(columns=["_id"], inplace=True)
-
-    # ➔ MySQL
-    sql_conn = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="Login@630",
-        database=DB_NAME
-    )
-    cursor = sql_conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM transactions")
-    transactions = cursor.fetchall()
-    transactions_df = pd.DataFrame(transactions)
-
-    # ➔ Merge (ALL CLIENTS LEFT JOIN)
-    merged_df = pd.merge(clients_df, transactions_df, on="client_name", how="left")
-    merged_df.fillna("", inplace=True)
-
-    # ➔ Replace missing transaction value with 0 for aggregation queries
-    merged_df["value"] = pd.to_numeric(merged_df["value"], errors="coerce").fillna(0)
-
-    # ➔ Convert list columns to comma-separated strings for LLM readability
-    for col in merged_df.columns:
-        if merged_df[col].apply(type).eq(list).any():
-            merged_df[col] = merged_df[col].apply(lambda x: ', '.join(x) if isinstance(x, list) else x)
-
-    return merged_df.drop_duplicates()
-
-# LLM setup
-llm = ChatGroq(
-    api_key=OPENAI_API_KEY,
-    model="llama3-8b-8192",
-    temperature=0
-)
-
-# General instruction for business queries
+    return get_snapshot().frame
+
+# LLM setup: langchain_groq is slow to import, so the client is built on
+# first use (or by the startup warmup) rather than at import
+llm = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    global llm
+    if llm is None:
+        with _llm_lock:
+            if llm is None:
+                from langchain_groq import ChatGroq
+
+                llm = ChatGroq(
+                    api_key=OPENAI_API_KEY,
+                    model="llama3-8b-8192",
+                    temperature=0,
+                    # Tokens are only forwarded to callbacks that ask for them (/query/stream)
+                    streaming=True,
+                )
+    return llm
+
+# General instruction for business queries (sent with every agent call, so
+# kept short; the data itself is described by prompt_context)
 GENERAL_INSTRUCTION = (
-    "You are a professional wealth portfolio data analyst. "
-    "Answer the user's business question using the dataframe provided. "
-    "You can use pandas dataframe operations like groupby, sum, max, etc. "
-    "For questions about top portfolios, group by client_name and sum their values. "
-    "For breakup per relationship manager, group by relationship_manager and sum their values. "
-    "For top relationship managers, rank by total portfolio value handled. "
-    "For highest holders of specific stocks, filter by stock_name and sort by value descending. "
-    "When the user mentions crore, interpret 1 crore as 10,000,000. "
-    "Return ONLY the final answer in valid JSON format where each key is the client or entity name "
-    "and each value is the numeric portfolio value. "
-    "For stock-specific questions, include the stock name in the key for clarity, for example: "
-    "{\"Virat Kohli - Infosys\": 23000000.00, \"KL Rahul - Infosys\": 15000000.00}. "
-    "Do NOT return explanations or comments. Only return the JSON dictionary mapping."
+    "You are a wealth portfolio data analyst answering from `df`. "
+    "Portfolio value is the sum of `value`: group by client_name for top portfolios, by the "
+    "relationship manager column below for RM breakups, and filter stock_name for stock holders. "
+    "1 crore = 10,000,000. The summaries below are exact but partial; compute anything else with pandas. "
+    "The Final Answer must be ONLY a JSON object mapping each client or entity name to its numeric value, "
+    "e.g. {\"Virat Kohli - Infosys\": 23000000.00} for a stock question. No explanations."
 )
 
 
-# Main query runner
-def run_query(query: str) -> dict:
-    try:
-        merged_df = load_data()
-        print(" Clients in merged_df:", merged_df["client_name"].unique())
-        print(" Total unique clients:", merged_df["client_name"].nunique())
-        print(" Clients with no transactions:", merged_df.loc[merged_df["value"] == 0, "client_name"].tolist())
-
-        agent = create_pandas_dataframe_agent(
-            llm,
-            merged_df,
-            verbose=True,
-            allow_dangerous_code=True,
-        )
-
-        q_lower = query.lower()
-
-        # ➔ Hardcoded logic for top five portfolios
-        if "top five portfolios" in q_lower or "top 5 portfolios" in q_lower:
-            df_sum = merged_df.groupby('client_name')['value'].sum().sort_values(ascending=False).head(5)
-            result_dict = df_sum.to_dict()
-
-            graph_data = [{"label": k, "value": v} for k, v in result_dict.items()]
-            table_data = [{"client": k, "portfolio_value": v} for k, v in result_dict.items()]
-
-            return {
-                "text": f"The top five portfolios (by total investment value) are: {result_dict}",
-                "graph": graph_data,
-                "table": table_data
-            }
-
-        # ➔ Hardcoded logic for total investments per client
-        if "total investments per client" in q_lower:
-            df_sum = merged_df.groupby('client_name')['value'].sum()
-            result_dict = df_sum.to_dict()
-
-            graph_data = [{"label": k, "value": v} for k, v in result_dict.items()]
-            table_data = [{"client": k, "portfolio_value": v} for k, v in result_dict.items()]
-
-            return {
-                "text": f"Total investments per client:\n{result_dict}",
-                "graph": graph_data,
-                "table": table_data
-            }
-
-        # ➔ Hardcoded logic for highest holders of specific stock
-        if "highest holders" in q_lower and "stock" in q_lower:
-            
-            match = re.search(r"of\s+(.*?)(\?|$)", query, re.IGNORECASE)
-            if match:
-                stock = match.group(1).strip()
-                
-                if stock.lower().endswith(" stock"):
-                    stock = stock[:-6].strip()
-
-
-                # Filter and group
-                df_filtered = merged_df[merged_df["stock_name"].str.lower() == stock.lower()]
-
-                if df_filtered.empty:
-                    return {
-                        "text": f"No holdings found for stock '{stock}'.",
-                        "graph": [],
-                        "table": []
-                    }
-
-                df_grouped = df_filtered.groupby("client_name")["value"].sum().sort_values(ascending=False)
-                result_dict = df_grouped.to_dict()
-
-                graph_data = [{"label": k, "value": v} for k, v in result_dict.items()]
-                table_data = [{"client": k, "portfolio_value": v} for k, v in result_dict.items()]
-
-                return {
-                    "text": f"Highest holders of {stock}:\n{result_dict}",
-                    "graph": graph_data,
-                    "table": table_data
-                }
-
-        # ➔ For all other queries, route to LLM agent with business instructions
-        full_query = f"{GENERAL_INSTRUCTION}\n\nQuestion: {query}"
+# Pandas agents are expensive to build (prompt + tool setup), so one is kept
+# per snapshot version and rebuilt only when the underlying data changes.
+# Only its prompt and LLM are shared: every run gets its own tools.
+_agent_lock = threading.Lock()
+_agent_cache = {}
+
+def get_agent(snapshot):
+    with _agent_lock:
+        agent = _agent_cache.get(snapshot.version)
+        if agent is None:
+            from langchain_experimental.agents.agent_toolkits.pandas.base import create_pandas_dataframe_agent
+
+            agent = create_pandas_dataframe_agent(
+                get_llm(),
+                snapshot.frame,
+                verbose=AGENT_VERBOSE,
+                allow_dangerous_code=True,
+                # The question carries a compact schema summary instead of df.head() rows
+                include_df_in_prompt=False,
+            )
+            _agent_cache.clear()
+            _agent_cache[snapshot.version] = agent
+    return agent
+
+
+def run_tools(snapshot):
+    # python_repl_ast keeps its variables between calls: a fresh tool per run
+    # stops one question's `df = df[...]` from leaking into the next
+    if sandbox_pool.enabled:
+        from sandbox_tool import SandboxREPLTool
+
+        # ➔ Same tool name/description, but the code runs in a worker process
+        return [SandboxREPLTool(snapshot=snapshot)]
+    from langchain_experimental.tools.python.tool import PythonAstREPLTool
+
+    # Copy-on-write copy: generated code can't mutate the shared snapshot
+    return [PythonAstREPLTool(locals={"df": snapshot.frame.copy(deep=False)})]
+
+
+def agent_for_run(snapshot):
+    return get_agent(snapshot).model_copy(update={"tools": run_tools(snapshot)})
+
+
+# Forwards agent progress to a run_query `on_event(name, data)` callback
+class QueryEventHandler(BaseCallbackHandler):
+    def __init__(self, on_event):
+        self.on_event = on_event
+
+    def on_llm_new_token(self, token, **kwargs):
+        if token:
+            self.on_event("token", {"text": token})
+
+    def on_agent_action(self, action, **kwargs):
+        self.on_event("agent_step", {"tool": action.tool, "input": str(action.tool_input)})
+
+    def on_tool_end(self, output, **kwargs):
+        self.on_event("observation", {"output": str(output)[:2000]})
+
+
+# Token usage of every LLM completion, for the /metrics counters and the
+# per-question totals
+class TokenUsageHandler(BaseCallbackHandler):
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        if not usage:
+            # Streaming completions report usage on the message instead
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens += metadata.get("input_tokens", 0)
+                    completion_tokens += metadata.get("output_tokens", 0)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        record_llm_usage(prompt_tokens, completion_tokens)
+
+
+def _no_event(name, data):
+    pass
+
+
+# LLM agent leg of run_query (also used by batch.py); raises on failure
+def run_agent(query, snapshot, on_event=_no_event):
+    with span("agent.context"):
+        full_query = prompt_context.render(snapshot, GENERAL_INSTRUCTION, query)
+
+    with span("agent.build"):
+        agent = agent_for_run(snapshot)
+    capture = CodeCaptureHandler()
+    usage = TokenUsageHandler()
+    callbacks = [usage, capture]
+    if on_event is not _no_event:
+        callbacks.append(QueryEventHandler(on_event))
+    with llm_slots:
+        on_event("agent_started", {})
+        with span("llm.call"), session():
+            result = agent.run(full_query, callbacks=callbacks)
+    on_event("usage", {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens})
+
+    # ➔ Parse JSON dictionary from LLM result
+    match = re.search(r"{.*}", result, re.DOTALL)
+    if match:
+        try:
+            with span("json.parse"):
+                parsed = json.loads(match.group())
 
-        result = agent.run(full_query)
-        print(" Raw result from LLM:", result)
+            # ➔ Convert if result is a column-based dict
+            if isinstance(parsed, dict) and "client_name" in parsed and "value" in parsed:
+                result_dict = dict(zip(parsed["client_name"], map(float, parsed["value"])))
+            else:
+                result_dict = parsed
 
-        # ➔ Parse JSON dictionary from LLM result
-        match = re.search(r"{.*}", result, re.DOTALL)
-        if match:
+            answer = mapping_result(result_dict)
+        except Exception as e:
+            print("⚠️ JSON parse failed:", e)
+        else:
+            # ➔ Keep the generated code for questions of the same shape
             try:
-                parsed = json.loads(match.group())
+                with span("plan_cache.learn"):
+                    plan_cache.learn(query, snapshot, capture, result_dict)
+            except Exception as e:
+                print("⚠️ Plan capture failed:", e)
+            return answer
 
-                # ➔ Convert if result is a column-based dict
-                if isinstance(parsed, dict) and "client_name" in parsed and "value" in parsed:
-                    result_dict = dict(zip(parsed["client_name"], map(float, parsed["value"])))
-                else:
-                    result_dict = parsed
+    # ➔ If result is plain text (no JSON), return consistent empty graph/table
+    return {
+        "text": result if isinstance(result, str) else str(result),
+        "graph": [],
+        "table": []
+    }
 
-                graph_data = [{"label": k, "value": v} for k, v in result_dict.items()]
-                table_data = [{"client": k, "portfolio_value": v} for k, v in result_dict.items()]
-                summary_text = "\n".join([f"{k}: {v}" for k, v in result_dict.items()])
 
-                return {
-                    "text": f"Here is your result:\n{summary_text}",
-                    "graph": graph_data,
-                    "table": table_data
-                }
+def mapping_result(result_dict):
+    graph_data = [{"label": k, "value": v} for k, v in result_dict.items()]
+    table_data = [{"client": k, "portfolio_value": v} for k, v in result_dict.items()]
+    summary_text = "\n".join([f"{k}: {v}" for k, v in result_dict.items()])
 
-            except Exception as e:
-                print("⚠️ JSON parse failed:", e)
+    return {
+        "text": f"Here is your result:\n{summary_text}",
+        "graph": graph_data,
+        "table": table_data
+    }
+
+
+# Agent-written code cached for this question's template, re-run on the
+# current snapshot; None when there is no usable plan
+def answer_from_plan(query, snapshot):
+    with span("plan_cache.run"):
+        mapping = plan_cache.lookup(query, snapshot)
+    return None if mapping is None else mapping_result(mapping)
+
+
+# Main query runner
+def run_query(query: str, on_event=None) -> dict:
+    on_event = on_event or _no_event
+    try:
+        # ➔ Recognized intents pushed down to MySQL/MongoDB (no snapshot needed)
+        if use_pushdown():
+            with span("pushdown"):
+                fast_answer = answer_pushdown(query)
+            if fast_answer is not None:
+                query_routes.inc(path="pushdown")
+                on_event("route", {"path": "pushdown"})
+                return fast_answer
+
+        with span("data.load"):
+            snapshot = get_snapshot()
+        on_event("snapshot", {"version": snapshot.version, "rows": len(snapshot.frame)})
+
+        # ➔ Deterministic intents (top-N, breakdowns, stock holders, filters)
+        with span("fast_path.match"):
+            fast_answer = answer_question(query, snapshot)
+        if fast_answer is not None:
+            query_routes.inc(path="fast_path")
+            on_event("route", {"path": "fast_path"})
+            return fast_answer
+
+        # ➔ Code the agent wrote earlier for the same kind of question
+        plan_answer = answer_from_plan(query, snapshot)
+        if plan_answer is not None:
+            query_routes.inc(path="plan_cache")
+            on_event("route", {"path": "plan_cache"})
+            return plan_answer
 
-        # ➔ If result is plain text (no JSON), return consistent empty graph/table
-        return {
-            "text": result if isinstance(result, str) else str(result),
-            "graph": [],
-            "table": []
-        }
+        # ➔ For all other queries, route to LLM agent with business instructions
+        query_routes.inc(path="agent")
+        on_event("route", {"path": "agent"})
+        return run_agent(query, snapshot, on_event)
 
+    except Overloaded:
+        raise
     except Exception as e:
-        return {
-            "text": f" Error: {str(e)}",
-            "graph": [],
-            "table": []
-        }
+        return error_result(e)
+
+
+def error_result(e):
+    return {
+        "text": f" Error: {str(e)}",
+        "graph": [],
+        "table": []
+    }
 
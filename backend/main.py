@@ -1,26 +1,46 @@
 from fastapi import FastAPI, Request, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
-from langchain_agent import run_query
-from pymongo import MongoClient
-import mysql.connector
+from langchain_agent import get_agent, run_query
+from snapshot import snapshot_manager
+from intents import intent_stats, prepare
+from planner import answer_version, pushdown_stats
+from answer_cache import answer_cache
+from plan_cache import plan_cache
+from prompt_context import prompt_context
+from sandbox import sandbox_pool
+from query_executor import query_executor, llm_slots, Overloaded
+from db import get_mongo_db, health_check, pool_stats
+from dashboard_metrics import dashboard_metrics
+from cube import cube_manager, get_cube
+from batch import QUERY_BATCH_MAX, batch_key, run_batch
+from exports import EXPORT_BATCH_SIZE, export_response
+from client_profiles import (
+    CLIENTS_MAX_PAGE_SIZE, CLIENTS_PAGE_SIZE, ensure_indexes as ensure_client_indexes, etag as client_etag,
+    etag_matches, list_clients, parse_fields,
+)
+from instrumentation import (
+    SERVER_TIMING, end_request, http_seconds, query_routes, registry, server_timing, span, start_request,
+)
+from warmup import WARMUP, Warmup
+from query_history import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, clear_queries, delete_query, iter_queries, list_queries, record_queries,
+    record_query,
+    ensure_indexes as ensure_history_indexes,
+)
 import os
+import time
 from datetime import datetime
-import csv
-from io import StringIO
+import json
+import asyncio
 
 #  Load environment variables
 load_dotenv()
 
 app = FastAPI()
 
-#  MongoDB setup
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-mongo_client = MongoClient(MONGO_URI)
-mongo_db = mongo_client["wealth_portfolio"]
-queries_collection = mongo_db["recent_queries"]
-
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -30,11 +50,107 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request latency histogram (by route template) and, when SERVER_TIMING
+# is enabled, a Server-Timing header listing the stages the request went through
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    token, timings = start_request()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = request.scope.get("route")
+        http_seconds.observe(
+            time.perf_counter() - started,
+            method=request.method, route=getattr(route, "path", "unmatched"), status=status,
+        )
+        end_request(token)
+    if SERVER_TIMING and timings:
+        response.headers["Server-Timing"] = server_timing(timings)
+    return response
+
+# Point-in-time gauges read when /metrics is scraped
+registry.gauge("snapshot_version", "Loaded snapshot version", lambda: snapshot_manager.version)
+registry.gauge("snapshot_rows", "Rows in the merged snapshot", lambda: snapshot_manager.stats()["rows"])
+registry.gauge("snapshot_memory_bytes", "Snapshot memory", lambda: snapshot_manager.stats()["memory_bytes"])
+registry.gauge("cube_cells", "Base cells in the aggregate cube", lambda: cube_manager.stats()["cells"])
+registry.gauge("answer_cache_entries", "Cached answers", lambda: answer_cache.stats()["size"])
+registry.gauge("sandbox_busy", "Sandbox workers running code", lambda: sandbox_pool.stats()["busy"])
+registry.gauge("plan_cache_entries", "Cached agent plans", lambda: plan_cache.stats()["size"])
+registry.gauge("query_pending", "Questions queued or running", lambda: query_executor.stats()["pending"])
+registry.gauge("llm_in_flight", "LLM calls in progress", lambda: llm_slots.stats()["in_flight"])
+registry.gauge("mysql_pool_in_use", "Borrowed MySQL connections", lambda: pool_stats()["mysql"]["in_use"])
+
+def ensure_indexes():
+    ensure_history_indexes()
+    ensure_client_indexes()
+
+def warm_agent():
+    # Best effort: without a working LLM config the fast paths still answer
+    try:
+        get_agent(snapshot_manager.get())
+    except Exception as e:
+        print("⚠️ Could not prepare the LLM agent:", e)
+
+# ➔ Startup warmup, in dependency order (each step is retried until it succeeds)
+warmup = Warmup([
+    ("indexes", ensure_indexes),
+    ("snapshot", snapshot_manager.get),
+    ("intents", lambda: prepare(snapshot_manager.get())),
+    ("cube", lambda: get_cube(snapshot_manager.get())),
+    ("context", lambda: prompt_context.sections(snapshot_manager.get())),
+    ("sandbox", lambda: sandbox_pool.prestart(snapshot_manager.get())),
+    ("agent", warm_agent),
+])
+
+# Keep the merged data snapshot fresh in the background
+@app.on_event("startup")
+def start_snapshot_refresh():
+    snapshot_manager.start_scheduler()
+    if WARMUP:
+        warmup.start()
+        return
+    warmup.skip()
+    try:
+        ensure_indexes()
+    except Exception as e:
+        print("⚠️ Could not prepare MongoDB indexes:", e)
+
+@app.on_event("shutdown")
+def stop_snapshot_refresh():
+    warmup.stop()
+    snapshot_manager.stop_scheduler()
+    query_executor.shutdown()
+    sandbox_pool.close()
+
 #  Root test endpoint
 @app.get("/")
 def read_root():
     return {"message": " Valuefy RAG Backend is Running 🚀"}
 
+# Answer from the cache when the same (normalized) question was already
+# answered against the current data version
+def answer_query(question, on_event=None):
+    try:
+        version = answer_version()
+    except Exception:
+        version = None
+    if version is None:
+        return run_query(question, on_event)
+
+    result = answer_cache.get(question, version)
+    if result is not None:
+        query_routes.inc(path="cache")
+        if on_event:
+            on_event("route", {"path": "cache"})
+    else:
+        result = run_query(question, on_event)
+        if not result.get("text", "").strip().startswith("Error:"):
+            answer_cache.put(question, version, result)
+    return result
+
 # Handle Query & Store in MongoDB
 @app.post("/query")
 async def handle_query(request: Request):
@@ -44,159 +160,314 @@ async def handle_query(request: Request):
     if not question:
         return {"error": "No question provided"}
 
-    result = run_query(question)
+    # ➔ Blocking DB/LLM work runs on the query pool, never on the event loop
+    try:
+        result = await query_executor.submit(question, answer_query)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    await query_executor.run(record_query, question)
+
+    return _query_response(result)
+
+def _query_response(result):
+    with span("response.build"):
+        return {
+            "response": result.get("text", ""),
+            "graph_data": result.get("graph", []),
+            "table_data": result.get("table", [])
+        }
+
+# Answer a list of questions against one data snapshot. Results come back
+# in question order, or with "stream": true as NDJSON lines as they complete
+@app.post("/query/batch")
+async def handle_query_batch(request: Request):
+    data = await request.json()
+    questions = data.get("questions") or []
+    stream = bool(data.get("stream", False))
+
+    if not isinstance(questions, list) or not questions:
+        return {"error": "No questions provided"}
+    if not all(isinstance(q, str) and q.strip() for q in questions):
+        raise HTTPException(status_code=400, detail="Every question must be a non-empty string")
+    if len(questions) > QUERY_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {QUERY_BATCH_MAX} questions per batch")
+
+    def batch_item(i, result, route):
+        return {"index": i, "question": questions[i], "route": route, **_query_response(result)}
 
-    timestamp = datetime.now().strftime("%d-%b %I:%M %p")
-    queries_collection.insert_one({"text": question, "time": timestamp})
+    if not stream:
+        try:
+            results = await query_executor.submit(questions, run_batch, key=batch_key(questions))
+        except Overloaded as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        await query_executor.run(record_queries, questions)
+        return {"results": [batch_item(i, result, route) for i, (result, route) in enumerate(results)]}
 
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+
+    def emit(i, result, route):
+        loop.call_soon_threadsafe(items.put_nowait, batch_item(i, result, route))
+
+    # Streamed answers go to this caller only: never shared with another batch
+    try:
+        work = query_executor.submit(questions, run_batch, emit, key=object())
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def produce():
+        try:
+            await work
+            await query_executor.run(record_queries, questions)
+        except Exception as e:
+            items.put_nowait({"error": str(e)})
+        finally:
+            items.put_nowait(None)
+
+    async def lines():
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await items.get()
+                if item is None:
+                    break
+                yield json.dumps(item, default=str) + "\n"
+        finally:
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# Export the table result of a question as CSV / NDJSON
+@app.api_route("/query/export", methods=["GET", "POST"])
+async def export_query(request: Request, question: str = Query(""), format: str = "csv"):
+    if request.method == "POST":
+        data = await request.json()
+        question = data.get("question", question)
+        format = data.get("format", format)
+
+    if not question:
+        return {"error": "No question provided"}
+
+    try:
+        result = await query_executor.submit(question, answer_query)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    columns = [("Client", "client"), ("Portfolio Value", "portfolio_value")]
+    return export_response(iter(result.get("table", [])), columns, format, "query_result")
+
+# Streaming variant of /query: server-sent events with progress
+# (snapshot, route, agent steps, LLM tokens) followed by the final payload
+@app.api_route("/query/stream", methods=["GET", "POST"])
+async def stream_query(request: Request, question: str = Query("")):
+    if request.method == "POST":
+        data = await request.json()
+        question = data.get("question", "")
+
+    if not question:
+        return {"error": "No question provided"}
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def emit(event, data):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    # Progress events go to this caller only: never shared with another request
+    try:
+        work = query_executor.submit(question, answer_query, emit, key=object())
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def produce():
+        try:
+            result = await work
+            emit("result", _query_response(result))
+            await query_executor.run(record_query, question)
+        except Exception as e:
+            emit("error", {"detail": str(e)})
+        finally:
+            emit(None, None)
+
+    async def event_stream():
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                event, data = await events.get()
+                if event is None:
+                    break
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        finally:
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+# Force a data snapshot refresh (incremental unless full=true)
+@app.post("/snapshot/refresh")
+def refresh_snapshot(full: bool = False):
+    try:
+        snap = snapshot_manager.refresh(force=full)
+        return {"version": snap.version, "rows": len(snap.frame)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Memory footprint of the merged snapshot, per column and dtype
+@app.get("/snapshot/memory")
+def get_snapshot_memory():
+    return snapshot_manager.memory() or {"rows": 0, "bytes": 0, "columns": {}}
+
+# Prometheus metrics: stage/HTTP latency histograms, LLM token counters, gauges
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+# Database connectivity check
+@app.get("/health")
+def get_health():
+    status = health_check()
+    healthy = all(v == "ok" for v in status.values())
+    if not healthy:
+        raise HTTPException(status_code=503, detail=status)
+    return {"status": "ok", **status}
+
+# Readiness: 503 until the startup warmup has finished (200 right away with WARMUP=false)
+@app.get("/ready")
+def get_ready():
+    status = warmup.status()
+    if not status["ready"]:
+        return JSONResponse(status, status_code=503)
+    return status
+
+# Backend cache / snapshot statistics
+@app.get("/stats")
+def get_stats():
     return {
-        "response": result.get("text", ""),
-        "graph_data": result.get("graph", []),
-        "table_data": result.get("table", [])
+        "snapshot": snapshot_manager.stats(),
+        "intents": intent_stats(),
+        "pushdown": pushdown_stats(),
+        "answer_cache": answer_cache.stats(),
+        "plan_cache": plan_cache.stats(),
+        "prompt_context": prompt_context.stats(),
+        "sandbox": sandbox_pool.stats(),
+        "query_executor": query_executor.stats(),
+        "pools": pool_stats(),
+        "dashboard": dashboard_metrics.stats(),
+        "cube": cube_manager.stats(),
     }
 
 # Get all client profiles
 @app.get("/clients")
-def get_all_clients():
-    clients = list(mongo_db["client_profiles"].find({}, {"_id": 0}))
-    return {"clients": clients}
+def get_all_clients(request: Request, limit: int = Query(CLIENTS_PAGE_SIZE, ge=1, le=CLIENTS_MAX_PAGE_SIZE),
+                    cursor: str = None, fields: str = None):
+    return clients_page(request, {}, limit, cursor, fields)
+
+# Export client profiles as CSV / NDJSON (optionally filtered)
+@app.get("/clients/export")
+def export_clients(format: str = "csv", risk: str = None, preference: str = None):
+    query = {}
+    if risk:
+        query["risk_appetite"] = risk.capitalize()
+    if preference:
+        query["investment_preferences"] = preference
+    rows = get_mongo_db()["client_profiles"].find(query, {"_id": 0}).batch_size(EXPORT_BATCH_SIZE)
+    columns = [
+        ("Client", "client_name"),
+        ("Risk Appetite", "risk_appetite"),
+        ("Investment Preferences", "investment_preferences"),
+        ("Relationship Manager", "relationship_manager"),
+        ("Address", "address"),
+    ]
+    return export_response(rows, columns, format, "clients")
 
 # Get clients by risk appetite
 @app.get("/clients/risk/{risk_level}")
-def get_clients_by_risk(risk_level: str):
-    clients = list(mongo_db["client_profiles"].find({"risk_appetite": risk_level.capitalize()}, {"_id": 0}))
-    return {"clients": clients}
+def get_clients_by_risk(request: Request, risk_level: str,
+                        limit: int = Query(CLIENTS_PAGE_SIZE, ge=1, le=CLIENTS_MAX_PAGE_SIZE),
+                        cursor: str = None, fields: str = None):
+    return clients_page(request, {"risk_appetite": risk_level.capitalize()}, limit, cursor, fields)
 
 # Get clients by investment preference
 @app.get("/clients/preference/{preference}")
-def get_clients_by_preference(preference: str):
-    clients = list(mongo_db["client_profiles"].find({"investment_preferences": preference}, {"_id": 0}))
-    return {"clients": clients}
+def get_clients_by_preference(request: Request, preference: str,
+                              limit: int = Query(CLIENTS_PAGE_SIZE, ge=1, le=CLIENTS_MAX_PAGE_SIZE),
+                              cursor: str = None, fields: str = None):
+    return clients_page(request, {"investment_preferences": preference}, limit, cursor, fields)
 
-# Get all recent queries
-@app.get("/recent-queries")
-def get_recent_queries():
-    queries = list(queries_collection.find({}, {"_id": 0}).sort("_id", -1))
-    return {"queries": queries}
+# ➔ One page of profiles; 304 when the caller's ETag still matches the collection version
+def clients_page(request, query, limit, cursor, fields):
+    # Invalid fields are a 400 even for a caller holding an ETag
+    try:
+        projection = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    tag = client_etag(request.url.path, sorted(query.items()), limit, cursor, projection)
+    headers = {"ETag": tag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers=headers)
+    try:
+        clients, next_cursor = list_clients(query, limit=limit, cursor=cursor, fields=projection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(jsonable_encoder({"clients": clients, "next_cursor": next_cursor}), headers=headers)
 
-#  Delete specific query by index
-@app.delete("/recent-queries/{index}")
-def delete_recent_query(index: int):
+# Get recent queries (newest first, cursor-paginated)
+@app.get("/recent-queries")
+def get_recent_queries(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: str = None):
     try:
-        queries = list(queries_collection.find().sort("_id", -1))
-        if 0 <= index < len(queries):
-            to_delete = queries[index]
-            queries_collection.delete_one({"_id": to_delete["_id"]})
-            return {"message": "Deleted", "deleted": {"text": to_delete["text"], "time": to_delete["time"]}}
-        else:
-            raise HTTPException(status_code=404, detail="Query not found")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        queries, next_cursor = list_queries(limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {str(e)}")
+    return {"queries": queries, "next_cursor": next_cursor}
 
-#  Clear all recent queries
+#  Clear all recent queries (declared before /{query_id} so "clear" isn't taken as an id)
 @app.delete("/recent-queries/clear")
 def clear_recent_queries():
-    result = queries_collection.delete_many({})
-    return {"message": f"Deleted {result.deleted_count} queries"}
+    deleted = clear_queries()
+    return {"message": f"Deleted {deleted} queries"}
+
+#  Delete specific query by id
+@app.delete("/recent-queries/{query_id}")
+def delete_recent_query(query_id: str):
+    deleted = delete_query(query_id)
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Query not found")
+    return {"message": "Deleted", "deleted": deleted}
 
-# Export recent queries as CSV
+# Export recent queries as CSV (or NDJSON), streamed from a MongoDB cursor
 @app.get("/recent-queries/export")
-def export_recent_queries():
-    queries = list(queries_collection.find({}, {"_id": 0}).sort("_id", -1))
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Query", "Timestamp"])
-    for q in queries:
-        writer.writerow([q.get("text", ""), q.get("time", "")])
-    output.seek(0)
-    return StreamingResponse(output, media_type="text/csv", headers={
-        "Content-Disposition": "attachment; filename=recent_queries.csv"
-    })
+def export_recent_queries(format: str = "csv"):
+    rows = iter_queries(batch_size=EXPORT_BATCH_SIZE)
+    columns = [("Query", "text"), ("Timestamp", "time")]
+    return export_response(rows, columns, format, "recent_queries")
 
-# Filter recent queries by date range
+# Filter recent queries by date range (inclusive, evaluated by MongoDB)
 @app.get("/recent-queries/filter")
-def filter_recent_queries(start: str = Query(...), end: str = Query(...)):
+def filter_recent_queries(
+    start: str = Query(...),
+    end: str = Query(...),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+):
     try:
-        start_date = datetime.strptime(start, "%Y-%m-%d")
-        end_date = datetime.strptime(end, "%Y-%m-%d")
-        all_queries = list(queries_collection.find().sort("_id", -1))
-        filtered = [
-            q for q in all_queries
-            if start_date <= datetime.strptime(q["time"], "%d-%b %I:%M %p") <= end_date
-        ]
-        return {"queries": filtered}
-    except Exception as e:
+        start_date = datetime.strptime(start, "%Y-%m-%d").date()
+        end_date = datetime.strptime(end, "%Y-%m-%d").date()
+        queries, next_cursor = list_queries(limit=limit, cursor=cursor, start=start_date, end=end_date)
+        return {"queries": queries, "next_cursor": next_cursor}
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Date parsing error: {str(e)}")
 
 # Dashboard metrics with real charts data
+# (single-pass aggregates, updated incrementally as transactions arrive)
 @app.get("/dashboard-metrics")
 def get_dashboard_metrics():
     try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="Login@630",
-            database="wealth_portfolio"
-        )
-        cursor = conn.cursor(dictionary=True)
-
-        # ➔ Stats
-        cursor.execute("SELECT SUM(value) AS total_aum FROM transactions")
-        total_aum = cursor.fetchone()["total_aum"] or 0
-
-        cursor.execute("SELECT COUNT(DISTINCT relationship_manager) AS active_rms FROM transactions")
-        active_rms = cursor.fetchone()["active_rms"] or 0
-
-        cursor.execute("SELECT COUNT(*) AS high_risk FROM transactions WHERE value > 100000")
-        high_risk = cursor.fetchone()["high_risk"] or 0
-
-        cursor.execute("SELECT COUNT(DISTINCT client_name) AS top_portfolios FROM transactions")
-        top_portfolios = cursor.fetchone()["top_portfolios"] or 0
-
-        # ➔ Portfolio growth (month-wise aggregation)
-        cursor.execute("""
-            SELECT DATE_FORMAT(transaction_date, '%Y-%m') AS month, SUM(value) AS total
-            FROM transactions
-            GROUP BY month
-            ORDER BY month
-        """)
-        growth_rows = cursor.fetchall()
-        portfolio_growth = [{"month": row["month"], "value": float(row["total"])} for row in growth_rows]
-
-        # ➔ Asset allocation (percent per stock)
-        cursor.execute("""
-            SELECT stock_name, SUM(value) AS total
-            FROM transactions
-            GROUP BY stock_name
-        """)
-        asset_rows = cursor.fetchall()
-        grand_total = sum(row["total"] for row in asset_rows) or 1  # avoid division by zero
-        asset_allocation = [
-            {"asset": row["stock_name"], "percent": round(row["total"] * 100 / grand_total, 2)}
-            for row in asset_rows
-        ]
-
-        # ➔ Top RMs with clients managed
-        cursor.execute("""
-            SELECT relationship_manager, COUNT(*) as clients
-            FROM transactions
-            GROUP BY relationship_manager
-        """)
-        rms = cursor.fetchall()
-        rm_clients = [{"rm": r["relationship_manager"], "clients": r["clients"]} for r in rms]
-
-        cursor.close()
-        conn.close()
-
-        return {
-            "top_portfolios": int(top_portfolios),
-            "total_aum": f"₹{float(total_aum):,.0f}",
-            "active_rms": int(active_rms),
-            "high_risk": int(high_risk),
-            "portfolio_growth": portfolio_growth,
-            "asset_allocation": asset_allocation,
-            "rm_clients": rm_clients,
-        }
-
+        return dashboard_metrics.get()
     except Exception as e:
         return {"error": str(e)}
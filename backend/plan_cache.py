@@ -0,0 +1,313 @@
+# plan_cache.py
+#
+# Reuses the pandas code the LLM agent wrote for a question. After a
+# successful agent run the python_repl_ast steps are captured, the literals
+# that came from the question (entity names, N, amounts) are turned into
+# parameters, and the program is stored under the question's template
+# ("top <n> holders of <stock> by median value"). A later question with the
+# same template re-runs that program against the current snapshot with its
+# own values, so it gets fresh data without an LLM round trip. Plans are
+# only stored if re-running them reproduces the agent's answer, and a plan
+# that fails or returns nothing usable is dropped (the agent answers).
+
+import ast
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from langchain_core.callbacks.base import BaseCallbackHandler
+
+from answer_cache import FILLER_WORDS
+from intents import UNITS, _find_entities, normalize_question, prepare
+from sandbox import SandboxError, ToolFailure, sandbox_pool, sanitize_code
+
+load_dotenv()
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+
+REPL_TOOL = "python_repl_ast"
+NUMBER = re.compile(rf"\b(\d+(?:\.\d+)?)(?:\s+({'|'.join(sorted(UNITS, key=len, reverse=True))})\b)?")
+# Observation of a step that raised (python_repl_ast returns "NameError: ..."
+# etc.); the sandbox tool also marks its failures as ToolFailure
+TOOL_ERROR = re.compile(r"^[A-Z]\w*(?:Error|Exception|Timeout): ")
+
+SAFE_IMPORTS = {"pandas", "numpy", "math", "re", "datetime"}
+UNSAFE_CALLS = {
+    "eval", "exec", "compile", "open", "input", "__import__", "getattr", "setattr", "delattr",
+    "globals", "locals", "vars", "breakpoint", "exit", "quit",
+}
+# Methods that change a frame/array in place (plans run on the shared snapshot)
+UNSAFE_METHODS = {"insert", "pop", "update", "set_flags", "fill", "put", "itemset", "resize", "setflags", "sort"}
+READ_ONLY_TO = {
+    "to_dict", "to_list", "to_numpy", "to_frame", "to_string", "to_records", "to_period",
+    "to_datetime", "to_numeric", "to_timestamp", "to_pydatetime",
+}
+
+
+# ➔ Question templates
+
+def question_template(question, prepared):
+    """(template, values): entities and amounts replaced by placeholders.
+
+    `values` holds ("entity", value) / ("number", amount) in question order.
+    """
+    q = normalize_question(question)
+    found, spans = _find_entities(q, prepared)
+    slots = []
+    for start, end in spans:
+        # Names and preferences; risk phrases ("high risk") stay in the template
+        text = q[start:end]
+        match = next(((dim, v) for dim, values in found.items() for v in values
+                      if dim != "risk" and normalize_question(v) == text), None)
+        if match:
+            slots.append((start, end, f"<{match[0]}>", ("entity", match[1])))
+    for m in NUMBER.finditer(q):
+        if any(start < m.end() and m.start() < end for start, end in spans):
+            continue
+        amount = float(m.group(1)) * UNITS.get(m.group(2), 1)
+        placeholder = "<n>" if m.group(2) is None else f"<n> {m.group(2)}"
+        slots.append((m.start(), m.end(), placeholder, ("number", amount)))
+    slots.sort()
+
+    parts, values, pos = [], [], 0
+    for start, end, placeholder, value in slots:
+        parts.append(q[pos:start])
+        parts.append(f" {placeholder} ")
+        values.append(value)
+        pos = end
+    parts.append(q[pos:])
+    words = [w for w in "".join(parts).split() if w not in FILLER_WORDS]
+    return " ".join(words), values
+
+
+# ➔ Code checks and parameterization
+
+def _is_safe(tree):
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            if any(alias.name.split(".")[0] not in SAFE_IMPORTS for alias in node.names):
+                return False
+        elif isinstance(node, ast.ImportFrom):
+            if (node.module or "").split(".")[0] not in SAFE_IMPORTS:
+                return False
+        elif isinstance(node, (ast.Global, ast.Nonlocal, ast.Delete)):
+            return False
+        elif isinstance(node, ast.Attribute):
+            name = node.attr
+            if name.startswith("_") or name in UNSAFE_METHODS:
+                return False
+            if name.startswith("to_") and name not in READ_ONLY_TO:
+                return False
+        elif isinstance(node, ast.Name) and node.id.startswith("__"):
+            return False
+        elif isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Name) and node.func.id in UNSAFE_CALLS:
+                return False
+            if any(kw.arg == "inplace" for kw in node.keywords):
+                return False
+        elif isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+            # Only plain names may be assigned: never df[...] = / df.x =
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                for sub in ast.walk(target):
+                    if isinstance(sub, (ast.Subscript, ast.Attribute)):
+                        return False
+    return True
+
+
+def _literal_forms(value):
+    # How a question value may appear as a literal in the code
+    kind, v = value
+    if kind == "number":
+        return [(v, "number")]
+    return [(v, "exact"), (v.lower(), "lower"), (v.upper(), "upper")]
+
+
+class _Parameterize(ast.NodeTransformer):
+    def __init__(self, values):
+        self.values = values
+        self.used = set()
+        self.ambiguous = False
+
+    def visit_Constant(self, node):
+        matches = []
+        for i, value in enumerate(self.values):
+            for literal, form in _literal_forms(value):
+                if value[0] == "number":
+                    if isinstance(node.value, (int, float)) and not isinstance(node.value, bool) \
+                            and math.isclose(node.value, literal):
+                        matches.append((i, "int" if isinstance(node.value, int) else "float"))
+                elif isinstance(node.value, str) and node.value == literal:
+                    matches.append((i, form))
+        if not matches:
+            return node
+        if len({i for i, _ in matches}) > 1:
+            self.ambiguous = True
+            return node
+        i, form = matches[0]
+        self.used.add(i)
+        return ast.copy_location(ast.Name(id=f"__p{i}_{form}", ctx=ast.Load()), node)
+
+
+def _param_values(values):
+    params = {}
+    for i, (kind, v) in enumerate(values):
+        if kind == "number":
+            params[f"__p{i}_int"] = int(round(v))
+            params[f"__p{i}_float"] = float(v)
+        else:
+            params[f"__p{i}_exact"] = v
+            params[f"__p{i}_lower"] = v.lower()
+            params[f"__p{i}_upper"] = v.upper()
+    return params
+
+
+# ➔ Running plans
+
+def _run_plan(program, snapshot, values):
+    """Answer mapping of a parameterized program, or None if it failed."""
+    status, mapping = sandbox_pool.run(program, snapshot, _param_values(values), want="mapping")
+    if status != "ok":
+        print("⚠️ Cached plan failed:", mapping)
+        return None
+    return mapping
+
+
+def _same_values(a, b):
+    if len(a) != len(b):
+        return False
+    return all(math.isclose(x, y, rel_tol=1e-6, abs_tol=0.01)
+               for x, y in zip(sorted(a.values()), sorted(b.values())))
+
+
+class CodeCaptureHandler(BaseCallbackHandler):
+    """Collects the python_repl_ast code of one agent run, in order."""
+
+    def __init__(self):
+        self.steps = []       # [code, succeeded]
+        self._pending = None
+
+    def on_agent_action(self, action, **kwargs):
+        self._pending = None
+        if action.tool == REPL_TOOL:
+            self._pending = [sanitize_code(str(action.tool_input)), True]
+            self.steps.append(self._pending)
+
+    def on_tool_end(self, output, **kwargs):
+        if self._pending is not None and (isinstance(output, ToolFailure) or TOOL_ERROR.match(str(output))):
+            self._pending[1] = False
+        self._pending = None
+
+    def on_tool_error(self, error, **kwargs):
+        if self._pending is not None:
+            self._pending[1] = False
+        self._pending = None
+
+    def program(self):
+        return "\n".join(code for code, ok in self.steps if ok)
+
+
+class PlanCache:
+    """Bounded LRU of parameterized agent programs keyed on question template."""
+
+    def __init__(self, maxsize=PLAN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._plans = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._learned = 0
+        self._rejected = 0
+        self._failures = 0
+
+    def lookup(self, question, snapshot):
+        """Answer mapping from a cached plan, or None (the agent should run)."""
+        if not self.maxsize:
+            return None
+        template, values = question_template(question, prepare(snapshot))
+        with self._lock:
+            program = self._plans.get(template)
+            if program is None:
+                self._misses += 1
+                return None
+            self._plans.move_to_end(template)
+        try:
+            mapping = _run_plan(program, snapshot, values)
+        except SandboxError as e:
+            print("⚠️ Cached plan failed:", e)
+            mapping = None
+        with self._lock:
+            if mapping is None:
+                # Stale for this data/schema: forget it and let the agent answer
+                self._failures += 1
+                self._misses += 1
+                if self._plans.get(template) == program:
+                    del self._plans[template]
+                return None
+            self._hits += 1
+        return mapping
+
+    def learn(self, question, snapshot, capture, answer):
+        """Store the captured program if it reproduces the agent's `answer`."""
+        if not self.maxsize or not isinstance(answer, dict):
+            return False
+        program = capture.program()
+        stored = self._parameterize(question, snapshot, program, answer) if program else None
+        with self._lock:
+            if stored is None:
+                self._rejected += 1
+                return False
+            template, parameterized = stored
+            self._plans[template] = parameterized
+            self._plans.move_to_end(template)
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+            self._learned += 1
+        return True
+
+    def _parameterize(self, question, snapshot, program, answer):
+        try:
+            expected = {str(k): float(v) for k, v in answer.items()}
+            tree = ast.parse(program)
+        except (TypeError, ValueError, SyntaxError):
+            return None
+        if not expected or not _is_safe(tree):
+            return None
+        template, values = question_template(question, prepare(snapshot))
+        transformer = _Parameterize(values)
+        tree = ast.fix_missing_locations(transformer.visit(tree))
+        # Every value taken from the question must drive the code
+        if transformer.ambiguous or len(transformer.used) != len(values):
+            return None
+        parameterized = ast.unparse(tree)
+        try:
+            replayed = _run_plan(parameterized, snapshot, values)
+        except SandboxError:
+            return None
+        if replayed is None or not _same_values(replayed, expected):
+            return None
+        return template, parameterized
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._plans),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "learned": self._learned,
+                "rejected": self._rejected,
+                "failures": self._failures,
+            }
+
+
+plan_cache = PlanCache()
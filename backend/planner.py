@@ -0,0 +1,350 @@
+# planner.py
+#
+# Query pushdown for recognized intents. Instead of answering from the
+# merged in-memory snapshot, an IntentPlan is compiled to
+#   - a MongoDB $match + projection on the profile attributes the question
+#     needs (risk appetite, city, preferences), and
+#   - one MySQL aggregation over `transactions`
+#     (WHERE ... GROUP BY ... HAVING ... ORDER BY ... LIMIT),
+# and only those reduced results are joined in pandas. Parsing uses a small
+# catalog of entity values read from the stores (DISTINCT queries), so a
+# pushed-down answer never needs the full snapshot in memory.
+#
+# QUERY_PUSHDOWN=off always uses the snapshot; on always pushes recognized
+# intents down; auto (default) pushes down once the data has
+# PUSHDOWN_MIN_ROWS transaction rows, where scanning the merged snapshot
+# costs more than letting the databases aggregate. The decision is made
+# whenever a snapshot is published (startup warmup, scheduled refresh),
+# never on the request path.
+
+import os
+import threading
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from db import get_mongo_db, mysql_query
+from instrumentation import span
+from intents import (
+    DIMENSION_LABELS, EntityMatcher, build_preferences, build_vocab, finalize, format_result, parse_question,
+    record_match,
+)
+from snapshot import snapshot_manager
+
+load_dotenv()
+
+QUERY_PUSHDOWN = os.getenv("QUERY_PUSHDOWN", "auto").lower()
+# How long the entity catalog (clients, stocks, RMs, ...) is reused (seconds)
+PUSHDOWN_CATALOG_TTL = float(os.getenv("PUSHDOWN_CATALOG_TTL", "300"))
+# Transaction rows from which auto mode pushes recognized intents down
+PUSHDOWN_MIN_ROWS = int(os.getenv("PUSHDOWN_MIN_ROWS", "2000000"))
+
+# Transaction-side SQL expression per dimension; risk and city live on the
+# Mongo profile and are joined in after the per-client aggregation
+SQL_KEYS = {
+    "client": "client_name",
+    "rm": "relationship_manager",
+    "stock": "stock_name",
+    # mysql-connector only substitutes %s: a literal '%' needs no escaping
+    "month": "DATE_FORMAT(transaction_date, '%Y-%m')",
+}
+PROFILE_FIELDS = {"risk": "risk_appetite", "address": "address"}
+SQL_AGGREGATES = {"sum": "SUM(value)", "mean": "AVG(value)", "count": "COUNT(*)"}
+
+
+# ➔ Pushdown mode
+
+class PushdownMode:
+    """Snapshot listener holding auto mode's decision, re-made from the row
+    count of every published snapshot."""
+
+    def __init__(self, min_rows=PUSHDOWN_MIN_ROWS):
+        self.min_rows = min_rows
+        self.rows = None
+        self.active = False
+
+    def published(self, snapshot, added, removed):
+        self.rows = len(snapshot.frame)  # one row per transaction
+        self.active = self.rows >= self.min_rows
+
+
+pushdown_mode = PushdownMode()
+snapshot_manager.add_listener(pushdown_mode)
+
+
+def use_pushdown():
+    if QUERY_PUSHDOWN != "auto":
+        return QUERY_PUSHDOWN == "on"
+    return pushdown_mode.active
+
+
+def answer_version(snapshot=None):
+    """Data version answers are cached under, or None to skip caching.
+
+    Each snapshot refresh that finds changes in either store bumps the
+    version, so it versions pushed-down answers too; those don't load the
+    snapshot for it, and aren't cached before a first snapshot exists.
+    """
+    if use_pushdown():
+        return snapshot_manager.version or None
+    return (snapshot or snapshot_manager.get()).version
+
+
+# ➔ Entity catalog (what the parser matches against)
+
+class Catalog:
+    """Entity values read straight from the stores, duck-typed like
+    intents.PreparedFrame for `parse_question`."""
+
+    def __init__(self):
+        profiles = get_mongo_db().client_profiles
+        self.clients = [c for c in profiles.distinct("client_name") if c]
+        stocks = _distinct_sql("stock_name")
+        rms = _distinct_sql("relationship_manager")
+        cities = [c for c in profiles.distinct("address") if c]
+
+        self.columns = {"client": "client_name", "rm": "relationship_manager", "stock": "stock_name",
+                        "month": None, "risk": "risk_appetite", "address": "address"}
+        self.vocab = build_vocab({"client": self.clients, "rm": rms, "stock": stocks, "address": cities})
+        self.risk_values = [v for v in profiles.distinct("risk_appetite") if v]
+        self.preferences = build_preferences(v for v in profiles.distinct("investment_preferences") if v)
+        self.matcher = EntityMatcher(self.vocab, self.risk_values, self.preferences)
+        self.loaded_at = time.monotonic()
+
+
+def _distinct_sql(column):
+    rows = mysql_query(f"SELECT DISTINCT {column} FROM transactions WHERE {column} <> ''", dictionary=False)
+    return [row[0] for row in rows if row[0]]
+
+
+_catalog_lock = threading.Lock()
+_catalog = None
+
+
+def get_catalog():
+    global _catalog
+    catalog = _catalog
+    if catalog is None or time.monotonic() - catalog.loaded_at > PUSHDOWN_CATALOG_TTL:
+        with _catalog_lock:
+            if _catalog is None or time.monotonic() - _catalog.loaded_at > PUSHDOWN_CATALOG_TTL:
+                _catalog = Catalog()
+            catalog = _catalog
+    return catalog
+
+
+# ➔ Compilation
+
+def _has_txn_filters(plan):
+    return bool(
+        {"rm", "stock"} & set(plan.filters)
+        or plan.date_from or plan.date_to or plan.min_value is not None
+    )
+
+
+def _needs_profiles(plan):
+    return bool(
+        {"risk", "address"} & set(plan.filters)
+        or plan.preferences
+        or plan.group_by in PROFILE_FIELDS
+        or _zero_fill(plan)
+        or (plan.agg == "nunique" and plan.group_by == "client" and not _has_txn_filters(plan))
+    )
+
+
+def _zero_fill(plan):
+    # Clients without (matching) transactions still appear with 0 in the
+    # snapshot's left join; only possible when no transaction-level filter
+    # excludes them
+    return plan.group_by == "client" and plan.agg != "nunique" and not _has_txn_filters(plan)
+
+
+def compile_profile_match(plan):
+    """MongoDB filter and projection for the profile side of `plan`."""
+    match = {}
+    if "client" in plan.filters:
+        match["client_name"] = {"$in": plan.filters["client"]}
+    for dim, field in PROFILE_FIELDS.items():
+        if dim in plan.filters:
+            match[field] = {"$in": plan.filters[dim]}
+    if plan.preferences:
+        match["investment_preferences"] = {"$all": plan.preferences}
+    projection = {"_id": 0, "client_name": 1}
+    if plan.group_by in PROFILE_FIELDS:
+        projection[PROFILE_FIELDS[plan.group_by]] = 1
+    return match, projection
+
+
+def compile_sql(plan, clients=None):
+    """MySQL aggregation for `plan`; returns (sql, params).
+
+    `clients` restricts the rows to the profiles matched in MongoDB. Plans
+    grouped by a profile attribute are aggregated per client here and
+    re-grouped after the join.
+    """
+    regroup = plan.group_by in PROFILE_FIELDS
+    key = SQL_KEYS["client"] if regroup else SQL_KEYS[plan.group_by]
+
+    where, params = [], []
+    for dim, values in plan.filters.items():
+        if dim in SQL_KEYS and dim != "month":
+            where.append(f"{SQL_KEYS[dim]} IN ({', '.join(['%s'] * len(values))})")
+            params.extend(values)
+    if clients is not None:
+        where.append(f"client_name IN ({', '.join(['%s'] * len(clients))})")
+        params.extend(clients)
+    if plan.date_from is not None:
+        where.append("transaction_date >= %s")
+        params.append(plan.date_from)
+    if plan.date_to is not None:
+        where.append("transaction_date < %s")
+        params.append(plan.date_to)
+    if plan.min_value is not None:
+        where.append("value > %s")
+        params.append(plan.min_value)
+    if plan.max_value is not None:
+        where.append("value < %s")
+        params.append(plan.max_value)
+    # Blank keys are dropped by finalize(); drop them before LIMIT as well
+    if plan.group_by == "month":
+        where.append("transaction_date IS NOT NULL")
+    else:
+        where.append(f"{key} IS NOT NULL AND {key} <> ''")
+    where_sql = " AND ".join(where)
+
+    if plan.agg == "nunique" and not regroup:
+        return f"SELECT COUNT(DISTINCT {key}) AS value FROM transactions WHERE {where_sql}", tuple(params)
+    if regroup:
+        return (
+            f"SELECT {key} AS label, SUM(value) AS total, COUNT(*) AS n "
+            f"FROM transactions WHERE {where_sql} GROUP BY label",
+            tuple(params),
+        )
+
+    measure = SQL_AGGREGATES[plan.agg]
+    sql = f"SELECT {key} AS label, {measure} AS value FROM transactions WHERE {where_sql} GROUP BY label"
+    having = []
+    if plan.having_min is not None:
+        having.append(f"{measure} > %s")
+        params.append(plan.having_min)
+    if plan.having_max is not None:
+        having.append(f"{measure} < %s")
+        params.append(plan.having_max)
+    if having:
+        sql += " HAVING " + " AND ".join(having)
+    if plan.group_by == "month" and not plan.n:
+        sql += " ORDER BY label"
+    elif not _zero_fill(plan):
+        sql += f" ORDER BY value {'ASC' if plan.ascending else 'DESC'}, label"
+        if plan.n:
+            sql += f" LIMIT {int(plan.n)}"
+    return sql, tuple(params)
+
+
+# ➔ Execution
+
+def execute_pushdown(plan, catalog):
+    """Run `plan` against MySQL/MongoDB; returns a label -> value Series."""
+    profiles = None
+    clients = None
+    if _needs_profiles(plan):
+        match, projection = compile_profile_match(plan)
+        fields = [f for f, keep in projection.items() if keep]
+        with span("pushdown.mongo"):
+            docs = list(get_mongo_db().client_profiles.find(match, projection))
+        profiles = pd.DataFrame(docs, columns=fields)
+        clients = sorted(set(profiles["client_name"].dropna()))
+        profile_filtered = bool(match)
+        if not clients:
+            return _empty(plan)
+        if not profile_filtered:
+            clients = None  # every profile: no need to ship the names to MySQL
+
+    # ➔ Scalar counts that MongoDB alone can answer
+    if plan.agg == "nunique" and not _has_txn_filters(plan) and plan.group_by in ("client", *PROFILE_FIELDS):
+        column = "client_name" if plan.group_by == "client" else PROFILE_FIELDS[plan.group_by]
+        values = profiles[column].dropna().astype(str)
+        return pd.Series({DIMENSION_LABELS[plan.group_by]: values[values != ""].nunique()})
+
+    sql, params = compile_sql(plan, clients)
+    with span("pushdown.mysql"):
+        rows = pd.DataFrame(mysql_query(sql, params))
+    _stats_add("rows", len(rows))
+
+    if plan.agg == "nunique" and plan.group_by not in PROFILE_FIELDS:
+        count = 0 if rows.empty else int(rows["value"].iloc[0])
+        return pd.Series({DIMENSION_LABELS[plan.group_by]: count})
+
+    if plan.group_by in PROFILE_FIELDS:
+        return finalize(plan, _regroup(plan, rows, profiles))
+
+    result = pd.Series(dtype=float) if rows.empty else \
+        pd.Series(pd.to_numeric(rows["value"]).astype(float).to_numpy(), index=rows["label"].astype(str))
+    if plan.group_by == "client":
+        # Transactions of clients without a profile aren't in the snapshot either
+        known = set(catalog.clients) if profiles is None else set(profiles["client_name"].dropna())
+        result = result[result.index.isin(known)]
+        if _zero_fill(plan):
+            result = result.reindex(list(result.index) + sorted(known - set(result.index)), fill_value=0.0)
+    return finalize(plan, result)
+
+
+def _regroup(plan, rows, profiles):
+    # Per-client SQL totals joined to the profile attribute, then re-aggregated
+    field = PROFILE_FIELDS[plan.group_by]
+    if rows.empty:
+        return pd.Series(dtype=float)
+    joined = rows.merge(profiles[["client_name", field]], left_on="label", right_on="client_name")
+    joined["total"] = pd.to_numeric(joined["total"]).astype(float)
+    joined["n"] = pd.to_numeric(joined["n"]).astype(int)
+    if plan.agg == "nunique":
+        keys = joined[field].dropna().astype(str)
+        return pd.Series({DIMENSION_LABELS[plan.group_by]: keys[keys != ""].nunique()})
+    grouped = joined.groupby(field, sort=False)[["total", "n"]].sum()
+    if plan.agg == "sum":
+        return grouped["total"]
+    if plan.agg == "count":
+        return grouped["n"]
+    return grouped["total"] / grouped["n"]
+
+
+def _empty(plan):
+    if plan.agg == "nunique":
+        return pd.Series({DIMENSION_LABELS[plan.group_by]: 0})
+    return pd.Series(dtype=float)
+
+
+# ➔ Stats
+
+_stats_lock = threading.Lock()
+_stats = {"pushed_down": 0, "failed": 0, "rows": 0}
+
+
+def _stats_add(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def pushdown_stats():
+    with _stats_lock:
+        return {"mode": QUERY_PUSHDOWN, "active": use_pushdown(), "min_rows": pushdown_mode.min_rows,
+                "snapshot_rows": pushdown_mode.rows, **_stats}
+
+
+def answer_pushdown(question):
+    """Answer `question` by pushing its plan down to the stores, or return
+    None (not a recognized intent, or the stores failed) so the caller can
+    fall back to the snapshot/agent path."""
+    try:
+        catalog = get_catalog()
+        plan = parse_question(question, catalog)
+        if plan is None:
+            return None
+        answer = format_result(plan, execute_pushdown(plan, catalog))
+    except Exception as e:
+        _stats_add("failed")
+        print("⚠️ Query pushdown failed:", e)
+        return None
+    record_match(plan)
+    _stats_add("pushed_down")
+    return answer
@@ -0,0 +1,166 @@
+# prompt_context.py
+#
+# What the LLM agent is told about the data, instead of raw frame rows: a
+# schema summary (dtype, distinct values, sample values or ranges per
+# column) and small pre-aggregated views (value per relationship manager,
+# largest client portfolios). The pieces are built once per snapshot
+# version; each request then packs as many of them as fit its token budget,
+# highest priority first, so the prompt stays the same size as data grows.
+
+import os
+import threading
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from schema import resolve_columns
+
+load_dotenv()
+
+# Tokens for the agent input (instruction + data context + question); the
+# agent's own tool/format template and scratchpad come on top of this
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "700"))
+CONTEXT_TOP_CLIENTS = int(os.getenv("CONTEXT_TOP_CLIENTS", "10"))
+SAMPLE_VALUES = 3
+# No tokenizer for the hosted model here: ~4 characters per token is close
+# enough for budgeting English text and numbers
+CHARS_PER_TOKEN = 4
+
+COLUMN_NOTES = {
+    "relationship_manager_x": "RM on the client profile",
+    "relationship_manager_y": "RM on the transaction",
+    "investment_preferences": "comma-separated list",
+}
+
+
+class PromptTooLong(ValueError):
+    pass
+
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _number(value):
+    return f"{value:,.0f}" if abs(value) >= 100 or float(value).is_integer() else f"{value:,.2f}"
+
+
+def _column_line(df, col):
+    series = df[col]
+    note = COLUMN_NOTES.get(col)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        valid = series.dropna()
+        span_text = f"{valid.min():%Y-%m-%d} to {valid.max():%Y-%m-%d}" if len(valid) else "empty"
+        detail = f"datetime, {span_text}"
+    elif pd.api.types.is_numeric_dtype(series):
+        detail = f"{series.dtype}, {_number(series.min())} to {_number(series.max())}, median {_number(series.median())}"
+    else:
+        counts = series.value_counts()
+        counts = counts[(counts > 0) & (counts.index != "")]
+        if note == "comma-separated list":
+            # Count items per distinct list rather than splitting every row
+            lists = pd.DataFrame({"item": counts.index.astype(str).str.split(", "), "rows": counts.to_numpy()})
+            counts = lists.explode("item").groupby("item")["rows"].sum().sort_values(ascending=False)
+        samples = ", ".join(str(v) for v in counts.index[:SAMPLE_VALUES])
+        kind = "category" if isinstance(series.dtype, pd.CategoricalDtype) else "text"
+        detail = f"{kind}, {len(counts):,} distinct, e.g. {samples}"
+    return f"- {col} ({note}): {detail}" if note else f"- {col}: {detail}"
+
+
+def build_sections(df):
+    """[(title, [item, ...])] in priority order; items are dropped from the
+    end of a section (and later sections) first when the budget is tight."""
+    columns = resolve_columns(df)
+    sections = [
+        (f"`df` has {len(df):,} rows, one per transaction (profile columns repeat on each row). Columns:",
+         [_column_line(df, col) for col in df.columns]),
+    ]
+    if len(df) and "value" in df.columns:
+        rm_col = columns["rm"]
+        if rm_col:
+            per_rm = df.groupby(rm_col, observed=True)["value"].agg(["sum", "size"])
+            per_rm = per_rm[per_rm.index != ""].sort_values("sum", ascending=False)
+            sections.append((
+                f"Total value (transactions) per relationship manager, {rm_col}:",
+                [f"{rm}: {_number(row['sum'])} ({int(row['size']):,})" for rm, row in per_rm.iterrows()],
+            ))
+        per_client = df.groupby("client_name", observed=True)["value"].agg(["sum", "size"])
+        per_client = per_client[per_client.index != ""].nlargest(CONTEXT_TOP_CLIENTS, "sum")
+        sections.append((
+            f"Largest client portfolios of {df['client_name'].nunique():,}, total value (transactions):",
+            [f"{client}: {_number(row['sum'])} ({int(row['size']):,})" for client, row in per_client.iterrows()],
+        ))
+    return sections
+
+
+def pack(sections, budget):
+    """Render as much of `sections` as fits in `budget` tokens; returns
+    (text, complete)."""
+    lines, used = [], 0
+    for title, items in sections:
+        # A section title is only worth its tokens with at least one item
+        head = estimate_tokens(title) + 1
+        fitted = []
+        for item in items:
+            cost = estimate_tokens(item) + 1
+            if used + head + cost > budget:
+                break
+            fitted.append(item)
+            used += cost
+        if not fitted:
+            return "\n".join(lines), False
+        used += head
+        lines.append(title)
+        lines.extend(fitted)
+        if len(fitted) < len(items):
+            return "\n".join(lines), False
+    return "\n".join(lines), True
+
+
+class PromptContextBuilder:
+    def __init__(self, budget=PROMPT_TOKEN_BUDGET):
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._version = None
+        self._sections = None
+        self._builds = 0
+        self._requests = 0
+        self._truncated = 0
+        self._last_tokens = 0
+
+    def sections(self, snapshot):
+        with self._lock:
+            if self._version != snapshot.version:
+                self._sections = build_sections(snapshot.frame)
+                self._version = snapshot.version
+                self._builds += 1
+            return self._sections
+
+    def render(self, snapshot, instruction, question):
+        """Agent input for `question` within the token budget; raises
+        PromptTooLong when the instruction and question alone exceed it."""
+        head, tail = f"{instruction}\n\n", f"\n\nQuestion: {question}"
+        remaining = self.budget - estimate_tokens(head + tail)
+        if remaining < 0:
+            raise PromptTooLong(f"question is too long (budget is {self.budget} tokens)")
+        context, complete = pack(self.sections(snapshot), remaining)
+        text = head + context + tail
+        with self._lock:
+            self._requests += 1
+            self._truncated += not complete
+            self._last_tokens = estimate_tokens(text)
+        return text
+
+    def stats(self):
+        with self._lock:
+            return {
+                "budget_tokens": self.budget,
+                "version": self._version,
+                "builds": self._builds,
+                "requests": self._requests,
+                "truncated": self._truncated,
+                "last_input_tokens": self._last_tokens,
+            }
+
+
+prompt_context = PromptContextBuilder()
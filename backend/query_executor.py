@@ -0,0 +1,136 @@
+# query_executor.py
+
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from answer_cache import cache_key
+
+load_dotenv()
+
+# Worker threads that run the (blocking) query pipeline off the event loop
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "8"))
+# Requests allowed to wait for a worker before /query answers 503
+QUERY_MAX_PENDING = int(os.getenv("QUERY_MAX_PENDING", "64"))
+# Concurrent LLM calls, and how long a request may queue for one (seconds)
+MAX_INFLIGHT_LLM = int(os.getenv("MAX_INFLIGHT_LLM", "4"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+
+
+class Overloaded(Exception):
+    pass
+
+
+class LLMSlots:
+    """Caps in-flight LLM calls; callers queue up to LLM_QUEUE_TIMEOUT."""
+
+    def __init__(self, limit=MAX_INFLIGHT_LLM, timeout=LLM_QUEUE_TIMEOUT):
+        self.limit = limit
+        self.timeout = timeout
+        self._sem = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        self._rejected = 0
+
+    def __enter__(self):
+        with self._lock:
+            self._waiting += 1
+        acquired = self._sem.acquire(timeout=self.timeout)
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                self._rejected += 1
+            else:
+                self._in_flight += 1
+        if not acquired:
+            raise Overloaded("Too many questions are waiting for the language model, please retry shortly")
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self._in_flight -= 1
+        self._sem.release()
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "rejected": self._rejected,
+            }
+
+
+llm_slots = LLMSlots()
+
+
+class QueryExecutor:
+    """Runs blocking query work on a bounded thread pool.
+
+    Identical questions (same cache key) submitted while one is already
+    running share that computation instead of starting another; work that
+    can't be shared (streamed to its caller) is submitted under its own key.
+    """
+
+    def __init__(self, workers=QUERY_WORKERS, max_pending=QUERY_MAX_PENDING):
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query")
+        self._in_flight = {}
+        self._pending = 0
+        self._coalesced = 0
+        self._rejected = 0
+
+    async def run(self, func, *args):
+        # contextvars (e.g. per-request state) follow the call into the worker
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self._pool, lambda: ctx.run(func, *args))
+
+    def submit(self, question, func, *args, key=None):
+        """Schedule func(question, *args) on the pool; returns an awaitable
+        for its result. Work with the same `key` (default: the question's
+        cache key) that is still running is shared instead of started again.
+        Raises Overloaded right away when too much work is pending."""
+        key = cache_key(question) if key is None else key
+        future = self._in_flight.get(key)
+        if future is not None:
+            self._coalesced += 1
+            return asyncio.shield(future)
+
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise Overloaded("Server is busy, please retry shortly")
+
+        future = asyncio.ensure_future(self.run(func, question, *args))
+        self._in_flight[key] = future
+        self._pending += 1
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return asyncio.shield(future)
+
+    def _finished(self, key, future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        self._pending -= 1
+        if not future.cancelled():
+            future.exception()  # retrieved here in case every caller went away
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "coalesced": self._coalesced,
+            "rejected": self._rejected,
+            "llm": llm_slots.stats(),
+        }
+
+
+query_executor = QueryExecutor()
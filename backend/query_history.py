@@ -0,0 +1,125 @@
+# query_history.py
+#
+# Recent-query history in MongoDB. Each document stores the display string
+# used by the frontend ("18-Oct 03:12 PM") plus a real `created_at`
+# datetime (naive UTC, like the ObjectId timestamps older documents are
+# backfilled from); listing, date filtering and deletes all run through the
+# (created_at, _id) index so they cost O(page) rather than O(history).
+
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+
+from db import get_mongo_db
+from instrumentation import span
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def _collection():
+    return get_mongo_db()["recent_queries"]
+
+
+def ensure_indexes():
+    collection = _collection()
+    # ➔ Older documents only have the display string: derive created_at from _id
+    collection.update_many(
+        {"created_at": {"$exists": False}},
+        [{"$set": {"created_at": {"$toDate": "$_id"}}}],
+    )
+    collection.create_index([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id")
+
+
+def new_record(question, now=None):
+    now = now or datetime.now(timezone.utc)
+    # Display string in server-local time, as before; created_at in UTC
+    return {
+        "text": question,
+        "time": now.astimezone().strftime("%d-%b %I:%M %p"),
+        "created_at": now.astimezone(timezone.utc).replace(tzinfo=None),
+    }
+
+
+def record_query(question):
+    with span("history.write"):
+        _collection().insert_one(new_record(question))
+
+
+def record_queries(questions):
+    now = datetime.now(timezone.utc)
+    if questions:
+        with span("history.write"):
+            _collection().insert_many([new_record(q, now) for q in questions], ordered=False)
+
+
+def _serialize(doc):
+    return {"id": str(doc["_id"]), "text": doc.get("text", ""), "time": doc.get("time", "")}
+
+
+def _encode_cursor(doc):
+    return f"{doc['created_at'].isoformat()}_{doc['_id']}"
+
+
+def _decode_cursor(cursor):
+    created_at, _, oid = cursor.rpartition("_")
+    try:
+        return datetime.fromisoformat(created_at), ObjectId(oid)
+    except (InvalidId, TypeError) as e:
+        raise ValueError(str(e))
+
+
+def list_queries(limit=DEFAULT_PAGE_SIZE, cursor=None, start=None, end=None):
+    """One page of history, newest first.
+
+    `start`/`end` are UTC dates (end inclusive). Returns (items, next_cursor).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = {}
+    if start or end:
+        query["created_at"] = {}
+        if start:
+            query["created_at"]["$gte"] = datetime.combine(start, datetime.min.time())
+        if end:
+            query["created_at"]["$lt"] = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    if cursor:
+        created_at, oid = _decode_cursor(cursor)
+        query = {"$and": [query, {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": oid}},
+        ]}]}
+
+    docs = list(
+        _collection()
+        .find(query, {"text": 1, "time": 1, "created_at": 1})
+        .sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+        .limit(limit + 1)
+    )
+    next_cursor = _encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return [_serialize(d) for d in docs[:limit]], next_cursor
+
+
+def iter_queries(batch_size=1000):
+    """Lazily iterate the whole history, newest first (for exports)."""
+    return (
+        _collection()
+        .find({}, {"_id": 0, "text": 1, "time": 1, "created_at": 1})
+        .sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+        .batch_size(batch_size)
+    )
+
+
+def delete_query(query_id):
+    """Delete one entry by id; returns the deleted entry or None."""
+    try:
+        oid = ObjectId(query_id)
+    except (InvalidId, TypeError):
+        return None
+    doc = _collection().find_one_and_delete({"_id": oid})
+    return None if doc is None else _serialize(doc)
+
+
+def clear_queries():
+    return _collection().delete_many({}).deleted_count
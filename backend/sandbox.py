@@ -0,0 +1,454 @@
+# sandbox.py
+#
+# Runs agent-generated pandas code in a pool of worker processes instead of
+# the API process, so a runaway expression can't hold the GIL and starve
+# other requests. Workers are started with forkserver (spawn where that is
+# unavailable) rather than forked from the threaded API process, and
+# memory-map the snapshot's frame from its Arrow file: the shared snapshot
+# file when SNAPSHOT_SHARE_DIR is on, else one the pool writes per version.
+# A worker started for an older snapshot version is replaced on its next
+# checkout. Where the platform supports it every run has a CPU-time budget
+# (the RLIMIT_CPU soft limit, whose SIGXCPU fails the run) under a fixed
+# per-worker hard limit, and an address-space limit (RLIMIT_AS); always a
+# wall-clock timeout after which the worker is killed and respawned. Each
+# run gets its own shallow copy of the frame, so code that modifies `df`
+# doesn't change what later runs on the same worker see.
+# SANDBOX_WORKERS=0, or no usable start method, runs the code in-process.
+
+import ast
+import contextvars
+import importlib.util
+import math
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import signal
+import tempfile
+import threading
+from contextlib import contextmanager, redirect_stdout
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows: workers run without CPU and memory limits
+    resource = None
+
+load_dotenv()
+
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Wall-clock limit per run (seconds); the worker is killed when it expires
+SANDBOX_TIMEOUT = float(os.getenv("SANDBOX_TIMEOUT", "30"))
+# CPU seconds per run and extra address space per worker (MB)
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "20"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "2048"))
+# CPU seconds a worker may use over its life (its RLIMIT_CPU hard limit,
+# which an unprivileged process can't raise later); it is replaced once the
+# next run's budget would no longer fit
+SANDBOX_WORKER_CPU_SECONDS = int(os.getenv("SANDBOX_WORKER_CPU_SECONDS", "600"))
+# Longest tool observation returned to the agent (characters)
+SANDBOX_MAX_OUTPUT = int(os.getenv("SANDBOX_MAX_OUTPUT", "20000"))
+# multiprocessing start method for workers (empty: forkserver, else spawn).
+# "fork" shares the frame copy-on-write without an Arrow file, but forking a
+# threaded process can deadlock the child on a lock held by another thread.
+SANDBOX_START_METHOD = os.getenv("SANDBOX_START_METHOD", "")
+
+REPL_DESCRIPTION = (
+    "A Python shell. Use this to execute python commands. Input should be a valid python command. "
+    "When using this tool, sometimes output is abbreviated - make sure it does not look abbreviated "
+    "before using it in your answer."
+)
+
+
+class SandboxError(Exception):
+    pass
+
+
+class SandboxTimeout(SandboxError):
+    pass
+
+
+class CPUTimeExceeded(Exception):
+    pass
+
+
+class ToolFailure(str):
+    """Tool observation for code that raised or was stopped: still shown to
+    the agent as text, but lets callbacks tell it from a successful step."""
+
+
+# ➔ Code execution (shared by the workers and the in-process fallback)
+
+def sanitize_code(code):
+    # Same clean-up python_repl_ast applies before running the LLM's input
+    code = re.sub(r"^(\s|`)*(?i:python)?\s*", "", code)
+    return re.sub(r"(\s|`)*$", "", code)
+
+
+def to_mapping(value):
+    """label -> float for Series / dict / two-column frames, else None."""
+    if isinstance(value, pd.DataFrame):
+        if value.shape[1] == 1:
+            value = value.iloc[:, 0]
+        elif value.shape[1] == 2:
+            value = value.set_index(value.columns[0]).iloc[:, 0]
+        else:
+            return None
+    if isinstance(value, pd.Series):
+        value = value.to_dict()
+    if not isinstance(value, dict) or not value:
+        return None
+    try:
+        mapping = {str(k): float(v) for k, v in value.items()}
+    except (TypeError, ValueError):
+        return None
+    if any(math.isnan(v) or math.isinf(v) for v in mapping.values()):
+        return None
+    return mapping
+
+
+def run_program(program, frame, params=None, prelude=""):
+    """Execute code the way python_repl_ast does: statements, then the value
+    of the last expression (None when it isn't one). `prelude` is earlier
+    code whose names the program may use."""
+    # A shallow copy per run: in-place changes to `df` stay with this run
+    scope = {"df": frame.copy(deep=False), "pd": pd, "np": np, **(params or {})}
+    tree = ast.parse(program)
+    body, last = tree.body[:-1], tree.body[-1:]
+    with redirect_stdout(StringIO()) as out:
+        if prelude:
+            exec(compile(prelude, "<prelude>", "exec"), scope)
+            out.seek(0)
+            out.truncate()
+        exec(compile(ast.Module(body, type_ignores=[]), "<plan>", "exec"), scope)
+        if last and isinstance(last[0], ast.Expr):
+            value = eval(compile(ast.Expression(last[0].value), "<plan>", "eval"), scope)
+        else:
+            exec(compile(ast.Module(last, type_ignores=[]), "<plan>", "exec"), scope)
+            value = None
+    return value, out.getvalue()
+
+
+def _render(value, printed):
+    # Tool observation: the expression's value, else whatever was printed
+    text = printed if value is None else str(value)
+    return text[:SANDBOX_MAX_OUTPUT]
+
+
+def _execute(frame, task):
+    prelude, program, params, want = task
+    try:
+        value, printed = run_program(program, frame, params, prelude)
+        return "ok", to_mapping(value) if want == "mapping" else _render(value, printed)
+    except Exception as e:
+        return "error", "{}: {}".format(type(e).__name__, str(e))
+
+
+# ➔ Worker processes
+
+def _set_memory_limit(memory_mb):
+    # Limit what the worker adds to what it already maps (for forked
+    # workers that includes the parent's heap)
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * resource.getpagesize()
+    except OSError:
+        return
+    limit = current + memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _cpu_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _cpu_hard_limit(lifetime_seconds):
+    # Fixed for the worker's life, within any limit it inherited
+    hard = math.ceil(_cpu_used()) + lifetime_seconds
+    _, inherited = resource.getrlimit(resource.RLIMIT_CPU)
+    if inherited != resource.RLIM_INFINITY:
+        hard = min(hard, inherited)
+    resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+    return hard
+
+
+_in_run = False
+
+
+def _on_cpu_limit(signum, frame):
+    # SIGXCPU at the soft limit: fail the run, not the worker (repeated
+    # every second until the hard limit if the code is stuck in C)
+    if _in_run:
+        raise CPUTimeExceeded("code used more than its CPU time and was stopped")
+
+
+def _worker_main(conn, frame, cpu_seconds, memory_mb, lifetime_cpu_seconds):
+    global _in_run
+    if isinstance(frame, str):
+        from shared_snapshot import read_frame
+
+        frame = read_frame(frame)
+    if resource is None:
+        cpu_seconds = memory_mb = 0
+    if memory_mb:
+        _set_memory_limit(memory_mb)
+    if cpu_seconds:
+        hard = _cpu_hard_limit(max(lifetime_cpu_seconds, cpu_seconds + 1))
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if task is None:
+            return
+        if cpu_seconds:
+            # This run's budget on top of what was used so far; only the
+            # soft limit moves, and always below the fixed hard limit
+            soft = min(math.ceil(_cpu_used()) + cpu_seconds, hard - 1)
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+        _in_run = True
+        try:
+            status, output = _execute(frame, task)
+        finally:
+            _in_run = False
+        retiring = False
+        if cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+            retiring = _cpu_used() + cpu_seconds + 1 >= hard
+        conn.send((status, output, retiring))
+        if retiring:
+            return
+
+
+class _Worker:
+    def __init__(self, version, source, context, cpu_seconds, memory_mb, lifetime_cpu_seconds):
+        # `source` is the frame itself for forked workers, else its Arrow file
+        self.version = version
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child, source, cpu_seconds, memory_mb, lifetime_cpu_seconds),
+            name=f"sandbox-v{version}", daemon=True,
+        )
+        self.process.start()
+        child.close()
+
+    def alive(self):
+        return self.process.is_alive()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+
+def _worker_context(method=SANDBOX_START_METHOD):
+    """multiprocessing context for the workers, or None to run in-process."""
+    available = multiprocessing.get_all_start_methods()
+    if method:
+        candidates = [method]
+    else:
+        candidates = [m for m in ("forkserver", "spawn") if m in available]
+    for candidate in candidates:
+        if candidate not in available:
+            print(f"⚠️ Sandbox start method {candidate!r} is not available here")
+            continue
+        if candidate != "fork" and importlib.util.find_spec("pyarrow") is None:
+            # Non-forked workers load the frame from an Arrow file
+            print(f"⚠️ Sandbox start method {candidate!r} needs pyarrow")
+            continue
+        context = multiprocessing.get_context(candidate)
+        if candidate == "forkserver":
+            # Forked from the server already importing pandas, not the API
+            context.set_forkserver_preload(["sandbox"])
+        return context
+    return None
+
+
+class SandboxPool:
+    """Fixed number of worker slots; a run borrows one (waiting if all are
+    busy) and gets a fresh worker if the slot's is dead or for older data."""
+
+    def __init__(self, size=SANDBOX_WORKERS, timeout=SANDBOX_TIMEOUT,
+                 cpu_seconds=SANDBOX_CPU_SECONDS, memory_mb=SANDBOX_MEMORY_MB,
+                 worker_cpu_seconds=SANDBOX_WORKER_CPU_SECONDS):
+        self.size = size
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.worker_cpu_seconds = worker_cpu_seconds
+        self._context = _worker_context() if size > 0 else None
+        if size > 0 and self._context is None:
+            print("⚠️ No usable start method for sandbox workers; running agent code in-process")
+            self.size = size = 0
+        self._frame_dir = None
+        self._frame_files = {}
+        self._slots = queue.LifoQueue()
+        for _ in range(size):
+            self._slots.put(None)
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._runs = 0
+        self._spawned = 0
+        self._timeouts = 0
+        self._crashes = 0
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def run(self, program, snapshot, params=None, prelude="", want="text"):
+        """("ok", result) or ("error", "Type: message"); raises
+        SandboxTimeout / SandboxError when the worker had to be killed."""
+        task = (prelude, program, params, want)
+        if not self.enabled:
+            return _execute(snapshot.frame, task)
+
+        worker = self._slots.get()
+        with self._lock:
+            self._busy += 1
+            self._runs += 1
+        try:
+            if worker is None or worker.version != snapshot.version or not worker.alive():
+                if worker is not None:
+                    worker.close()
+                worker = self._spawn(snapshot)
+            try:
+                worker.conn.send(task)
+                if not worker.conn.poll(self.timeout):
+                    worker.kill()
+                    worker = None
+                    with self._lock:
+                        self._timeouts += 1
+                    raise SandboxTimeout(f"code took longer than {self.timeout:g}s and was stopped")
+                status, output, retiring = worker.conn.recv()
+                if retiring:
+                    # Its CPU hard limit has no room for another run
+                    worker.close()
+                    worker = None
+                return status, output
+            except (EOFError, OSError):
+                # CPU/memory limit (or a crash) ended the worker mid-run
+                if worker is not None:
+                    worker.kill()
+                    worker = None
+                with self._lock:
+                    self._crashes += 1
+                raise SandboxError("code was stopped after reaching its CPU or memory limit")
+        finally:
+            with self._lock:
+                self._busy -= 1
+            self._slots.put(worker)
+
+    def prestart(self, snapshot):
+        """Start a worker for `snapshot` in every slot ahead of the first run
+        (the first forkserver start imports pandas, which takes a while)."""
+        workers = [self._slots.get() for _ in range(self.size)]
+        try:
+            for i, worker in enumerate(workers):
+                if worker is None or worker.version != snapshot.version or not worker.alive():
+                    if worker is not None:
+                        worker.close()
+                    workers[i] = None
+                    workers[i] = self._spawn(snapshot)
+        finally:
+            for worker in workers:
+                self._slots.put(worker)
+
+    def _frame_source(self, snapshot):
+        if self._context.get_start_method() == "fork":
+            return snapshot.frame
+        if snapshot.file is not None:
+            return snapshot.file
+        from shared_snapshot import write_frame
+
+        # Sharing is off: write this version's frame for the workers once,
+        # keeping the previous file for workers still starting on it
+        with self._lock:
+            path = self._frame_files.get(snapshot.version)
+            if path is None:
+                if self._frame_dir is None:
+                    self._frame_dir = tempfile.mkdtemp(prefix="sandbox-frames-")
+                path = os.path.join(self._frame_dir, f"frame-v{snapshot.version}.arrow")
+                write_frame(path, snapshot.frame)
+                self._frame_files[snapshot.version] = path
+                for version in sorted(self._frame_files)[:-2]:
+                    try:
+                        os.remove(self._frame_files.pop(version))
+                    except OSError:
+                        pass
+            return path
+
+    def _spawn(self, snapshot):
+        source = self._frame_source(snapshot)
+        worker = _Worker(snapshot.version, source, self._context, self.cpu_seconds, self.memory_mb,
+                         self.worker_cpu_seconds)
+        with self._lock:
+            self._spawned += 1
+        return worker
+
+    def close(self):
+        for _ in range(self.size):
+            worker = self._slots.get()
+            if worker is not None:
+                worker.close()
+            self._slots.put(None)
+        if self._frame_dir is not None:
+            shutil.rmtree(self._frame_dir, ignore_errors=True)
+            self._frame_dir = None
+            self._frame_files.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.size,
+                "start_method": self._context.get_start_method() if self._context else None,
+                "busy": self._busy,
+                "runs": self._runs,
+                "spawned": self._spawned,
+                "timeouts": self._timeouts,
+                "crashes": self._crashes,
+                "timeout_seconds": self.timeout,
+                "cpu_seconds": self.cpu_seconds,
+                "memory_mb": self.memory_mb,
+                "worker_cpu_seconds": self.worker_cpu_seconds,
+            }
+
+
+sandbox_pool = SandboxPool()
+
+
+# ➔ Agent tool
+
+# Successful code of the current agent run: python_repl_ast keeps its
+# variables between steps, so each step runs after the earlier ones
+_session = contextvars.ContextVar("sandbox_session", default=None)
+
+
+@contextmanager
+def session():
+    token = _session.set([])
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+def session_steps():
+    return _session.get()
@@ -0,0 +1,31 @@
+# sandbox_tool.py
+#
+# python_repl_ast replacement that executes in the sandbox pool. Kept out
+# of sandbox.py because langchain_core.tools is slow to import; it is only
+# loaded once an agent is built.
+
+from typing import Any
+
+from langchain_core.tools import BaseTool
+
+from sandbox import REPL_DESCRIPTION, SandboxError, ToolFailure, sandbox_pool, sanitize_code, session_steps
+
+
+class SandboxREPLTool(BaseTool):
+    name: str = "python_repl_ast"
+    description: str = REPL_DESCRIPTION
+    snapshot: Any = None
+
+    def _run(self, query: str, run_manager=None) -> str:
+        code = sanitize_code(query)
+        steps = session_steps()
+        prelude = "\n".join(steps) if steps else ""
+        try:
+            status, output = sandbox_pool.run(code, self.snapshot, prelude=prelude)
+        except SandboxError as e:
+            return ToolFailure("{}: {}".format(type(e).__name__, str(e)))
+        if status != "ok":
+            return ToolFailure(output)
+        if steps is not None:
+            steps.append(code)
+        return output
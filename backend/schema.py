@@ -0,0 +1,83 @@
+# schema.py
+#
+# Typed, compact layout for the merged client/transaction frame:
+# low-cardinality strings become categoricals, `value` is float64 and
+# `transaction_date` a real datetime column. Missing strings stay "" and
+# missing values 0, as the fast paths and agent prompt expect.
+
+import pandas as pd
+
+NUMERIC_COLUMNS = {"value": "float64"}
+DATETIME_COLUMNS = ["transaction_date"]
+# Strings are stored as categoricals when distinct values are at most this
+# share of the rows (client/stock/RM/risk/address/preference columns)
+CATEGORY_MAX_RATIO = 0.5
+
+
+# The merged frame carries the transaction RM as relationship_manager_y when
+# profiles have one too
+RM_COLUMNS = ("relationship_manager", "relationship_manager_y", "relationship_manager_x")
+
+
+def resolve_columns(df):
+    # Frame column behind each question dimension (month is derived)
+    rm_col = next((c for c in RM_COLUMNS if c in df.columns), None)
+    return {
+        "client": "client_name",
+        "rm": rm_col,
+        "stock": "stock_name",
+        "month": None,
+        "risk": "risk_appetite",
+        "address": "address",
+    }
+
+
+def join_list_columns(df):
+    # ➔ Convert list columns to comma-separated strings for LLM readability
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        first = df[col].dropna().head(1)
+        if len(first) and isinstance(first.iloc[0], list):
+            df[col] = df[col].str.join(", ")
+    return df
+
+
+def apply_schema(df):
+    df = df.copy()
+    for col, dtype in NUMERIC_COLUMNS.items():
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(dtype)
+    for col in DATETIME_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col].replace("", None), errors="coerce")
+
+    for col in df.columns:
+        series = df[col]
+        if col in NUMERIC_COLUMNS or col in DATETIME_COLUMNS or isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            continue
+        # Factorize once; keep the categorical unless the column is mostly unique
+        category = series.astype("category")
+        if len(category.cat.categories) > max(1, len(series) * CATEGORY_MAX_RATIO):
+            df[col] = series.fillna("").astype(str)
+            continue
+        if category.isna().any():
+            if "" not in category.cat.categories:
+                category = category.cat.add_categories([""])
+            category = category.fillna("")
+        df[col] = category
+    return df
+
+
+def memory_report(df):
+    usage = df.memory_usage(deep=True, index=False)
+    return {
+        "rows": len(df),
+        "bytes": int(usage.sum()),
+        "columns": {
+            col: {"dtype": str(df[col].dtype), "bytes": int(usage[col])}
+            for col in df.columns
+        },
+    }
@@ -0,0 +1,168 @@
+# seed_stores.py
+#
+# Bulk-loads synthetic data into the real stores at a chosen scale:
+# client_profiles in MongoDB and the `transactions` table in MySQL, using
+# the same deterministic generator as the benchmarks (skewed clients and
+# stocks, several years of dates; the same seed always gives the same rows).
+# Profiles go in with batched insert_many; transactions with multi-row
+# INSERTs (mysql-connector folds executemany into one INSERT per batch) or
+# LOAD DATA LOCAL INFILE. Both stores are replaced, and secondary indexes
+# are built after the data is in. Rows per second are reported per store.
+#
+#   python seed_stores.py --transactions 1M
+#   python seed_stores.py --transactions 10M --mysql-method load-data
+
+import argparse
+import os
+import tempfile
+import time
+
+from dotenv import load_dotenv
+
+import db
+from benchmarks.datagen import client_count, generate_profiles, iter_transactions
+from benchmarks.scales import parse_scale
+
+load_dotenv()
+
+SEED_BATCH_SIZE = int(os.getenv("SEED_BATCH_SIZE", "10000"))
+
+TRANSACTIONS_DDL = """
+    CREATE TABLE transactions (
+        id BIGINT PRIMARY KEY,
+        client_name VARCHAR(100),
+        stock_name VARCHAR(100),
+        value DOUBLE,
+        transaction_date DATE,
+        relationship_manager VARCHAR(100)
+    )
+"""
+# Built once the rows are loaded (cheaper than maintaining them per insert)
+TRANSACTIONS_INDEXES = [
+    "CREATE INDEX idx_txn_client ON transactions (client_name)",
+    "CREATE INDEX idx_txn_stock ON transactions (stock_name)",
+    "CREATE INDEX idx_txn_date ON transactions (transaction_date)",
+]
+COLUMNS = "(id, client_name, stock_name, value, transaction_date, relationship_manager)"
+INSERT_SQL = f"INSERT INTO transactions {COLUMNS} VALUES (%s, %s, %s, %s, %s, %s)"
+LOAD_DATA_SQL = (
+    "LOAD DATA LOCAL INFILE %s INTO TABLE transactions "
+    f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' {COLUMNS}"
+)
+
+
+def _report(store, rows, seconds):
+    rate = rows / seconds if seconds else float("inf")
+    print(f"✅ {store}: {rows:,} rows in {seconds:.2f}s ({rate:,.0f} rows/s)")
+
+
+# ➔ MongoDB
+
+def seed_profiles(profiles, batch_size=SEED_BATCH_SIZE):
+    from client_profiles import ensure_indexes
+
+    collection = db.get_mongo_db()["client_profiles"]
+    started = time.perf_counter()
+    collection.drop()
+    for offset in range(0, len(profiles), batch_size):
+        # Copies: insert_many adds _id to the documents it is given
+        batch = [dict(p) for p in profiles[offset:offset + batch_size]]
+        collection.insert_many(batch, ordered=False)
+    ensure_indexes()
+    _report("client_profiles", len(profiles), time.perf_counter() - started)
+
+
+# ➔ MySQL
+
+def _recreate_table(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DROP TABLE IF EXISTS transactions")
+        cursor.execute(TRANSACTIONS_DDL)
+    finally:
+        cursor.close()
+
+
+def _create_indexes(conn):
+    cursor = conn.cursor()
+    try:
+        for ddl in TRANSACTIONS_INDEXES:
+            cursor.execute(ddl)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def _insert_batches(conn, batches):
+    cursor = conn.cursor()
+    try:
+        for rows in batches:
+            cursor.executemany(INSERT_SQL, rows)
+            conn.commit()
+    finally:
+        cursor.close()
+
+
+def _load_data_batches(conn, batches):
+    cursor = conn.cursor()
+    try:
+        for rows in batches:
+            with tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False) as f:
+                f.writelines("\t".join(map(str, row)) + "\n" for row in rows)
+            try:
+                cursor.execute(LOAD_DATA_SQL, (f.name,))
+                conn.commit()
+            finally:
+                os.remove(f.name)
+    finally:
+        cursor.close()
+
+
+def seed_transactions(n, profiles, seed=42, years=3, batch_size=SEED_BATCH_SIZE, method="insert"):
+    batches = iter_transactions(n, profiles, seed=seed, chunk_size=batch_size, years=years)
+    started = time.perf_counter()
+    if method == "load-data":
+        # LOAD DATA LOCAL needs allow_local_infile, which pooled connections don't set
+        import mysql.connector
+
+        conn = mysql.connector.connect(**db.MYSQL_CONFIG, allow_local_infile=True)
+        try:
+            _recreate_table(conn)
+            _load_data_batches(conn, batches)
+            _create_indexes(conn)
+        finally:
+            conn.close()
+    else:
+        with db.mysql_connection() as conn:
+            _recreate_table(conn)
+            _insert_batches(conn, batches)
+            _create_indexes(conn)
+    _report("transactions", n, time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed MongoDB and MySQL with synthetic data")
+    parser.add_argument("--transactions", type=parse_scale, default=parse_scale("100k"),
+                        help="transaction rows, e.g. 100k, 1M, 10M")
+    parser.add_argument("--clients", type=parse_scale, help="client profiles (default: ~100 rows per client)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--years", type=int, default=3, help="years of transaction dates")
+    parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE)
+    parser.add_argument("--mysql-method", choices=["insert", "load-data"], default="insert")
+    parser.add_argument("--skip-mongo", action="store_true")
+    parser.add_argument("--skip-mysql", action="store_true")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    profiles = generate_profiles(args.clients or client_count(args.transactions), seed=args.seed)
+    print(f"Generated {len(profiles):,} profiles in {time.perf_counter() - started:.2f}s")
+
+    if not args.skip_mongo:
+        seed_profiles(profiles, args.batch_size)
+    if not args.skip_mysql:
+        seed_transactions(args.transactions, profiles, seed=args.seed, years=args.years,
+                          batch_size=args.batch_size, method=args.mysql_method)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# shared_snapshot.py
+#
+# One copy of the merged frame per host, shared by every uvicorn worker.
+# The worker holding an fcntl lock on <dir>/refresher.lock is the refresher:
+# it loads from MongoDB/MySQL as usual and writes each published snapshot,
+# plus the raw transactions behind it, to Arrow IPC files, then points
+# manifest.json at them (all renamed into place, so readers never see a
+# partial write). The other workers memory-map the files named by the
+# manifest; Arrow IPC is used rather than Parquet
+# because it maps zero-copy, without decoding into private memory.
+# If the refresher exits its lock is released and the next worker to poll
+# takes over. Sharing needs fcntl (POSIX only) and pyarrow; both are imported
+# only when it is switched on, and without them each worker keeps its own
+# copy as before.
+
+import importlib.util
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Directory for the shared snapshot (empty disables sharing)
+SNAPSHOT_SHARE_DIR = os.getenv("SNAPSHOT_SHARE_DIR", "")
+# How often non-refresher workers check the manifest (seconds)
+SNAPSHOT_SHARE_POLL_SECONDS = float(os.getenv("SNAPSHOT_SHARE_POLL_SECONDS", "2"))
+# How long a cold worker waits for the refresher's first snapshot before
+# loading from the databases itself (seconds)
+SNAPSHOT_SHARE_WAIT_SECONDS = float(os.getenv("SNAPSHOT_SHARE_WAIT_SECONDS", "30"))
+
+MANIFEST = "manifest.json"
+LOCK_FILE = "refresher.lock"
+# Snapshot files kept besides the current one (already-mapped files stay
+# readable after unlink, this just bounds the directory)
+KEEP_PREVIOUS = 2
+SHARE_REQUIRES = ("fcntl", "pyarrow")
+
+
+def _missing_requirements():
+    return [name for name in SHARE_REQUIRES if importlib.util.find_spec(name) is None]
+
+
+# ➔ Arrow IPC files (also used by the sandbox workers to load the frame)
+
+def write_frame(path, frame):
+    """Write `frame` to `path` as Arrow IPC, renamed into place when complete."""
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    tmp = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def read_frame(path):
+    """Memory-mapped frame from an Arrow IPC file written by write_frame."""
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    source = pa.memory_map(path, "r")
+    return ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+
+
+class SharedSnapshotStore:
+    def __init__(self, directory=SNAPSHOT_SHARE_DIR):
+        missing = _missing_requirements() if directory else []
+        if missing:
+            print(f"⚠️ SNAPSHOT_SHARE_DIR is set but {', '.join(missing)} is unavailable; sharing is off")
+            directory = ""
+        self.directory = directory
+        self._lock_fd = None
+        self._writes = 0
+        self._loads = 0
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    @property
+    def is_refresher(self):
+        return self._lock_fd is not None
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    # ➔ Refresher election
+    def try_become_refresher(self):
+        import fcntl
+
+        if self._lock_fd is not None:
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(self.path(LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._lock_fd = fd
+        return True
+
+    def release(self):
+        if self._lock_fd is not None:
+            import fcntl
+
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # ➔ Manifest and snapshot files
+    def read_manifest(self):
+        try:
+            with open(self.path(MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print("⚠️ Could not read the shared snapshot manifest:", e)
+            return None
+
+    def _write_frame(self, kind, frame, version):
+        name = f"{kind}-v{version}-{os.getpid()}-{time.time_ns()}.arrow"
+        write_frame(self.path(name), frame)
+        return name
+
+    def write(self, frame, version, transactions=None, **extra):
+        """Persist `frame` (and `transactions`) as snapshot `version` and
+        publish it atomically."""
+        os.makedirs(self.directory, exist_ok=True)
+        name = self._write_frame("snapshot", frame, version)
+        manifest = {"version": version, "file": name, "rows": len(frame), "written_at": time.time(), **extra}
+        if transactions is not None:
+            manifest["transactions_file"] = self._write_frame("transactions", transactions, version)
+        tmp = self.path(MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path(MANIFEST))
+        self._writes += 1
+        for kind in ("snapshot", "transactions"):
+            self._prune(kind, {manifest["file"], manifest.get("transactions_file")})
+        return manifest
+
+    def load(self, manifest):
+        """Memory-mapped (frame, transactions) for `manifest`; numeric and
+        categorical columns reference the mapped files rather than private
+        memory. `transactions` is None if the refresher didn't write them."""
+        frame = read_frame(self.path(manifest["file"]))
+        transactions = manifest.get("transactions_file")
+        self._loads += 1
+        return frame, None if transactions is None else read_frame(self.path(transactions))
+
+    def _prune(self, kind, current):
+        files = sorted(
+            (f for f in os.listdir(self.directory) if f.startswith(f"{kind}-v") and f.endswith(".arrow")),
+            key=lambda f: os.path.getmtime(self.path(f)),
+        )
+        others = [f for f in files if f not in current]
+        for name in others[:max(0, len(others) - KEEP_PREVIOUS)]:
+            try:
+                os.remove(self.path(name))
+            except OSError:
+                pass
+
+    def stats(self):
+        manifest = self.read_manifest() if self.enabled else None
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory or None,
+            "refresher": self.is_refresher,
+            "manifest_version": None if manifest is None else manifest["version"],
+            "writes": self._writes,
+            "loads": self._loads,
+        }
@@ -0,0 +1,446 @@
+# snapshot.py
+
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from dotenv import load_dotenv
+
+from db import get_mongo_db, mysql_query
+from instrumentation import span
+from schema import apply_schema, join_list_columns, memory_report
+from shared_snapshot import SNAPSHOT_SHARE_POLL_SECONDS, SNAPSHOT_SHARE_WAIT_SECONDS, SharedSnapshotStore
+
+load_dotenv()
+
+# Transactions are pulled incrementally by primary key; an optional
+# "last modified" column lets updated rows be picked up as well.
+TXN_ID_COLUMN = os.getenv("TXN_ID_COLUMN", "id")
+TXN_UPDATED_COLUMN = os.getenv("TXN_UPDATED_COLUMN", "")
+TXN_DATE_COLUMN = "transaction_date"
+
+# Optional "last modified" field on client_profiles documents. Incremental
+# refreshes only read profiles when the collection's watermark (document
+# count, newest _id, latest edit time) moves; without this field, edits to
+# existing documents are picked up by the next full refresh.
+PROFILE_UPDATED_FIELD = os.getenv("PROFILE_UPDATED_FIELD", "")
+
+# Background refresh cadence (seconds, 0 disables)
+SNAPSHOT_REFRESH_SECONDS = float(os.getenv("SNAPSHOT_REFRESH_SECONDS", "60"))
+SNAPSHOT_FULL_REFRESH_SECONDS = float(os.getenv("SNAPSHOT_FULL_REFRESH_SECONDS", "3600"))
+
+
+class Snapshot:
+    # Immutable view handed to readers: never mutate `frame` in place.
+    # `file` is the shared Arrow copy of the frame, when one was written.
+    __slots__ = ("frame", "version", "loaded_at", "file")
+
+    def __init__(self, frame, version, loaded_at, file=None):
+        self.frame = frame
+        self.version = version
+        self.loaded_at = loaded_at
+        self.file = file
+
+
+def _fetch_transactions(where="", params=()):
+    return pd.DataFrame(mysql_query(f"SELECT * FROM transactions {where}", params))
+
+
+def _count_transactions():
+    (count,), = mysql_query("SELECT COUNT(*) FROM transactions", dictionary=False)
+    return int(count)
+
+
+def _fetch_profiles(query=None):
+    docs = list(get_mongo_db().client_profiles.find(query or {}))
+    df = pd.DataFrame(docs)
+    if "_id" in df.columns:
+        df["_id"] = df["_id"].astype(str)
+    return df
+
+
+def _profiles_marker():
+    # Indexed reads only: estimated count and the newest _id / edit time
+    collection = get_mongo_db().client_profiles
+    marker = [collection.estimated_document_count()]
+    for field in ["_id"] + ([PROFILE_UPDATED_FIELD] if PROFILE_UPDATED_FIELD else []):
+        last = next(iter(collection.find({}, {field: 1}).sort(field, -1).limit(1)), None)
+        marker.append(last.get(field) if last else None)
+    return tuple(marker)
+
+
+def _flatten_profiles(clients_df):
+    return join_list_columns(clients_df.drop(columns=["_id"], errors="ignore"))
+
+
+def build_merged(clients_df, transactions_df):
+    # ➔ Merge (ALL CLIENTS LEFT JOIN)
+    clients_df = _flatten_profiles(clients_df)
+    if transactions_df.empty:
+        transactions_df = pd.DataFrame(columns=["client_name", "value"])
+    merged_df = pd.merge(clients_df, transactions_df, on="client_name", how="left")
+
+    # ➔ Typed columns: categoricals, float value (0 when missing), datetimes
+    return _int_ids(apply_schema(merged_df).drop_duplicates().reset_index(drop=True))
+
+
+def _int_ids(merged_df):
+    # Clients without transactions leave missing ids (float64); once there
+    # are none the ids are int64 again, however the frame was built
+    ids = merged_df.get(TXN_ID_COLUMN)
+    if ids is not None and ids.dtype.kind == "f" and ids.notna().all():
+        merged_df[TXN_ID_COLUMN] = ids.astype("int64")
+    return merged_df
+
+
+def _max_or_none(df, col):
+    if col and col in df.columns and not df.empty:
+        value = df[col].max()
+        if pd.isna(value):
+            return None
+        # Watermarks are bound as query parameters: numpy scalars can't be,
+        # so they are converted to the matching Python type
+        return value.item() if isinstance(value, np.generic) else value
+    return None
+
+
+class SnapshotManager:
+    """Process-wide cache of the merged client/transaction frame.
+
+    The first `get()` performs a full load; afterwards `refresh()` pulls only
+    new or changed transactions and profiles and bumps `version` whenever
+    the merged frame actually changes. With SNAPSHOT_SHARE_DIR set, only the
+    elected refresher worker does that; the others map its shared snapshot.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._snapshot = None
+        self._clients_df = None
+        self._transactions_df = None
+        self._profiles_hash = None
+        self._txn_watermark = None
+        self._txn_updated_watermark = None
+        self._profile_watermark = None
+        self._profiles_marker = None
+        self._version = 0
+        self._last_full_refresh = 0.0
+        self._scheduler = None
+        self._stop = threading.Event()
+        self._listeners = []
+        self._memory = None
+        self._store = SharedSnapshotStore()
+        self._store_version = None
+        self._last_db_refresh = 0.0
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def profiles_hash(self):
+        # Content hash of client_profiles as of the last refresh (None before the first load)
+        return self._profiles_hash
+
+    def get(self):
+        snap = self._snapshot
+        if snap is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._initial_load()
+                snap = self._snapshot
+        return snap
+
+    def _initial_load(self):
+        if not self._store.enabled or self._become_refresher():
+            self._full_refresh()
+            return
+        # ➔ Another worker refreshes: map its snapshot once it has written one
+        deadline = time.monotonic() + SNAPSHOT_SHARE_WAIT_SECONDS
+        while not self._sync_from_store():
+            if self._become_refresher():
+                self._full_refresh()
+                return
+            if time.monotonic() >= deadline:
+                print("⚠️ No shared snapshot yet, loading a private copy")
+                self._full_refresh()
+                return
+            time.sleep(0.2)
+
+    def refresh(self, force=False):
+        with self._lock:
+            if self._store.enabled and not self._store.is_refresher:
+                if not self._become_refresher():
+                    if not self._sync_from_store() and self._snapshot is None:
+                        self._initial_load()
+                    return self._snapshot
+                force = True  # just took over: no database state of our own yet
+            if force or self._clients_df is None:
+                self._full_refresh()
+            elif (SNAPSHOT_FULL_REFRESH_SECONDS
+                  and time.time() - self._last_full_refresh >= SNAPSHOT_FULL_REFRESH_SECONDS):
+                self._full_refresh()
+            else:
+                with span("snapshot.incremental"):
+                    self._incremental_refresh()
+            return self._snapshot
+
+    def _full_refresh(self):
+        self._last_db_refresh = time.monotonic()
+        with span("snapshot.fetch_profiles"):
+            # Read before the profiles: an edit made meanwhile moves it again
+            profiles_marker = _profiles_marker()
+            clients_df = _fetch_profiles()
+        with span("snapshot.fetch_transactions"):
+            transactions_df = _fetch_transactions()
+
+        self._clients_df = clients_df
+        self._transactions_df = transactions_df
+        self._profiles_hash = self._hash_profiles(clients_df)
+        self._profile_watermark = _max_or_none(clients_df, PROFILE_UPDATED_FIELD)
+        self._profiles_marker = profiles_marker
+        self._reset_txn_watermarks()
+        self._last_full_refresh = time.time()
+        with span("snapshot.merge"):
+            merged_df = build_merged(clients_df, transactions_df)
+        self._publish(merged_df)
+        self._notify("reset", transactions_df)
+
+    def _incremental_refresh(self):
+        self._last_db_refresh = time.monotonic()
+        profiles_changed = self._refresh_profiles()
+        txn_delta, txn_appended_only = self._refresh_transactions()
+
+        if not profiles_changed and txn_delta is None:
+            return
+
+        # ➔ Pure inserts against unchanged profiles: merge only the new rows
+        if not profiles_changed and txn_appended_only:
+            current = self._snapshot.frame
+            new_rows = pd.merge(_flatten_profiles(self._clients_df), txn_delta, on="client_name", how="inner")
+            placeholder = current["client_name"].isin(new_rows["client_name"]) & (current["value"] == 0)
+            if TXN_DATE_COLUMN in current.columns:
+                placeholder &= current[TXN_DATE_COLUMN].isna()
+            added = apply_schema(new_rows)
+            merged_df = pd.concat([current[~placeholder], added], ignore_index=True)
+            merged_df = _int_ids(apply_schema(merged_df).drop_duplicates().reset_index(drop=True))
+            # Listeners only get the delta when no row was dropped as a duplicate
+            if len(merged_df) == len(current) - int(placeholder.sum()) + len(added):
+                self._publish(merged_df, added, current[placeholder])
+            else:
+                self._publish(merged_df)
+            return
+
+        self._publish(build_merged(self._clients_df, self._transactions_df))
+
+    def _refresh_profiles(self):
+        # ➔ Nothing to read while the collection's watermark stands still
+        profiles_marker = _profiles_marker()
+        if profiles_marker == self._profiles_marker:
+            return False
+        changed = self._read_changed_profiles()
+        self._profiles_marker = profiles_marker
+        return changed
+
+    def _read_changed_profiles(self):
+        # ➔ With a "last modified" field only changed documents are fetched;
+        #    otherwise the (small) profile collection is re-read and compared.
+        if PROFILE_UPDATED_FIELD and self._profile_watermark is not None:
+            ids = {str(d["_id"]) for d in get_mongo_db().client_profiles.find({}, {"_id": 1})}
+            known = set(self._clients_df["_id"]) if "_id" in self._clients_df.columns else set()
+            changed = _fetch_profiles({PROFILE_UPDATED_FIELD: {"$gt": self._profile_watermark}})
+            missing = ids - known - set(changed.get("_id", []))
+            if missing:
+                extra = _fetch_profiles({"_id": {"$in": [ObjectId(i) for i in missing]}})
+                changed = pd.concat([changed, extra], ignore_index=True)
+            removed = known - ids
+            if changed.empty and not removed:
+                return False
+            keep = ~self._clients_df["_id"].isin(set(changed["_id"]) | removed)
+            clients_df = pd.concat([self._clients_df[keep], changed], ignore_index=True)
+            self._profile_watermark = _max_or_none(clients_df, PROFILE_UPDATED_FIELD)
+            self._profiles_hash = self._hash_profiles(clients_df)
+        else:
+            clients_df = _fetch_profiles()
+            profiles_hash = self._hash_profiles(clients_df)
+            if profiles_hash == self._profiles_hash:
+                return False
+            self._profiles_hash = profiles_hash
+
+        self._clients_df = clients_df
+        return True
+
+    def _refresh_transactions(self):
+        # Returns (delta_rows or None, appended_only)
+        current = self._transactions_df
+
+        if self._txn_watermark is not None and TXN_ID_COLUMN in current.columns:
+            # ➔ id watermark (+ optional "updated" watermark for edited rows)
+            where = f"WHERE {TXN_ID_COLUMN} > %s"
+            params = [self._txn_watermark]
+            if TXN_UPDATED_COLUMN and self._txn_updated_watermark is not None:
+                where += f" OR {TXN_UPDATED_COLUMN} > %s"
+                params.append(self._txn_updated_watermark)
+            delta = _fetch_transactions(where, tuple(params))
+            if delta.empty:
+                if _count_transactions() != len(current):
+                    return self._reload_transactions(), False
+                return None, False
+            appended_only = bool((delta[TXN_ID_COLUMN] > self._txn_watermark).all())
+            replaced = current[TXN_ID_COLUMN].isin(delta[TXN_ID_COLUMN])
+        elif self._txn_watermark is not None and TXN_DATE_COLUMN in current.columns:
+            # ➔ Date watermark: re-read the last day onwards and replace it
+            delta = _fetch_transactions(f"WHERE {TXN_DATE_COLUMN} >= %s", (self._txn_watermark,))
+            replaced = current[TXN_DATE_COLUMN] >= self._txn_watermark
+            if len(delta) == int(replaced.sum()) and _count_transactions() == len(current):
+                return None, False
+            appended_only = False
+        else:
+            return self._reload_transactions(), False
+
+        self._transactions_df = pd.concat([current[~replaced], delta], ignore_index=True)
+        if _count_transactions() != len(self._transactions_df):
+            # ➔ Rows were deleted upstream: the watermarks can't see that
+            return self._reload_transactions(), False
+        self._reset_txn_watermarks()
+        self._notify("apply", delta, current[replaced])
+        return delta, appended_only
+
+    def _reload_transactions(self):
+        self._transactions_df = _fetch_transactions()
+        self._reset_txn_watermarks()
+        self._notify("reset", self._transactions_df)
+        return self._transactions_df
+
+    def _reset_txn_watermarks(self):
+        df = self._transactions_df
+        if TXN_ID_COLUMN in df.columns:
+            self._txn_watermark = _max_or_none(df, TXN_ID_COLUMN)
+        else:
+            self._txn_watermark = _max_or_none(df, TXN_DATE_COLUMN)
+        self._txn_updated_watermark = _max_or_none(df, TXN_UPDATED_COLUMN)
+
+    @staticmethod
+    def _hash_profiles(clients_df):
+        if clients_df.empty:
+            return 0
+        flat = _flatten_profiles(clients_df).astype(str)
+        return int(pd.util.hash_pandas_object(flat, index=False).sum())
+
+    # ➔ Listeners (incrementally maintained aggregates)
+    def add_listener(self, listener):
+        """Register an object with any of `reset(transactions)`,
+        `apply(added, removed)` (raw transaction rows) and
+        `published(snapshot, added, removed)` (merged rows, None for a
+        rebuilt snapshot); it is replayed the current state if loaded."""
+        with self._lock:
+            self._listeners.append(listener)
+            if self._transactions_df is not None and hasattr(listener, "reset"):
+                listener.reset(self._transactions_df)
+            if self._snapshot is not None and hasattr(listener, "published"):
+                listener.published(self._snapshot, None, None)
+
+    def _notify(self, event, *frames):
+        for listener in self._listeners:
+            handler = getattr(listener, event, None)
+            if handler is None:
+                continue
+            try:
+                handler(*frames)
+            except Exception as e:
+                print("⚠️ Snapshot listener failed:", e)
+
+    def _publish(self, merged_df, added=None, removed=None, version=None, file=None):
+        self._version = self._version + 1 if version is None else version
+        if self._store.is_refresher:
+            try:
+                with span("snapshot.share_write"):
+                    manifest = self._store.write(
+                        merged_df, self._version,
+                        transactions=apply_schema(self._transactions_df),
+                        profiles_hash=self._profiles_hash,
+                    )
+                self._store_version = self._version
+                file = self._store.path(manifest["file"])
+            except Exception as e:
+                print("⚠️ Could not write the shared snapshot:", e)
+        self._snapshot = Snapshot(merged_df, self._version, time.time(), file)
+        self._memory = memory_report(merged_df)
+        self._notify("published", self._snapshot, added, removed)
+
+    # ➔ Shared snapshot (SNAPSHOT_SHARE_DIR)
+    def _become_refresher(self):
+        if not self._store.try_become_refresher():
+            return False
+        # Continue the shared version sequence so readers see newer versions
+        manifest = self._store.read_manifest()
+        if manifest:
+            self._version = max(self._version, manifest["version"])
+        return True
+
+    def _sync_from_store(self):
+        """Adopt the refresher's latest snapshot; False if none is written yet."""
+        manifest = self._store.read_manifest()
+        if manifest is None:
+            return False
+        if self._store_version is not None and manifest["version"] <= self._store_version:
+            return True
+        with span("snapshot.share_load"):
+            frame, transactions = self._store.load(manifest)
+        self._store_version = manifest["version"]
+        self._profiles_hash = manifest.get("profiles_hash")
+        self._transactions_df = transactions
+        self._publish(frame, version=manifest["version"], file=self._store.path(manifest["file"]))
+        if transactions is not None:
+            self._notify("reset", transactions)
+        return True
+
+    # ➔ Background refresh
+    def start_scheduler(self, interval=SNAPSHOT_REFRESH_SECONDS):
+        if not interval or (self._scheduler and self._scheduler.is_alive()):
+            return
+        self._stop.clear()
+        self._scheduler = threading.Thread(
+            target=self._run_scheduler, args=(interval,), name="snapshot-refresh", daemon=True
+        )
+        self._scheduler.start()
+
+    def stop_scheduler(self):
+        self._stop.set()
+        # Let another worker take over refreshing the shared snapshot
+        self._store.release()
+
+    def _run_scheduler(self, interval):
+        # Shared readers poll the manifest more often than the databases are read
+        tick = min(interval, SNAPSHOT_SHARE_POLL_SECONDS) if self._store.enabled else interval
+        while not self._stop.wait(tick):
+            try:
+                if self._store.is_refresher and time.monotonic() - self._last_db_refresh < interval:
+                    continue
+                self.refresh()
+            except Exception as e:
+                print("⚠️ Snapshot refresh failed:", e)
+
+    def stats(self):
+        snap = self._snapshot
+        return {
+            "version": self._version,
+            "rows": 0 if snap is None else len(snap.frame),
+            "loaded_at": None if snap is None else snap.loaded_at,
+            "last_full_refresh": self._last_full_refresh or None,
+            "memory_bytes": None if self._memory is None else self._memory["bytes"],
+            "shared": self._store.stats(),
+        }
+
+    def memory(self):
+        return self._memory
+
+
+snapshot_manager = SnapshotManager()
+
+
+def get_snapshot():
+    return snapshot_manager.get()
@@ -0,0 +1,88 @@
+# conftest.py
+#
+# Tests run against the benchmark stand-ins (benchmarks/stores.py): mongomock
+# for MongoDB, a sqlite file for MySQL and the deterministic fake chat model
+# for the LLM. The environment is configured before any backend module is
+# imported, like `python -m benchmarks.run` does.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import _configure_environment  # noqa: E402
+
+_configure_environment()
+# Tests that need sandbox workers start a pool of their own
+os.environ["SANDBOX_WORKERS"] = "0"
+
+import pytest  # noqa: E402
+
+from benchmarks import stores  # noqa: E402
+from benchmarks.datagen import generate_profiles  # noqa: E402
+
+N_CLIENTS = 30
+N_TRANSACTIONS = 1500
+
+
+class Stores:
+    def __init__(self, sqlite_path, profiles, mongo):
+        self.sqlite_path = sqlite_path
+        self.profiles = profiles
+        self.mongo = mongo
+
+    @property
+    def profiles_collection(self):
+        import db
+
+        return self.mongo[db.DB_NAME].client_profiles
+
+    def execute(self, sql, params=()):
+        import sqlite3
+
+        conn = sqlite3.connect(self.sqlite_path)
+        try:
+            rows = conn.execute(sql, params).fetchall()
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+
+@pytest.fixture
+def data(tmp_path):
+    """Fresh stand-in stores with synthetic data; the snapshot and the caches
+    built on it are reloaded from them."""
+    profiles = generate_profiles(N_CLIENTS)
+    path = str(tmp_path / "transactions.sqlite3")
+    stores.load_transactions(path, N_TRANSACTIONS, profiles)
+    mongo = stores.install(path, profiles)
+
+    from answer_cache import answer_cache
+    from plan_cache import plan_cache
+    from snapshot import snapshot_manager
+
+    answer_cache.clear()
+    plan_cache.clear()
+    snapshot_manager.refresh(force=True)
+    return Stores(path, profiles, mongo)
+
+
+@pytest.fixture
+def snapshot(data):
+    from snapshot import snapshot_manager
+
+    return snapshot_manager.get()
+
+
+@pytest.fixture
+def fake_llm():
+    import langchain_agent
+    from benchmarks.fake_llm import FakeAnalystModel
+
+    previous = langchain_agent.llm
+    langchain_agent.llm = FakeAnalystModel()
+    langchain_agent._agent_cache.clear()
+    yield langchain_agent.llm
+    langchain_agent.llm = previous
+    langchain_agent._agent_cache.clear()
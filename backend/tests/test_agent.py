@@ -0,0 +1,39 @@
+import langchain_agent
+from langchain_agent import run_agent
+
+
+def test_agent_answers_without_printing(snapshot, fake_llm, capsys):
+    answer = run_agent("Which stocks have the highest value, by share?", snapshot)
+    assert fake_llm.calls == 2
+    assert answer["table"] and answer["graph"]
+    assert capsys.readouterr().out == ""
+
+
+def test_agent_is_quiet_unless_asked(snapshot, fake_llm, monkeypatch):
+    assert langchain_agent.get_agent(snapshot).verbose is False
+    monkeypatch.setattr(langchain_agent, "AGENT_VERBOSE", True)
+    langchain_agent._agent_cache.clear()
+    assert langchain_agent.get_agent(snapshot).verbose is True
+
+
+def test_agent_is_built_once_per_snapshot_version(data, snapshot, fake_llm):
+    from snapshot import snapshot_manager
+
+    agent = langchain_agent.get_agent(snapshot)
+    assert langchain_agent.get_agent(snapshot) is agent
+
+    (last_id,), = data.execute("SELECT MAX(id) FROM transactions")
+    data.execute("INSERT INTO transactions VALUES (?, ?, 'TCS', 1.0, '2025-01-15', 'Neha Shah')",
+                 (last_id + 1, data.profiles[0]["client_name"]))
+    newer = snapshot_manager.refresh()
+    assert newer.version == snapshot.version + 1
+    assert langchain_agent.get_agent(newer) is not agent
+    assert list(langchain_agent._agent_cache) == [newer.version]
+
+
+def test_each_run_gets_its_own_tools(snapshot, fake_llm):
+    first = langchain_agent.agent_for_run(snapshot)
+    second = langchain_agent.agent_for_run(snapshot)
+    assert first.tools[0] is not second.tools[0]
+    first.tools[0].run("df = df.head(1)")
+    assert str(second.tools[0].run("len(df)")).strip() == str(len(snapshot.frame))
@@ -0,0 +1,55 @@
+import main
+from answer_cache import AnswerCache, answer_cache, cache_key
+
+
+def test_key_ignores_case_punctuation_and_filler_words():
+    assert cache_key("Can you show me the TOP 5 clients?") == cache_key("show top five clients")
+
+
+def test_newer_version_drops_older_answers():
+    cache = AnswerCache(maxsize=8, ttl=0)
+    cache.put("top 5 clients", 1, {"text": "v1"})
+    assert cache.get("top 5 clients", 1) == {"text": "v1"}
+    assert cache.get("top 5 clients", 2) is None
+    # An answer computed on older data can't come back
+    cache.put("top 5 clients", 1, {"text": "stale"})
+    assert cache.get("top 5 clients", 2) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    cache = AnswerCache(maxsize=2, ttl=10)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    cache.get("a", 1)
+    cache.put("c", 1, "C")
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) == "A"
+
+    clock = [1000.0]
+    monkeypatch.setattr("answer_cache.time.monotonic", lambda: clock[0])
+    cache.put("d", 1, "D")
+    clock[0] += 11
+    assert cache.get("d", 1) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_query_answers_are_cached_until_the_data_changes(data):
+    from snapshot import snapshot_manager
+
+    first = main.answer_query("top 5 clients")
+    hits = answer_cache.stats()["hits"]
+    assert main.answer_query("Top 5 clients?") is first
+    assert answer_cache.stats()["hits"] == hits + 1
+
+    (last_id,), = data.execute("SELECT MAX(id) FROM transactions")
+    data.execute("INSERT INTO transactions VALUES (?, ?, 'TCS', 1e12, '2025-01-15', 'Neha Shah')",
+                 (last_id + 1, data.profiles[-1]["client_name"]))
+    snapshot_manager.refresh()
+    assert main.answer_query("top 5 clients")["text"] != first["text"]
+
+
+def test_errors_are_not_cached(data, monkeypatch):
+    monkeypatch.setattr(main, "run_query", lambda question, on_event=None: {"text": "Error: boom"})
+    main.answer_query("top 5 clients")
+    assert answer_cache.stats()["size"] == 0
@@ -0,0 +1,57 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import batch
+import main
+from intents import answer_question
+
+
+def test_batch_answers_match_single_questions(snapshot):
+    questions = ["top 3 clients", "Top 3 clients?", "total value per stock", "how many clients hold TCS"]
+    results = batch.run_batch(questions)
+    assert [route for _, route in results] == ["fast_path"] * 4
+    for question, (result, _) in zip(questions, results):
+        assert result == answer_question(question, snapshot)
+    # Duplicates are answered once, then served from the cache
+    assert results[0][0] is results[1][0]
+    assert [route for _, route in batch.run_batch(questions[:1])] == ["cache"]
+
+
+def test_one_failing_question_doesnt_sink_the_batch(snapshot, monkeypatch):
+    real = batch.parse_question
+
+    def parse(question, prepared):
+        if "stock" in question:
+            raise RuntimeError("parser broke")
+        return real(question, prepared)
+
+    monkeypatch.setattr(batch, "parse_question", parse)
+    (broken, _), (fine, _) = batch.run_batch(["total value per stock", "top 3 clients"])
+    assert broken["text"].strip().startswith("Error:") and "parser broke" in broken["text"]
+    assert len(fine["table"]) == 3
+
+
+def test_agent_questions_run_through_the_agent(snapshot, fake_llm):
+    (result, route), = batch.run_batch(["Why do clients prefer some stocks over others?"])
+    assert route == "agent"
+    assert result["table"]
+    assert fake_llm.calls == 2
+
+
+@pytest.fixture
+def client(data):
+    return TestClient(main.app)
+
+
+def test_batch_endpoint_validates_and_streams(client, monkeypatch):
+    assert client.post("/query/batch", json={"questions": ["ok", ""]}).status_code == 400
+    monkeypatch.setattr(main, "QUERY_BATCH_MAX", 1)
+    assert client.post("/query/batch", json={"questions": ["a", "b"]}).status_code == 400
+    monkeypatch.undo()
+
+    response = client.post("/query/batch", json={"questions": ["top 3 clients", "total value per stock"]})
+    assert [item["index"] for item in response.json()["results"]] == [0, 1]
+
+    streamed = client.post("/query/batch", json={"questions": ["top 3 clients"], "stream": True})
+    assert streamed.status_code == 200
+    assert "top 3 clients" in streamed.text
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+import db
+from benchmarks import run
+from benchmarks.datagen import generate_profiles, iter_transactions
+from benchmarks.fake_llm import FakeAnalystModel, _action_code
+
+
+def test_generated_data_is_deterministic():
+    assert generate_profiles(50) == generate_profiles(50)
+    first = next(iter_transactions(200, generate_profiles(5), chunk_size=200))
+    again = next(iter_transactions(200, generate_profiles(5), chunk_size=200))
+    assert list(map(tuple, first)) == list(map(tuple, again))
+
+
+def test_sqlite_stand_in_speaks_the_connector_dialect(data):
+    rows = db.mysql_query(
+        "SELECT DATE_FORMAT(transaction_date, '%Y-%m') AS month, COUNT(*) AS n FROM transactions "
+        "WHERE value > %s GROUP BY month ORDER BY month",
+        (0,),
+    )
+    assert len(rows) > 1
+    assert all(len(row["month"]) == 7 for row in rows)
+    assert sum(row["n"] for row in rows) <= 1500
+
+
+def test_fake_llm_picks_a_grouping_from_the_question():
+    assert "'stock_name'" in _action_code("which stocks are held most")
+    assert "'client_name'" in _action_code("top clients")
+    assert FakeAnalystModel().calls == 0
+
+
+def test_summary_percentiles():
+    summary = run.summarize([0.001 * i for i in range(1, 101)], wall=1.0)
+    assert summary["count"] == 100
+    assert summary["p50_ms"] == pytest.approx(50.5)
+    assert summary["max_ms"] == pytest.approx(100.0)
+    assert summary["throughput_per_s"] == 100.0
+
+
+def _result(p95):
+    return {"scales": {"1000": {"stages": {"stage": {"p50_ms": p95, "p95_ms": p95}}}}}
+
+
+@pytest.mark.parametrize("before, after, regressions", [(10.0, 10.5, 0), (10.0, 20.0, 1), (0.1, 0.5, 0)])
+def test_compare_flags_p95_regressions(tmp_path, capsys, before, after, regressions):
+    baseline, current = tmp_path / "before.json", tmp_path / "after.json"
+    baseline.write_text(json.dumps(_result(before)))
+    current.write_text(json.dumps(_result(after)))
+    assert run.compare(str(baseline), str(current), threshold=0.10, min_delta_ms=1.0) == (1 if regressions else 0)
+    assert f"{regressions} regression(s)" in capsys.readouterr().out
@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client(data):
+    return TestClient(main.app)
+
+
+def test_pages_are_revalidated_with_the_etag(client):
+    first = client.get("/clients", params={"limit": 5})
+    assert first.status_code == 200
+    assert len(first.json()["clients"]) == 5
+    again = client.get("/clients", params={"limit": 5}, headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+
+def test_unknown_fields_are_rejected_before_the_etag(client):
+    tag = client.get("/clients", params={"fields": "nope"}).headers.get("etag")
+    assert tag is None
+    response = client.get("/clients", params={"fields": "nope"}, headers={"If-None-Match": "*"})
+    assert response.status_code == 400
+    assert "nope" in response.json()["detail"]
+
+
+def test_etag_version_needs_no_collection_read(data, monkeypatch):
+    import client_profiles
+
+    monkeypatch.setattr(client_profiles, "_collection", lambda: pytest.fail("read client_profiles"))
+    assert client_profiles.etag("/clients") == client_profiles.etag("/clients")
+
+
+def test_etag_follows_the_snapshot_profile_refresh(client, data):
+    from snapshot import snapshot_manager
+
+    tag = client.get("/clients").headers["etag"]
+    name = data.profiles[0]["client_name"]
+    data.profiles_collection.update_one({"client_name": name}, {"$set": {"address": "Shillong"}})
+    assert client.get("/clients").headers["etag"] == tag  # until the snapshot re-reads profiles
+    snapshot_manager.refresh(force=True)
+    assert client.get("/clients").headers["etag"] != tag
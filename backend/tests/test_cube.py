@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+import intents
+from cube import CUBOIDS, AggregateCube, cube_manager, get_cube
+from intents import execute_plans, parse_question, prepare
+
+CUBE_QUESTIONS = [
+    "monthly portfolio value",
+    "monthly portfolio value of TCS in 2024",
+    "total value per stock",
+    "top 3 relationship managers",
+    "number of transactions per stock",
+    "average transaction value per risk appetite",
+    "total value per city for high risk clients",
+    "how many stocks",
+]
+SCAN_QUESTIONS = [
+    "top 5 clients",
+    "how many clients hold TCS",
+    "top 3 clients with high risk",
+]
+
+
+def _answers(questions, prepared):
+    return execute_plans([parse_question(q, prepared) for q in questions], prepared)
+
+
+def test_cube_answers_match_a_frame_scan(snapshot, monkeypatch):
+    prepared = prepare(snapshot)
+    cube = get_cube(prepared)
+    for question in CUBE_QUESTIONS:
+        assert cube.scope(parse_question(question, prepared)) is not None, question
+    from_cube = _answers(CUBE_QUESTIONS, prepared)
+
+    monkeypatch.setattr(intents, "get_cube", lambda prepared: None)
+    for question, cubed, scanned in zip(CUBE_QUESTIONS, from_cube, _answers(CUBE_QUESTIONS, prepared)):
+        assert [str(label) for label in cubed.index] == [str(label) for label in scanned.index], question
+        assert cubed.to_numpy(dtype=float) == pytest.approx(scanned.to_numpy(dtype=float)), question
+
+
+@pytest.mark.parametrize("question", SCAN_QUESTIONS)
+def test_client_plans_scan_the_frame(snapshot, question):
+    prepared = prepare(snapshot)
+    assert get_cube(prepared).scope(parse_question(question, prepared)) is None
+
+
+def test_appends_are_folded_in_as_deltas(data):
+    from snapshot import snapshot_manager
+
+    (last_id,), = data.execute("SELECT MAX(id) FROM transactions")
+    client = data.profiles[0]["client_name"]
+    data.execute("INSERT INTO transactions VALUES (?, ?, 'TCS', 12345.0, '2025-01-15', 'Neha Shah')",
+                 (last_id + 1, client))
+    deltas = cube_manager.deltas
+    snapshot_manager.refresh()
+    snapshot = snapshot_manager.get()
+    assert cube_manager.deltas == deltas + 1
+
+    folded = get_cube(snapshot)
+    rebuilt = AggregateCube.build(snapshot)
+    for dims, left, right in zip(CUBOIDS, folded.cuboids, rebuilt.cuboids):
+        def cells(frame):
+            frame = frame[dims + ["total", "n", "rows"]].astype({d: object for d in dims if d != "month_start"})
+            return frame.sort_values(dims, na_position="first").reset_index(drop=True)
+        pd.testing.assert_frame_equal(cells(left), cells(right), check_dtype=False)
@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from dashboard_metrics import DashboardMetrics, dashboard_metrics, group_transactions
+
+
+def _normalized(result):
+    result = dict(result)
+    for key, field in (("asset_allocation", "asset"), ("rm_clients", "rm")):
+        result[key] = sorted(result[key], key=lambda row: row[field])
+    return result
+
+
+def _insert(data, value, client=None):
+    (last_id,), = data.execute("SELECT MAX(id) FROM transactions")
+    data.execute("INSERT INTO transactions VALUES (?, ?, 'TCS', ?, '2025-01-15', 'Neha Shah')",
+                 (last_id + 1, client or data.profiles[0]["client_name"], value))
+
+
+def test_snapshot_and_mysql_sources_agree(data):
+    from_snapshot = dashboard_metrics.get()
+    from_mysql = DashboardMetrics()
+    from_mysql._load_from_mysql()
+    assert _normalized(from_mysql.get()) == _normalized(from_snapshot)
+    assert from_snapshot["top_portfolios"] == len(data.profiles)
+
+
+def test_appends_are_applied_as_deltas(data):
+    from snapshot import snapshot_manager
+
+    dashboard_metrics.get()
+    deltas = dashboard_metrics.deltas
+    # Includes a client without a profile: the dashboard counts raw transactions
+    _insert(data, 250000.0)
+    _insert(data, 500.0, client="Walk-in Client")
+    snapshot_manager.refresh()
+    assert dashboard_metrics.deltas == deltas + 1
+
+    rebuilt = DashboardMetrics()
+    rebuilt.reset(snapshot_manager._transactions_df)
+    assert _normalized(dashboard_metrics.get()) == pytest.approx(_normalized(rebuilt.get()))
+    assert dashboard_metrics.get()["top_portfolios"] == len(data.profiles) + 1
+
+
+def test_rollup_is_computed_once_per_change(data):
+    dashboard_metrics.get()
+    rollups = dashboard_metrics.rollups
+    dashboard_metrics.get()
+    dashboard_metrics.get()
+    assert dashboard_metrics.rollups == rollups
+
+
+def test_grouping_counts_high_value_transactions(data):
+    grouped = group_transactions(
+        pd.DataFrame({
+            "client_name": ["a", "a", "b"],
+            "stock_name": ["TCS", "TCS", "ITC"],
+            "relationship_manager": ["r", "r", "r"],
+            "value": [200000.0, 50.0, 100000.0],
+            "transaction_date": ["2024-01-02", "2024-01-30", "2024-02-01"],
+        })
+    )
+    assert len(grouped) == 2
+    assert grouped["high"].sum() == 1
+    assert grouped["n"].sum() == 3
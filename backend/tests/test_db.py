@@ -0,0 +1,45 @@
+import pathlib
+import re
+import threading
+
+import pytest
+
+import db
+
+
+def test_connections_go_back_to_the_pool(data):
+    before = db.pool_stats()["mysql"]["checkouts"]
+    assert db.mysql_query("SELECT COUNT(*) FROM transactions", dictionary=False) == [(1500,)]
+    with pytest.raises(Exception):
+        db.mysql_query("SELECT * FROM no_such_table")
+    stats = db.pool_stats()["mysql"]
+    assert stats["checkouts"] == before + 2
+    assert stats["in_use"] == 0
+
+
+def test_waiting_for_a_connection_times_out(data, monkeypatch):
+    monkeypatch.setattr(db, "_mysql_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(db, "MYSQL_POOL_TIMEOUT", 0.05)
+    timeouts = db.pool_stats()["mysql"]["timeouts"]
+    with db.mysql_connection():
+        with pytest.raises(TimeoutError):
+            db.mysql_query("SELECT 1")
+    assert db.pool_stats()["mysql"]["timeouts"] == timeouts + 1
+    assert db.mysql_query("SELECT 1", dictionary=False) == [(1,)]
+
+
+def test_one_mongo_client_per_process(data):
+    assert db.get_mongo_client() is db.get_mongo_client()
+    assert db.get_mongo_db().name == db.DB_NAME
+
+
+def test_modules_connect_only_through_db():
+    # seed_stores.py is an offline CLI that needs LOAD DATA LOCAL INFILE
+    allowed = {"db.py", "seed_stores.py"}
+    backend = pathlib.Path(db.__file__).parent
+    direct = re.compile(r"\bMongoClient\(|mysql\.connector\.connect\(|\bpooling\.MySQLConnectionPool\(")
+    offenders = [
+        path.name for path in backend.glob("*.py")
+        if path.name not in allowed and direct.search(path.read_text())
+    ]
+    assert offenders == []
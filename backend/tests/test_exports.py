@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from exports import iter_csv, iter_ndjson
+
+COLUMNS = [("Name", "name"), ("Tags", "tags")]
+
+
+def test_csv_is_written_in_batches_and_lazily():
+    pulled = []
+
+    def rows():
+        for i in range(5):
+            pulled.append(i)
+            yield {"name": f"n{i}", "tags": ["a", "b"]}
+
+    chunks = iter_csv(rows(), COLUMNS, batch_size=2)
+    assert next(chunks) == "Name,Tags\r\nn0,\"a, b\"\r\nn1,\"a, b\"\r\n"
+    assert pulled == [0, 1]
+    rest = list(chunks)
+    assert len(rest) == 2
+    assert list(csv.reader(io.StringIO("".join(rest))))[-1] == ["n4", "a, b"]
+
+
+def test_ndjson_keeps_only_the_exported_columns():
+    lines = "".join(iter_ndjson([{"name": "x", "tags": [1], "secret": 1}], COLUMNS)).splitlines()
+    assert [json.loads(line) for line in lines] == [{"name": "x", "tags": [1]}]
+
+
+@pytest.fixture
+def client(data):
+    return TestClient(main.app)
+
+
+def test_query_result_export(client):
+    response = client.get("/query/export", params={"question": "top 3 clients"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == "attachment; filename=query_result.csv"
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["Client", "Portfolio Value"]
+    assert len(rows) == 4
+
+
+def test_client_export_streams_every_profile(client, data):
+    response = client.get("/clients/export", params={"format": "ndjson"})
+    assert response.status_code == 200
+    names = {json.loads(line)["client_name"] for line in response.text.splitlines()}
+    assert names == {p["client_name"] for p in data.profiles}
+
+
+def test_unknown_format_is_a_400(client):
+    assert client.get("/recent-queries/export", params={"format": "xlsx"}).status_code == 400
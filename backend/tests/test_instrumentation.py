@@ -0,0 +1,53 @@
+from fastapi.testclient import TestClient
+
+import main
+from instrumentation import Registry, end_request, server_timing, span, start_request
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry(prefix="t")
+    hist = registry.histogram("latency_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        hist.observe(value, stage="x")
+    text = registry.render()
+    assert '# TYPE t_latency_seconds histogram' in text
+    assert 't_latency_seconds_bucket{stage="x",le="0.1"} 1' in text
+    assert 't_latency_seconds_bucket{stage="x",le="1.0"} 2' in text
+    assert 't_latency_seconds_bucket{stage="x",le="+Inf"} 3' in text
+    assert 't_latency_seconds_count{stage="x"} 3' in text
+
+
+def test_label_values_are_escaped_and_failing_gauges_skipped():
+    registry = Registry(prefix="t")
+    registry.counter("hits_total", "test", ("path",)).inc(path='a"b\nc')
+    registry.gauge("broken", "test", lambda: 1 / 0)
+    text = registry.render()
+    assert 't_hits_total{path="a\\"b\\nc"} 1' in text
+    assert not any(line.startswith("t_broken ") for line in text.splitlines())
+
+
+def test_spans_are_collected_per_request():
+    token, timings = start_request()
+    try:
+        with span("stage.a"):
+            pass
+        with span("stage.a"):
+            pass
+        with span("stage.b"):
+            pass
+    finally:
+        end_request(token)
+    with span("stage.c"):
+        pass
+    assert [stage for stage, _ in timings] == ["stage.a", "stage.a", "stage.b"]
+    header = server_timing([("a", 0.001), ("b", 0.002), ("a", 0.003)])
+    assert header == "a;dur=4.00, b;dur=2.00"
+
+
+def test_metrics_endpoint_reports_query_stages_and_routes(data):
+    client = TestClient(main.app)
+    assert client.post("/query", json={"question": "top 3 clients"}).status_code == 200
+    text = client.get("/metrics").text
+    assert 'rag_query_route_total{path="fast_path"}' in text
+    assert 'rag_http_request_duration_seconds_count{method="POST",route="/query",status="200"}' in text
+    assert 'rag_stage_duration_seconds_count{stage="' in text
@@ -0,0 +1,63 @@
+import re
+
+import pytest
+
+from intents import EntityMatcher, _find_entities, answer_question, normalize_question, parse_question, prepare
+
+
+@pytest.mark.parametrize("question, group_by", [
+    ("Who are the top relationship managers by portfolio?", "rm"),
+    ("top cities by portfolio value", "address"),
+    ("top 3 stocks by value", "stock"),
+    ("portfolio value by relationship manager", "rm"),
+    ("stock wise portfolio value", "stock"),
+])
+def test_group_key(snapshot, question, group_by):
+    plan = parse_question(question, prepare(snapshot))
+    assert plan is not None
+    assert plan.group_by == group_by
+
+
+def test_top_relationship_managers_are_ranked_by_rm(snapshot):
+    answer = answer_question("Who are the top relationship managers by portfolio?", snapshot)
+    managers = set(prepare(snapshot).column("rm").astype(str))
+    assert answer["table"]
+    assert {row["client"] for row in answer["table"]} <= managers
+
+
+@pytest.mark.parametrize("question", [
+    "top clients who don't hold TCS",
+    "clients that doesnt own Infosys",
+    "total value of clients who haven't invested in Reliance",
+    "top 5 clients without TCS",
+    "portfolio value per stock other than TCS",
+    "top clients excluding high risk",
+])
+def test_negations_are_left_to_the_agent(snapshot, question):
+    assert parse_question(question, prepare(snapshot)) is None
+
+
+def _regex_candidates(q, vocab):
+    # One regex per vocabulary entry: what the matcher replaces
+    return [
+        (m.start(), m.end(), dim, value)
+        for dim, norm, value in vocab
+        for m in re.finditer(rf"\b{re.escape(norm)}\b", q)
+    ]
+
+
+def test_matcher_finds_what_per_entry_regexes_find(snapshot):
+    prepared = prepare(snapshot)
+    matcher = EntityMatcher(prepared.vocab, [], [])
+    for dim, _, value in prepared.vocab:
+        q = normalize_question(f"total value of {value} and TCS in 2024")
+        assert sorted(matcher.candidates(q)) == sorted(_regex_candidates(q, prepared.vocab))
+
+
+def test_entities_are_matched_by_value(data, snapshot):
+    prepared = prepare(snapshot)
+    client = data.profiles[0]["client_name"]
+    found, spans = _find_entities(normalize_question(f"portfolio of {client} in TCS"), prepared)
+    assert found["client"] == [client]
+    assert found["stock"] == ["TCS"]
+    assert len(spans) == 2
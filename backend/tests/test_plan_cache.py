@@ -0,0 +1,65 @@
+import ast
+
+import pytest
+
+import langchain_agent
+from intents import prepare
+from plan_cache import CodeCaptureHandler, _is_safe, plan_cache, question_template
+
+HOLDERS_CODE = (
+    "df[df['stock_name'] == 'TCS'].groupby('client_name', observed=True)['value']"
+    ".sum().nlargest(3).to_dict()"
+)
+
+
+def _holders(snapshot, stock):
+    frame = snapshot.frame
+    top = frame[frame["stock_name"] == stock].groupby("client_name", observed=True)["value"].sum().nlargest(3)
+    return {str(k): float(v) for k, v in top.items()}
+
+
+def _capture(code):
+    capture = CodeCaptureHandler()
+    capture.steps = [[code, True]]
+    return capture
+
+
+def test_template_replaces_entities_and_amounts(snapshot):
+    template, values = question_template("Why do holders of TCS own more than 5 lakh?", prepare(snapshot))
+    assert "<stock>" in template and "<n> lakh" in template
+    assert values == [("entity", "TCS"), ("number", 500000.0)]
+
+
+@pytest.mark.parametrize("code, safe", [
+    (HOLDERS_CODE, True),
+    ("import os\nos.listdir('.')", False),
+    ("df.drop(columns=['value'], inplace=True)", False),
+    ("df['value'] = 0", False),
+    ("df.__class__", False),
+    ("open('/etc/passwd').read()", False),
+])
+def test_only_read_only_code_is_cached(code, safe):
+    assert _is_safe(ast.parse(code)) is safe
+
+
+def test_learned_plan_is_reused_for_other_entities(snapshot):
+    question = "Why are these the biggest holders of TCS?"
+    assert plan_cache.learn(question, snapshot, _capture(HOLDERS_CODE), _holders(snapshot, "TCS"))
+    answer = plan_cache.lookup("Why are these the biggest holders of Infosys?", snapshot)
+    assert answer == pytest.approx(_holders(snapshot, "Infosys"))
+
+
+def test_code_that_ignores_the_question_values_is_rejected(snapshot):
+    # Hard-codes the answer instead of using the stock from the question
+    code = repr(_holders(snapshot, "TCS"))
+    assert not plan_cache.learn("Why are these the biggest holders of TCS?", snapshot, _capture(code),
+                                _holders(snapshot, "TCS"))
+    assert plan_cache.stats()["rejected"] == 1
+
+
+def test_agent_answers_teach_the_cache(snapshot, fake_llm):
+    first = langchain_agent.run_agent("Why is the stock mix what it is?", snapshot)
+    assert fake_llm.calls == 2
+    again = langchain_agent.answer_from_plan("why is the stock mix what it is", snapshot)
+    assert fake_llm.calls == 2
+    assert again == first
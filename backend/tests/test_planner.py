@@ -0,0 +1,83 @@
+import pytest
+
+import planner
+from answer_cache import answer_cache
+from intents import answer_question
+
+QUESTIONS = [
+    "top 5 clients",
+    "top 3 relationship managers",
+    "breakup per relationship manager",
+    "stock wise portfolio value",
+    "monthly portfolio value",
+    "monthly portfolio value in 2024",
+    "total value per risk appetite",
+    "how many clients hold TCS",
+    "number of transactions per stock",
+    "top 3 clients with high risk",
+    "highest holders of Infosys",
+]
+
+
+def test_monthly_breakdown_is_pushed_down_per_month(snapshot):
+    answer = planner.answer_pushdown("monthly portfolio value")
+    assert answer is not None
+    months = [row["client"] for row in answer["table"]]
+    assert len(months) > 1
+    assert all(len(month) == 7 and month[4] == "-" for month in months)
+
+
+@pytest.mark.parametrize("question", QUESTIONS)
+def test_pushdown_matches_the_snapshot_answer(snapshot, question):
+    assert planner.answer_pushdown(question) == answer_question(question, snapshot)
+
+
+def test_auto_mode_is_decided_from_published_snapshots(data, monkeypatch):
+    from snapshot import snapshot_manager
+
+    monkeypatch.setattr(planner, "QUERY_PUSHDOWN", "auto")
+    monkeypatch.setattr(planner.pushdown_mode, "min_rows", 1000)
+    snapshot_manager.refresh(force=True)
+    assert planner.use_pushdown()
+    assert planner.pushdown_stats()["snapshot_rows"] == len(snapshot_manager.get().frame)
+
+    monkeypatch.setattr(planner.pushdown_mode, "min_rows", 10**9)
+    snapshot_manager.refresh(force=True)
+    assert not planner.use_pushdown()
+
+
+def test_query_and_batch_share_the_answer_cache(data, monkeypatch):
+    import main
+    from batch import run_batch
+    from snapshot import snapshot_manager
+
+    monkeypatch.setattr(planner, "QUERY_PUSHDOWN", "auto")
+    monkeypatch.setattr(planner.pushdown_mode, "min_rows", 1000)
+    snapshot_manager.refresh(force=True)
+
+    main.answer_query("top 5 clients")
+    invalidations = answer_cache.stats()["invalidations"]
+    [(_, route)] = run_batch(["top 5 clients"])
+    assert route == "cache"
+    main.answer_query("top 3 stocks")
+    run_batch(["top 3 stocks", "top 5 clients"])
+    assert answer_cache.stats()["invalidations"] == invalidations
+    assert answer_cache.stats()["version"] == snapshot_manager.version
+
+
+def test_pushdown_answers_follow_store_changes(data, monkeypatch):
+    import main
+    from snapshot import snapshot_manager
+
+    monkeypatch.setattr(planner, "QUERY_PUSHDOWN", "on")
+    before = main.answer_query("top 1 clients")["text"]
+    assert main.answer_query("top 1 clients")["text"] == before  # from the cache
+
+    (last_id,), = data.execute("SELECT MAX(id) FROM transactions")
+    client = data.profiles[-1]["client_name"]
+    data.execute("INSERT INTO transactions VALUES (?, ?, 'TCS', 1e12, '2024-06-01', 'Neha Shah')",
+                 (last_id + 1, client))
+    monkeypatch.setattr(planner, "PUSHDOWN_CATALOG_TTL", 0)
+    snapshot_manager.refresh()
+    after = main.answer_query("top 1 clients")["text"]
+    assert after != before and client in after
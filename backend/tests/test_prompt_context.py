@@ -0,0 +1,53 @@
+import pytest
+
+from prompt_context import PromptContextBuilder, PromptTooLong, estimate_tokens, pack
+
+INSTRUCTION = "Answer from `df`."
+
+
+def test_pack_drops_items_from_the_end():
+    sections = [("A:", ["a1", "a2"]), ("B:", ["b1" * 20, "b2"])]
+    text, complete = pack(sections, 1000)
+    assert complete
+    assert text.splitlines() == ["A:", "a1", "a2", "B:", "b1" * 20, "b2"]
+
+    text, complete = pack(sections, 6)
+    assert not complete
+    assert text.splitlines() == ["A:", "a1", "a2"]
+
+
+def test_render_stays_within_the_budget(snapshot):
+    builder = PromptContextBuilder(budget=200)
+    text = builder.render(snapshot, INSTRUCTION, "which stocks are held most?")
+    assert estimate_tokens(text) <= 200
+    assert text.startswith(INSTRUCTION)
+    assert text.endswith("Question: which stocks are held most?")
+    assert "- client_name:" in text
+    assert builder.stats()["truncated"] == 1
+
+
+def test_context_does_not_grow_with_the_data(snapshot):
+    text = PromptContextBuilder(budget=100_000).render(snapshot, INSTRUCTION, "q")
+    assert f"{len(snapshot.frame):,} rows" in text
+    assert len(text.splitlines()) < len(snapshot.frame) // 10
+
+
+def test_sections_are_built_once_per_version(data, snapshot):
+    from snapshot import snapshot_manager
+
+    builder = PromptContextBuilder()
+    first = builder.sections(snapshot)
+    assert builder.sections(snapshot) is first
+    assert builder.stats()["builds"] == 1
+
+    (last_id,), = data.execute("SELECT MAX(id) FROM transactions")
+    data.execute("INSERT INTO transactions VALUES (?, ?, 'TCS', 12345.0, '2025-01-15', 'Neha Shah')",
+                 (last_id + 1, data.profiles[0]["client_name"]))
+    snapshot_manager.refresh()
+    builder.sections(snapshot_manager.get())
+    assert builder.stats()["builds"] == 2
+
+
+def test_overlong_questions_are_rejected(snapshot):
+    with pytest.raises(PromptTooLong):
+        PromptContextBuilder(budget=50).render(snapshot, INSTRUCTION, "why " * 100)
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from query_executor import LLMSlots, Overloaded, QueryExecutor
+
+
+def test_identical_questions_share_one_computation():
+    executor = QueryExecutor(workers=2, max_pending=8)
+    calls = []
+
+    def work(question):
+        calls.append(question)
+        time.sleep(0.05)
+        return question.upper()
+
+    async def main():
+        return await asyncio.gather(
+            executor.submit("Top 5 clients?", work),
+            executor.submit("top 5 clients", work),
+            executor.submit("top 3 stocks", work),
+        )
+
+    try:
+        assert asyncio.run(main()) == ["TOP 5 CLIENTS?", "TOP 5 CLIENTS?", "TOP 3 STOCKS"]
+    finally:
+        executor.shutdown()
+    assert len(calls) == 2
+    assert executor.stats()["coalesced"] == 1
+    assert executor.stats()["pending"] == 0
+
+
+def test_work_beyond_max_pending_is_refused():
+    executor = QueryExecutor(workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def main():
+        first = executor.submit("a", lambda q: release.wait(5))
+        second = executor.submit("b", lambda q: release.wait(5))
+        with pytest.raises(Overloaded):
+            executor.submit("c", lambda q: q)
+        # Streamed work has a key of its own and is never shared
+        with pytest.raises(Overloaded):
+            executor.submit("a", lambda q: q, key=object())
+        release.set()
+        await asyncio.gather(first, second)
+
+    try:
+        asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert executor.stats()["rejected"] == 2
+
+
+def test_event_loop_keeps_running_during_blocking_work():
+    executor = QueryExecutor(workers=1, max_pending=4)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(executor.submit("slow", lambda q: time.sleep(0.2)), ticker())
+
+    try:
+        asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert ticks[-1] - ticks[0] < 0.15
+
+
+def test_llm_slots_time_out_with_overloaded():
+    slots = LLMSlots(limit=1, timeout=0.05)
+    with slots:
+        with pytest.raises(Overloaded):
+            with slots:
+                pass
+        assert slots.stats()["in_flight"] == 1
+    assert slots.stats() == {"limit": 1, "in_flight": 0, "waiting": 0, "rejected": 1}
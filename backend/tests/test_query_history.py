@@ -0,0 +1,51 @@
+from datetime import date, datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from query_history import _collection, delete_query, list_queries, new_record, record_queries
+
+
+@pytest.fixture
+def history(data):
+    _collection().delete_many({})
+    # One batch shares a timestamp: pages must still split on _id
+    record_queries([f"question {i}" for i in range(7)])
+    return [f"question {i}" for i in range(7)]
+
+
+def test_pages_walk_the_whole_history_newest_first(history):
+    seen, cursor = [], None
+    while True:
+        page, cursor = list_queries(limit=3, cursor=cursor)
+        seen += [item["text"] for item in page]
+        if cursor is None:
+            break
+    assert seen == history[::-1]
+
+
+def test_date_range_is_end_inclusive(data):
+    _collection().delete_many({})
+    for day in (1, 2, 3):
+        _collection().insert_one(new_record(f"day {day}", datetime(2025, 3, day, 23, 30, tzinfo=timezone.utc)))
+    page, _ = list_queries(start=date(2025, 3, 2), end=date(2025, 3, 3))
+    assert [item["text"] for item in page] == ["day 3", "day 2"]
+
+
+def test_records_keep_the_display_time_and_a_utc_datetime():
+    record = new_record("q", datetime(2025, 3, 1, 10, 0, tzinfo=timezone.utc))
+    assert record["created_at"] == datetime(2025, 3, 1, 10, 0)
+    assert record["time"]
+
+
+def test_delete_by_id(history):
+    page, _ = list_queries(limit=1)
+    assert delete_query(page[0]["id"]) == page[0]
+    assert delete_query(page[0]["id"]) is None
+    assert delete_query("not-an-id") is None
+
+
+def test_bad_cursor_is_a_400(history):
+    response = TestClient(main.app).get("/recent-queries", params={"cursor": "garbage"})
+    assert response.status_code == 400
@@ -0,0 +1,153 @@
+import ctypes
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pandas as pd
+import pytest
+
+import sandbox
+from sandbox import SandboxPool, SandboxTimeout, run_program
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAP_SYS_RESOURCE = 24
+PR_CAPBSET_DROP = 24
+
+BURN = "import time\nstarted = time.process_time()\nwhile time.process_time() - started < {seconds}: pass\n'done'"
+
+
+class FakeSnapshot:
+    def __init__(self, frame, version=1):
+        self.frame = frame
+        self.version = version
+        self.file = None
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({"client_name": ["A", "B", "C"], "value": [1.0, 2.0, 3.0]})
+
+
+def _drop_sys_resource():
+    # Run the child the way an unprivileged service would: without
+    # CAP_SYS_RESOURCE it can't raise an RLIMIT hard limit
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.prctl(PR_CAPBSET_DROP, CAP_SYS_RESOURCE, 0, 0, 0)
+    header = (ctypes.c_uint32 * 2)(0x20080522, 0)  # _LINUX_CAPABILITY_VERSION_3
+    data = (ctypes.c_uint32 * 6)()  # effective, permitted, inheritable (low words first)
+    libc.capget(header, data)
+    data[0] &= ~(1 << CAP_SYS_RESOURCE)
+    data[1] &= ~(1 << CAP_SYS_RESOURCE)
+    libc.capset(header, data)
+
+
+def _has_sys_resource():
+    with open("/proc/self/status") as f:
+        caps = next(line for line in f if line.startswith("CapEff:"))
+    return bool(int(caps.split()[1], 16) & (1 << CAP_SYS_RESOURCE))
+
+
+@pytest.mark.skipif(sandbox.resource is None, reason="RLIMIT_CPU needs the resource module")
+def test_cpu_heavy_runs_back_to_back_in_one_unprivileged_worker():
+    script = textwrap.dedent(f"""
+        import json, sys
+        sys.path.insert(0, {BACKEND!r})
+        import pandas as pd
+        from sandbox import SandboxPool
+        class Snap:
+            frame, version, file = pd.DataFrame({{"value": [1.0]}}), 1, None
+        pool = SandboxPool(size=1, timeout=30, cpu_seconds=2, memory_mb=0)
+        burn = {BURN!r}.format(seconds=1.3)
+        results = [pool.run(burn, Snap) for _ in range(3)]
+        print(json.dumps({{"results": results, "stats": pool.stats()}}))
+        pool.close()
+    """)
+    preexec = _drop_sys_resource if _has_sys_resource() else None
+    proc = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                          timeout=120, preexec_fn=preexec, cwd=BACKEND)
+    assert proc.returncode == 0, proc.stderr
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    assert out["results"] == [["ok", "done"]] * 3
+    assert out["stats"]["spawned"] == 1
+    assert out["stats"]["crashes"] == 0
+
+
+@pytest.mark.skipif(sandbox.resource is None, reason="RLIMIT_CPU needs the resource module")
+def test_cpu_budget_fails_the_run_not_the_worker(frame):
+    pool = SandboxPool(size=1, timeout=30, cpu_seconds=1, memory_mb=0)
+    try:
+        snap = FakeSnapshot(frame)
+        status, output = pool.run("while True: pass", snap)
+        assert status == "error"
+        assert output.startswith("CPUTimeExceeded:")
+        assert pool.run("len(df)", snap) == ("ok", "3")
+        assert pool.stats()["spawned"] == 1
+    finally:
+        pool.close()
+
+
+def test_worker_is_replaced_when_its_cpu_lifetime_is_used_up(frame):
+    pool = SandboxPool(size=1, timeout=30, cpu_seconds=1, memory_mb=0, worker_cpu_seconds=3)
+    try:
+        snap = FakeSnapshot(frame)
+        for _ in range(4):
+            assert pool.run(BURN.format(seconds=0.7), snap) == ("ok", "done")
+        assert pool.stats()["spawned"] >= 2
+        assert pool.stats()["crashes"] == 0
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize("workers", [0, 1])
+def test_in_place_changes_to_df_do_not_reach_later_runs(frame, workers):
+    pool = SandboxPool(size=workers, timeout=30)
+    try:
+        snap = FakeSnapshot(frame)
+        assert pool.run("df.drop(columns=['value'], inplace=True)\nlist(df.columns)", snap) == \
+            ("ok", "['client_name']")
+        assert pool.run("list(df.columns)", snap) == ("ok", "['client_name', 'value']")
+        assert list(frame.columns) == ["client_name", "value"]
+    finally:
+        pool.close()
+
+
+def test_wall_clock_timeout_kills_the_worker(frame):
+    pool = SandboxPool(size=1, timeout=1, cpu_seconds=0, memory_mb=0)
+    try:
+        snap = FakeSnapshot(frame)
+        with pytest.raises(SandboxTimeout):
+            pool.run("import time\ntime.sleep(10)", snap)
+        assert pool.run("len(df)", snap) == ("ok", "3")
+        assert pool.stats()["timeouts"] == 1
+    finally:
+        pool.close()
+
+
+def test_run_program_returns_the_last_expression(frame):
+    value, printed = run_program("print('hi')\ntotal = df['value'].sum()\ntotal * 2", frame)
+    assert value == 12.0
+    assert printed == "hi\n"
+
+
+def test_errors_come_back_as_tool_failures(frame):
+    from sandbox_tool import SandboxREPLTool
+
+    pool = SandboxPool(size=1, timeout=30)
+    previous, sandbox.sandbox_pool = sandbox.sandbox_pool, pool
+    try:
+        import sandbox_tool
+
+        sandbox_tool.sandbox_pool = pool
+        tool = SandboxREPLTool(snapshot=FakeSnapshot(frame))
+        with sandbox.session():
+            failure = tool.run("undefined_name")
+            assert isinstance(failure, sandbox.ToolFailure)
+            assert failure.startswith("NameError:")
+            assert not isinstance(tool.run("x = 1"), sandbox.ToolFailure)
+            assert tool.run("x + 1") == "2"
+    finally:
+        sandbox.sandbox_pool = previous
+        sandbox_tool.sandbox_pool = previous
+        pool.close()
@@ -0,0 +1,41 @@
+import pandas as pd
+
+from schema import CATEGORY_MAX_RATIO, apply_schema, join_list_columns, memory_report, resolve_columns
+
+
+def test_columns_are_typed_and_compact(snapshot):
+    frame = snapshot.frame
+    assert frame["value"].dtype == "float64"
+    assert pd.api.types.is_datetime64_any_dtype(frame["transaction_date"])
+    for col in ("client_name", "stock_name", "risk_appetite", "address"):
+        assert isinstance(frame[col].dtype, pd.CategoricalDtype), col
+    report = memory_report(frame)
+    assert report["rows"] == len(frame)
+    assert report["bytes"] < frame.astype(object).memory_usage(deep=True, index=False).sum()
+
+
+def test_missing_values_become_empty_strings_and_zero():
+    df = apply_schema(pd.DataFrame({
+        "client_name": ["a", "a", "b", None],
+        "value": ["10.5", None, "x", 3],
+        "transaction_date": ["2024-01-02", "", None, "2024-02-03"],
+    }))
+    assert df["value"].tolist() == [10.5, 0.0, 0.0, 3.0]
+    assert df["client_name"].astype(str).tolist() == ["a", "a", "b", ""]
+    assert df["transaction_date"].isna().tolist() == [False, True, True, False]
+
+
+def test_mostly_unique_strings_stay_plain():
+    n = 10
+    unique = [f"note {i}" for i in range(n)]
+    df = apply_schema(pd.DataFrame({"note": unique, "kind": ["x"] * n}))
+    assert len(set(unique)) > n * CATEGORY_MAX_RATIO
+    assert not isinstance(df["note"].dtype, pd.CategoricalDtype)
+    assert isinstance(df["kind"].dtype, pd.CategoricalDtype)
+
+
+def test_list_columns_are_joined_and_rm_column_resolved():
+    df = join_list_columns(pd.DataFrame({"prefs": [["Gold", "FD"], ["Equity"]]}))
+    assert df["prefs"].tolist() == ["Gold, FD", "Equity"]
+    merged = pd.DataFrame(columns=["relationship_manager_x", "relationship_manager_y"])
+    assert resolve_columns(merged)["rm"] == "relationship_manager_y"
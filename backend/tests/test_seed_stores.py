@@ -0,0 +1,44 @@
+import pytest
+
+import db
+import seed_stores
+from benchmarks.datagen import generate_profiles
+from benchmarks.scales import parse_scale
+
+
+@pytest.mark.parametrize("text, rows", [
+    ("10k", 10_000),
+    ("1M", 1_000_000),
+    ("2.5m", 2_500_000),
+    (" 750 ", 750),
+])
+def test_parse_scale(text, rows):
+    assert parse_scale(text) == rows
+
+
+def test_profiles_are_replaced_in_batches(data):
+    profiles = generate_profiles(7, seed=3)
+    seed_stores.seed_profiles(profiles, batch_size=3)
+    names = {doc["client_name"] for doc in data.profiles_collection.find()}
+    assert names == {p["client_name"] for p in profiles}
+    assert all("_id" not in p for p in profiles)
+
+
+def test_transactions_are_replaced_and_indexed(data):
+    profiles = generate_profiles(5, seed=3)
+    seed_stores.seed_transactions(250, profiles, seed=3, batch_size=100)
+    (count, low, high), = data.execute("SELECT COUNT(*), MIN(id), MAX(id) FROM transactions")
+    assert (count, low, high) == (250, 1, 250)
+    clients, = zip(*data.execute("SELECT DISTINCT client_name FROM transactions"))
+    assert set(clients) <= {p["client_name"] for p in profiles}
+    indexes = {name for name, in data.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_txn_client", "idx_txn_stock", "idx_txn_date"} <= indexes
+
+
+def test_same_seed_gives_the_same_rows(data):
+    profiles = generate_profiles(5, seed=3)
+    rows = []
+    for _ in range(2):
+        seed_stores.seed_transactions(120, profiles, seed=9, batch_size=50)
+        rows.append(db.mysql_query("SELECT * FROM transactions ORDER BY id"))
+    assert rows[0] == rows[1]
@@ -0,0 +1,77 @@
+import os
+
+import pandas as pd
+import pytest
+
+from shared_snapshot import KEEP_PREVIOUS, SharedSnapshotStore, read_frame, write_frame
+from snapshot import SnapshotManager
+
+
+@pytest.fixture
+def share_dir(tmp_path):
+    return str(tmp_path / "share")
+
+
+def _manager(directory):
+    manager = SnapshotManager()
+    manager._store = SharedSnapshotStore(directory)
+    return manager
+
+
+def test_arrow_round_trip_keeps_the_schema(snapshot, tmp_path):
+    path = str(tmp_path / "frame.arrow")
+    write_frame(path, snapshot.frame)
+    pd.testing.assert_frame_equal(read_frame(path), snapshot.frame)
+
+
+def test_one_refresher_per_directory(share_dir):
+    first, second = SharedSnapshotStore(share_dir), SharedSnapshotStore(share_dir)
+    assert first.try_become_refresher()
+    assert not second.try_become_refresher()
+    first.release()
+    assert second.try_become_refresher()
+    second.release()
+
+
+def test_readers_map_the_refreshers_snapshot(data, share_dir):
+    refresher, reader = _manager(share_dir), _manager(share_dir)
+    try:
+        written = refresher.get()
+        assert refresher._store.is_refresher
+        mapped = reader.get()
+        assert not reader._store.is_refresher
+        assert mapped.version == written.version
+        assert mapped.file == written.file
+        assert reader.profiles_hash == refresher.profiles_hash
+        pd.testing.assert_frame_equal(mapped.frame, written.frame)
+
+        # A newer version is picked up on the reader's next refresh
+        (last_id,), = data.execute("SELECT MAX(id) FROM transactions")
+        data.execute("INSERT INTO transactions VALUES (?, ?, 'TCS', 1.0, '2025-01-15', 'Neha Shah')",
+                     (last_id + 1, data.profiles[0]["client_name"]))
+        refresher.refresh()
+        assert reader.refresh().version == written.version + 1
+    finally:
+        refresher.stop_scheduler()
+        reader.stop_scheduler()
+
+
+def test_a_reader_takes_over_when_the_refresher_stops(data, share_dir):
+    refresher, reader = _manager(share_dir), _manager(share_dir)
+    version = refresher.get().version
+    reader.get()
+    refresher.stop_scheduler()
+    try:
+        assert reader.refresh().version > version
+        assert reader._store.is_refresher
+    finally:
+        reader.stop_scheduler()
+
+
+def test_old_snapshot_files_are_pruned(snapshot, share_dir):
+    store = SharedSnapshotStore(share_dir)
+    for version in range(1, 6):
+        store.write(snapshot.frame, version)
+    files = [f for f in os.listdir(share_dir) if f.startswith("snapshot-v")]
+    assert len(files) == KEEP_PREVIOUS + 1
+    assert store.read_manifest()["version"] == 5
@@ -0,0 +1,87 @@
+import datetime
+
+import pytest
+
+import snapshot as snapshot_module
+from snapshot import snapshot_manager
+
+NEW_PROFILE = {
+    "client_name": "Zara Newcomer",
+    "risk_appetite": "Low",
+    "investment_preferences": ["Gold"],
+    "relationship_manager": "Neha Shah",
+    "address": "Pune",
+}
+
+
+def _insert_transaction(data, client, value=5000.0):
+    (last_id,), = data.execute("SELECT MAX(id) FROM transactions")
+    data.execute("INSERT INTO transactions VALUES (?, ?, 'TCS', ?, '2025-01-15', 'Neha Shah')",
+                 (last_id + 1, client, value))
+    return last_id + 1
+
+
+@pytest.fixture
+def profile_reads(monkeypatch):
+    reads = []
+    fetch = snapshot_module._fetch_profiles
+
+    def counting(query=None):
+        reads.append(query)
+        return fetch(query)
+
+    monkeypatch.setattr(snapshot_module, "_fetch_profiles", counting)
+    return reads
+
+
+def test_unchanged_profiles_are_not_reread(data, profile_reads):
+    version = snapshot_manager.version
+    new_id = _insert_transaction(data, data.profiles[0]["client_name"])
+    snapshot_manager.refresh()
+    assert profile_reads == []
+    assert snapshot_manager.version == version + 1
+    assert new_id in set(snapshot_manager.get().frame["id"])
+
+    snapshot_manager.refresh()
+    assert profile_reads == []
+    assert snapshot_manager.version == version + 1
+
+
+def test_new_profiles_are_picked_up(data, profile_reads):
+    data.profiles_collection.insert_one(dict(NEW_PROFILE))
+    snapshot_manager.refresh()
+    assert profile_reads
+    assert "Zara Newcomer" in set(snapshot_manager.get().frame["client_name"])
+
+
+def test_edited_profiles_are_fetched_by_watermark(data, monkeypatch, profile_reads):
+    monkeypatch.setattr(snapshot_module, "PROFILE_UPDATED_FIELD", "updated_at")
+    start = datetime.datetime(2025, 1, 1)
+    data.profiles_collection.update_many({}, {"$set": {"updated_at": start}})
+    snapshot_manager.refresh(force=True)
+    profile_reads.clear()
+
+    name = data.profiles[0]["client_name"]
+    data.profiles_collection.update_one(
+        {"client_name": name}, {"$set": {"address": "Shillong", "updated_at": start + datetime.timedelta(days=1)}}
+    )
+    snapshot_manager.refresh()
+    assert profile_reads == [{"updated_at": {"$gt": start}}]
+    frame = snapshot_manager.get().frame
+    assert set(frame.loc[frame["client_name"] == name, "address"].astype(str)) == {"Shillong"}
+
+
+def test_ids_are_int64_after_an_append(data):
+    data.profiles_collection.insert_one(dict(NEW_PROFILE))
+    snapshot_manager.refresh(force=True)
+    assert snapshot_manager.get().frame["id"].dtype == "float64"  # a client without transactions
+
+    _insert_transaction(data, "Zara Newcomer")
+    snapshot_manager.refresh()
+    appended = snapshot_manager.get().frame
+    snapshot_manager.refresh(force=True)
+    assert appended["id"].dtype == snapshot_manager.get().frame["id"].dtype == "int64"
+
+
+def test_watermarks_are_python_scalars(data):
+    assert type(snapshot_manager._txn_watermark) is int
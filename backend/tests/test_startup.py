@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import threading
+
+from fastapi.testclient import TestClient
+
+import main
+from warmup import Warmup
+
+
+def test_heavy_dependencies_load_on_first_use():
+    code = (
+        "import sys, main; "
+        "print(sorted(m for m in ('langchain_experimental', 'langchain_groq', 'mysql.connector') if m in sys.modules))"
+    )
+    env = dict(os.environ, GROQ_API_KEY="test")
+    out = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(main.__file__), env=env,
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == "[]"
+
+
+def test_failing_steps_are_retried_until_ready():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("store not up yet")
+
+    warmup = Warmup([("store", flaky), ("after", lambda: None)], retry_seconds=0.01)
+    assert not warmup.ready
+    warmup.start()
+    warmup._thread.join(5)
+    status = warmup.status()
+    assert warmup.ready
+    assert status["failed_attempts"] == 2
+    assert list(status["completed"]) == ["store", "after"]
+    assert status["last_error"] is None
+
+
+def test_ready_endpoint_follows_the_warmup(data, monkeypatch):
+    release = threading.Event()
+    warmup = Warmup([("slow", lambda: release.wait(5))])
+    monkeypatch.setattr(main, "warmup", warmup)
+    client = TestClient(main.app)
+
+    warmup.start()
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["pending"] == ["slow"]
+
+    release.set()
+    warmup._thread.join(5)
+    assert client.get("/ready").status_code == 200
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from query_executor import Overloaded
+
+
+@pytest.fixture
+def client(data):
+    return TestClient(main.app)
+
+
+def _events(body):
+    for raw in body.strip().split("\n\n"):
+        event = next(line[7:] for line in raw.splitlines() if line.startswith("event: "))
+        data = next(line[6:] for line in raw.splitlines() if line.startswith("data: "))
+        yield event, json.loads(data)
+
+
+def test_stream_sends_the_result_as_server_sent_events(client):
+    response = client.post("/query/stream", json={"question": "top 3 clients"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = dict(_events(response.text))
+    assert events["route"]["path"] == "fast_path"
+    assert len(events["result"]["table_data"]) == 3
+    assert "done" in events
+
+
+def test_overload_is_a_json_503_not_a_stream(client, monkeypatch):
+    def refuse(*args, **kwargs):
+        raise Overloaded("too many queries in flight")
+
+    monkeypatch.setattr(main.query_executor, "submit", refuse)
+    response = client.post("/query/stream", json={"question": "top 3 clients"})
+    assert response.status_code == 503
+    assert response.headers["content-type"].startswith("application/json")
+    assert response.json()["detail"] == "too many queries in flight"
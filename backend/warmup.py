@@ -0,0 +1,93 @@
+# warmup.py
+#
+# Optional background warmup for a freshly started worker: runs a list of
+# named steps (indexes, data snapshot, intent lookups, agent) off the event
+# loop so startup itself stays fast. A failing step (e.g. a store that is
+# still coming up) is retried until it succeeds; /ready reports progress and
+# only turns 200 once every step has completed.
+
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from instrumentation import span
+
+load_dotenv()
+
+WARMUP = os.getenv("WARMUP", "true").lower() in ("1", "true", "yes")
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+
+
+class Warmup:
+    def __init__(self, steps, retry_seconds=WARMUP_RETRY_SECONDS):
+        self.steps = steps                # [(name, fn)]
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._state = "idle"
+        self._done = {}                   # step -> seconds
+        self._attempts = 0
+        self._error = None
+        self._started_at = None
+        self._finished_at = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._state = "running"
+            self._started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def skip(self):
+        # Warmup disabled: everything initializes lazily on first use
+        with self._lock:
+            self._state = "skipped"
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        for name, fn in self.steps:
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                try:
+                    with span(f"warmup.{name}"):
+                        fn()
+                except Exception as e:
+                    with self._lock:
+                        self._attempts += 1
+                        self._error = f"{name}: {e}"
+                    print(f"⚠️ Warmup step {name} failed, retrying in {self.retry_seconds:g}s:", e)
+                    self._stop.wait(self.retry_seconds)
+                    continue
+                with self._lock:
+                    self._done[name] = round(time.perf_counter() - started, 3)
+                break
+            if self._stop.is_set():
+                return
+        with self._lock:
+            self._state = "ready"
+            self._error = None
+            self._finished_at = time.time()
+
+    @property
+    def ready(self):
+        return self._state in ("ready", "skipped")
+
+    def status(self):
+        with self._lock:
+            return {
+                "ready": self._state in ("ready", "skipped"),
+                "state": self._state,
+                "completed": dict(self._done),
+                "pending": [name for name, _ in self.steps if name not in self._done],
+                "failed_attempts": self._attempts,
+                "last_error": self._error,
+                "started_at": self._started_at,
+                "finished_at": self._finished_at,
+            }
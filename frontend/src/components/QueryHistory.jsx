@@ -20,9 +20,9 @@ const QueryHistory = () => {
     fetchQueries();
   }, []);
 
-  const handleDelete = async (index) => {
+  const handleDelete = async (id) => {
     try {
-      await fetch(`http://localhost:8000/recent-queries/${index}`, {
+      await fetch(`http://localhost:8000/recent-queries/${id}`, {
         method: "DELETE",
       });
       fetchQueries();
@@ -110,7 +110,7 @@ const QueryHistory = () => {
         <div className="bg-slate-800 rounded-xl shadow divide-y divide-slate-700 max-h-[500px] overflow-y-auto">
           {recentQueries.map((q, idx) => (
             <div
-              key={idx}
+              key={q.id ?? idx}
               className="flex justify-between items-center py-3 px-4 hover:bg-slate-700 transition"
             >
               <div>
@@ -120,7 +120,7 @@ const QueryHistory = () => {
               <Trash
                 size={18}
                 className="text-red-400 hover:text-red-600 cursor-pointer"
-                onClick={() => handleDelete(idx)}
+                onClick={() => handleDelete(q.id)}
               />
             </div>
           ))}
@@ -29,6 +29,7 @@ const QueryInterface = () => {
 
   const [showSamples, setShowSamples] = useState(true);
   const [loading, setLoading] = useState(false); // spinner state
+  const [progress, setProgress] = useState(""); // streaming status text
 
   const sampleQuestions = [
     "What are the top five portfolios?",
@@ -41,25 +42,72 @@ const QueryInterface = () => {
     setQuestion(sample);
   };
 
+  const showError = (message) => {
+    setResponse(`Error: ${message}`);
+    setGraphData([]);
+    setTableData([]);
+    setActiveTab("text");
+    setShowSamples(false);
+  };
+
+  // Streams progress events from /query/stream until the final result arrives
   const handleSubmit = async (e) => {
     e.preventDefault();
     setLoading(true);
+    setProgress("Loading data...");
     try {
-      const res = await fetch("http://localhost:8000/query", {
+      const res = await fetch("http://localhost:8000/query/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ question }),
       });
-      const data = await res.json();
-      setResponse(data.response);
-      setGraphData(data.graph_data);
-      setTableData(data.table_data);
-      setActiveTab("text");
-      setShowSamples(false);
+      // Refusals (503 when the server is busy) and validation errors come back as JSON
+      const contentType = res.headers.get("content-type") || "";
+      if (!res.ok || !contentType.includes("text/event-stream")) {
+        const body = await res.json().catch(() => ({}));
+        showError(body.detail || body.error || `request failed (${res.status})`);
+        return;
+      }
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || "{}");
+
+          if (event === "route") {
+            setProgress(
+              data.path === "agent" ? "Asking the AI analyst..." : "Computing answer..."
+            );
+          } else if (event === "agent_step") {
+            setProgress(`Running analysis step: ${data.tool}`);
+          } else if (event === "token") {
+            setProgress("Generating answer...");
+          } else if (event === "result") {
+            setResponse(data.response);
+            setGraphData(data.graph_data);
+            setTableData(data.table_data);
+            setActiveTab("text");
+            setShowSamples(false);
+          } else if (event === "error") {
+            showError(data.detail);
+          }
+        }
+      }
     } catch (error) {
       console.error("Error querying:", error);
+      showError(error.message);
     } finally {
       setLoading(false);
+      setProgress("");
     }
   };
 
@@ -121,8 +169,9 @@ const QueryInterface = () => {
         </button>
 
         {loading && (
-          <div className="ml-2">
+          <div className="ml-2 flex items-center gap-2">
             <div className="w-6 h-6 border-4 border-blue-500 border-t-transparent rounded-full animate-spin"></div>
+            <span className="text-xs text-slate-400">{progress}</span>
           </div>
         )}
       </form>